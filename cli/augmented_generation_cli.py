@@ -5,6 +5,7 @@ from lib.augmented_generation import (
     citations_command,
     question_command
 )
+from lib.search_client import default_server_url
 
 
 def main():
@@ -15,30 +16,34 @@ def main():
         "rag", help="Perform RAG (search + generate answer)"
     )
     rag_parser.add_argument("query", type=str, help="Search query for RAG")
+    rag_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
 
     summarize_parser = subparsers.add_parser("summarize", help="Summarize search results")
     summarize_parser.add_argument("query", type=str, help="Search query for RAG")
     summarize_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results")
+    summarize_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
     
     citations_parser = subparsers.add_parser("citations", help="Generated answer will reference its sources")
     citations_parser.add_argument("query", type=str, help="Search query")
     citations_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results to return")
+    citations_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
     
     question_parser = subparsers.add_parser("question", help="Ask the user's question based on query")
     question_parser.add_argument("query", type=str, help="Search query")
     question_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results to return")
+    question_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
     args = parser.parse_args()
 
     match args.command:
         case "rag":
             query = args.query
-            rag_command(query=query)
+            rag_command(query=query, server=args.server)
         case "summarize":
-            summarize_command(query=args.query, limit=args.limit)
+            summarize_command(query=args.query, limit=args.limit, server=args.server)
         case "citations":
-            citations_command(query=args.query, limit=args.limit)
+            citations_command(query=args.query, limit=args.limit, server=args.server)
         case "question":
-            question_command(query=args.query, limit=args.limit)
+            question_command(query=args.query, limit=args.limit, server=args.server)
         case _:
             parser.print_help()
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import argparse
+from lib.benchmarks import (
+    benchmark_analyzer_command,
+    benchmark_ann_command,
+    benchmark_quantization_command,
+    benchmark_startup_command,
+    benchmark_candidates_command,
+    benchmark_retrieval_command,
+    benchmark_batch_command
+)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Performance Benchmarks CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available benchmarks")
+
+    analyzer_parser = subparsers.add_parser("analyzer", help="Compare the text pipeline before/after TextAnalyzer on a synthetic corpus")
+    analyzer_parser.add_argument("--docs", type=int, nargs='?', default=10_000, help="Number of synthetic docs to generate")
+
+    ann_parser = subparsers.add_parser("ann", help="Measure IVF index recall@k and latency against the exact embedding scan")
+    ann_parser.add_argument("--source", type=str, choices=["synthetic", "movies", "chunks"], default="synthetic", help="Embeddings to index: synthetic, or the cached movie/chunk embeddings")
+    ann_parser.add_argument("--vectors", type=int, nargs='?', default=100_000, help="Number of synthetic vectors to generate")
+    ann_parser.add_argument("--queries", type=int, nargs='?', default=200, help="Number of queries to run")
+    ann_parser.add_argument("--limit", type=int, nargs='?', default=10, help="k in recall@k")
+    ann_parser.add_argument("--nprobe", type=int, nargs='+', default=[1, 4, 16, 64], help="nprobe values to measure")
+    ann_parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default 4 * sqrt(vectors))")
+
+    quantization_parser = subparsers.add_parser("quantization", help="Measure memory and recall@k of int8 / product-quantized embeddings against the exact scan")
+    quantization_parser.add_argument("--source", type=str, choices=["synthetic", "movies", "chunks"], default="synthetic", help="Embeddings to quantize: synthetic, or the cached movie/chunk embeddings")
+    quantization_parser.add_argument("--vectors", type=int, nargs='?', default=100_000, help="Number of synthetic vectors to generate")
+    quantization_parser.add_argument("--queries", type=int, nargs='?', default=200, help="Number of queries to run")
+    quantization_parser.add_argument("--limit", type=int, nargs='?', default=10, help="k in recall@k")
+    quantization_parser.add_argument("--subspaces", type=int, nargs='?', default=96, help="Product quantization subspaces (bytes per vector)")
+    quantization_parser.add_argument("--rescore-factor", type=int, nargs='?', default=4, help="Shortlist size for float re-scoring, as a multiple of --limit")
+
+    startup_parser = subparsers.add_parser("startup", help="Measure the import time of every CLI entry point and which heavy modules it loads")
+    startup_parser.add_argument("--repeats", type=int, nargs='?', default=5, help="Fresh interpreter runs per CLI")
+
+    candidates_parser = subparsers.add_parser("candidates", help="Measure how many candidates adaptive hybrid search needs, against the fixed pools")
+    candidates_parser.add_argument("--queries", type=int, nargs='?', default=100, help="Number of queries (titles of random movies)")
+    candidates_parser.add_argument("--limit", type=int, nargs='?', default=10, help="Results per query")
+
+    retrieval_parser = subparsers.add_parser("retrieval", help="Compare per-stage latency of hybrid search with sequential and concurrent BM25/semantic retrieval")
+    retrieval_parser.add_argument("--queries", type=int, nargs='?', default=100, help="Number of queries (titles of random movies)")
+    retrieval_parser.add_argument("--limit", type=int, nargs='?', default=10, help="Results per query")
+    retrieval_parser.add_argument("--workers", type=int, default=1, help="Retrieval threads in concurrent mode")
+
+    batch_parser = subparsers.add_parser("batch", help="Compare a loop of hybrid searches with one batch search over the same queries")
+    batch_parser.add_argument("--queries", type=int, nargs='?', default=200, help="Number of queries (titles of random movies)")
+    batch_parser.add_argument("--limit", type=int, nargs='?', default=10, help="Results per query")
+    batch_parser.add_argument("--workers", type=int, default=None, help="BM25 worker processes (default: one per core)")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "analyzer":
+            benchmark_analyzer_command(num_docs=args.docs)
+        case "ann":
+            benchmark_ann_command(source=args.source, num_vectors=args.vectors, num_queries=args.queries,
+                                  limit=args.limit, nprobes=args.nprobe, nlist=args.nlist)
+        case "quantization":
+            benchmark_quantization_command(source=args.source, num_vectors=args.vectors, num_queries=args.queries,
+                                           limit=args.limit, num_subspaces=args.subspaces,
+                                           rescore_factor=args.rescore_factor)
+        case "startup":
+            benchmark_startup_command(repeats=args.repeats)
+        case "candidates":
+            benchmark_candidates_command(num_queries=args.queries, limit=args.limit)
+        case "retrieval":
+            benchmark_retrieval_command(num_queries=args.queries, limit=args.limit, workers=args.workers)
+        case "batch":
+            benchmark_batch_command(num_queries=args.queries, limit=args.limit, workers=args.workers)
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 import argparse
-from lib.hybrid_search.logic import normalize_command
+from lib.hybrid_search.logic import normalize_command, NORMALIZERS
 from lib.hybrid_search.commands import (
     weighted_search_command,
     rrf_search_command
 )
-from dotenv import load_dotenv
+from lib.search_client import default_server_url
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Hybrid Search CLI")
@@ -12,11 +12,16 @@ def main() -> None:
 
     normalize_parser = subparsers.add_parser("normalize", help="Accept a list of scores, print the normalized scores")
     normalize_parser.add_argument("scores", type=float, nargs='+', help="List of scores to be normalized")
+    normalize_parser.add_argument("--method", type=str, choices=sorted(NORMALIZERS), default="minmax", help="Normalization: min-max scaling, z-score or rank-based")
     
     weighted_search_parser = subparsers.add_parser("weighted-search", help="Search for query using weighted hybrid score (BM25 + Semantic Score)")
     weighted_search_parser.add_argument("query", type=str, help="Query to search for")
     weighted_search_parser.add_argument("--alpha", type=float, nargs='?', default=0.5, help="Constant used to dynamically control weighing between 2 scores")
     weighted_search_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results to return from the search")    
+    weighted_search_parser.add_argument("--adaptive", action="store_true", help="Fetch candidates in growing rounds until the top results cannot change, and report how many were needed")
+    weighted_search_parser.add_argument("--timings", action="store_true", help="Print the time spent in BM25, semantic retrieval and fusion (local search only)")
+    weighted_search_parser.add_argument("--normalization", type=str, choices=sorted(NORMALIZERS), default="minmax", help="How BM25 and semantic scores are normalized before weighting")
+    weighted_search_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
     
     rrf_search_parser = subparsers.add_parser("rrf-search", help="Search for query using RRF scores")
     rrf_search_parser.add_argument("query", type=str, help="Query to search for")
@@ -24,21 +29,29 @@ def main() -> None:
     rrf_search_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results to return")
     rrf_search_parser.add_argument("--enhance", type=str, choices=["spell", "rewrite", "expand"], help="Query enhancement method")
     rrf_search_parser.add_argument("--rerank-method", type=str,choices=["individual", "batch", "cross_encoder"], help="Re-ranking search results" )
+    rrf_search_parser.add_argument("--adaptive", action="store_true", help="Fetch candidates in growing rounds until the top results provably cannot change, and report how many were needed")
+    rrf_search_parser.add_argument("--timings", action="store_true", help="Print the time spent in BM25, semantic retrieval and fusion")
     rrf_search_parser.add_argument("--evaluate", type=bool, nargs='?', default=False, help="Rate the search results")
+    rrf_search_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
 
     args = parser.parse_args()
 
     match args.command:
         case "normalize":
-            normalize_command(scores=args.scores)
+            normalize_command(scores=args.scores, method=args.method)
         case "weighted-search":
-            weighted_search_command(query=args.query, alpha=args.alpha, limit=args.limit)
+            weighted_search_command(query=args.query, alpha=args.alpha, limit=args.limit,
+                                    normalization=args.normalization, adaptive=args.adaptive,
+                                    timings=args.timings, server=args.server)
         case "rrf-search":
             rrf_search_command(query=args.query, 
                                k=args.k, limit=args.limit, 
                                enhance=args.enhance, 
                                re_rank=args.rerank_method, 
-                               evaluate=args.evaluate)
+                               evaluate=args.evaluate,
+                               adaptive=args.adaptive,
+                               timings=args.timings,
+                               server=args.server)
         case _:
             parser.print_help()
 
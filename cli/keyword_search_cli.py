@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
+import os
 from lib.keyword_search_commands import (
     search_command, 
     build_command, 
+    stats_command,
+    upsert_command,
+    delete_command,
+    compact_command,
     tf_command, 
     idf_command, 
     tfidf_command, 
@@ -21,6 +26,17 @@ def main() -> None:
     search_parser.add_argument("query", type=str, help="Search query")
 
     build_parser = subparsers.add_parser("build", help="Build the inverted index, save it to disk")
+    build_parser.add_argument("--workers", type=int, nargs='?', const=0, default=1, help="Number of processes to tokenize and index shards of the corpus in parallel (0 or no value = one per CPU)")
+
+    stats_parser = subparsers.add_parser("stats", help="Print corpus stats from the saved index header")
+
+    upsert_parser = subparsers.add_parser("upsert", help="Add or replace movies in the index without a full rebuild")
+    upsert_parser.add_argument("movies_file", type=str, help="JSON file in the movies.json format")
+
+    delete_parser = subparsers.add_parser("delete", help="Delete movies from the index without a full rebuild")
+    delete_parser.add_argument("document_IDs", type=int, nargs='+', help="Document IDs to delete")
+
+    compact_parser = subparsers.add_parser("compact", help="Fold pending added/replaced/deleted movies into the index segment")
     
     tf_parser = subparsers.add_parser("tf", help="Print the term frequency of given term in given doc ID")
     tf_parser.add_argument("document_ID", type=int, help="Document ID")
@@ -51,7 +67,16 @@ def main() -> None:
         case "search":
             search_command(search_query=args.query)                
         case "build":
-            build_command()
+            workers = args.workers if args.workers > 0 else os.cpu_count()
+            build_command(workers=workers)
+        case "stats":
+            stats_command()
+        case "upsert":
+            upsert_command(movies_file=args.movies_file)
+        case "delete":
+            delete_command(doc_ids=args.document_IDs)
+        case "compact":
+            compact_command()
         case "tf":
             tf_command(doc_id=args.document_ID, search_term=args.search_term)
         case "idf":
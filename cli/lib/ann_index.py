@@ -0,0 +1,166 @@
+import math
+import zlib
+from pathlib import Path
+import numpy as np
+from .constants import DEFAULT_IVF_ITERATIONS
+
+class IVFIndex:
+    """
+    Inverted file (IVF) approximate nearest neighbour index over a matrix of
+    L2-normalized embeddings, scored by cosine similarity (dot product).
+
+    A coarse quantizer of ```nlist``` centroids is trained with spherical
+    k-means, and every row of the matrix is assigned to its nearest centroid.
+    A query only scores the rows in the lists of its ```nprobe``` nearest
+    centroids, so ```nprobe``` trades recall for latency: ```nprobe = nlist```
+    is an exact scan.
+
+    The index stores row numbers, not vectors; it is used together with the
+    matrix it was built from (checked with ```matches```).
+
+    Attributes:
+        centroids (np.ndarray):
+            Unit-length centroids; shape = (nlist, embedding_dimension).
+        list_offsets (np.ndarray):
+            ```list_offsets[c]:list_offsets[c + 1]``` is the slice of list ```c``` in ```list_rows```.
+        list_rows (np.ndarray):
+            Row numbers of all lists, concatenated, ascending within each list.
+        fingerprint (np.ndarray):
+            (num_rows, embedding_dimension, checksum) of the indexed matrix."""
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray,
+                 fingerprint: np.ndarray):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.fingerprint = fingerprint
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int | None=None,
+              iterations: int=DEFAULT_IVF_ITERATIONS, seed: int=0) -> "IVFIndex":
+        """Train the coarse quantizer on (a sample of) ```vectors``` and assign
+        every row to a list. ```nlist``` defaults to ```4 * sqrt(num_rows)```."""
+        num_rows = len(vectors)
+        if nlist is None:
+            nlist = default_nlist(num_rows)
+        nlist = max(1, min(nlist, num_rows))
+
+        rng = np.random.default_rng(seed)
+        # 32 training points per centroid is plenty for the coarse quantizer
+        sample_size = min(num_rows, nlist * 32)
+        sample = vectors[np.sort(rng.choice(num_rows, size=sample_size, replace=False))]
+        centroids = _spherical_kmeans(sample, nlist=nlist, iterations=iterations, rng=rng)
+
+        assignments = _nearest_centroids(vectors, centroids)
+        list_rows = np.argsort(assignments, kind="stable")
+        list_sizes = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate(([0], np.cumsum(list_sizes)))
+        return cls(
+            centroids=centroids,
+            list_offsets=list_offsets.astype(np.int64),
+            list_rows=list_rows.astype(np.int64),
+            fingerprint=matrix_fingerprint(vectors)
+        )
+
+    def matches(self, vectors: np.ndarray) -> bool:
+        """Whether the index was built from ```vectors```."""
+        return np.array_equal(self.fingerprint, matrix_fingerprint(vectors))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Ascending row numbers in the lists of the ```nprobe``` centroids
+        nearest to the (normalized) ```query```."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(self.nlist)
+        rows = np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probed
+        ])
+        rows.sort()
+        return rows
+
+    def scan(self, vectors: np.ndarray, query: np.ndarray, nprobe: int) -> tuple[np.ndarray, np.ndarray]:
+        """Score the (normalized) ```query``` against the candidate rows of
+        ```vectors```. Returns (ascending row numbers, cosine similarities)."""
+        rows = self.candidates(query, nprobe)
+        return rows, vectors[rows] @ query
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+            fingerprint=self.fingerprint
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as arrays:
+            return cls(
+                centroids=arrays["centroids"],
+                list_offsets=arrays["list_offsets"],
+                list_rows=arrays["list_rows"],
+                fingerprint=arrays["fingerprint"]
+            )
+
+
+def load_or_build_ivf_index(path: Path, vectors: np.ndarray, nlist: int | None=None) -> IVFIndex:
+    """Load the IVF index saved at ```path``` if it was built from ```vectors```,
+    else build it and save it there."""
+    if path.exists():
+        index = IVFIndex.load(path)
+        if index.matches(vectors) and (nlist is None or index.nlist == nlist):
+            return index
+    index = IVFIndex.build(vectors, nlist=nlist)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index.save(path)
+    return index
+
+
+def default_nlist(num_rows: int) -> int:
+    return max(1, int(4 * math.sqrt(num_rows)))
+
+
+def matrix_fingerprint(vectors: np.ndarray) -> np.ndarray:
+    # shape plus a checksum of ~1k evenly spaced rows, cheap even for millions of rows
+    num_rows = len(vectors)
+    dimension = vectors.shape[1] if vectors.ndim == 2 else 0
+    step = max(1, num_rows // 1024)
+    checksum = zlib.crc32(np.ascontiguousarray(vectors[::step]).tobytes())
+    return np.array([num_rows, dimension, checksum], dtype=np.int64)
+
+
+def _spherical_kmeans(sample: np.ndarray, nlist: int, iterations: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        # sum each list's members in one pass over the sample sorted by list
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        non_empty = counts > 0
+        sums[non_empty] = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+        # empty lists restart from a random sample point
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(len(sample), size=len(empty))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0)
+    return centroids
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # batched so the (rows, nlist) score matrix stays around 16M entries
+    batch_size = max(1, (1 << 24) // len(centroids))
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
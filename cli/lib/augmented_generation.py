@@ -1,9 +1,9 @@
-import os
 import time
+from typing import Optional
 from .utils import get_movie_data_from_file
-from .hybrid_search import HybridSearch
-from dotenv import load_dotenv
-from google import genai
+from .hybrid_search.logic import HybridSearch
+from .genai_client import get_genai_client
+from .search_client import SearchClient
 from .prompts import (
     rag_response_prompt, 
     rag_summarize_prompt,
@@ -11,21 +11,25 @@ from .prompts import (
     rag_questions_prompt
 )
 
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash-001"
 
-def rag(query: str) -> tuple[str, list[dict]]:
-    movies = get_movie_data_from_file()
-    searcher = HybridSearch(documents=movies)
-    docs = searcher.rrf_search(query=query, limit=5)
+def _hybrid_searcher(searcher: Optional[HybridSearch]) -> HybridSearch:
+    if searcher is None:
+        searcher = HybridSearch(documents=get_movie_data_from_file())
+    return searcher
+
+def rag(query: str, limit: int=5, searcher: Optional[HybridSearch]=None) -> tuple[str, list[dict]]:
+    searcher = _hybrid_searcher(searcher)
+    docs = searcher.rrf_search(query=query, limit=limit)
     prompt = rag_response_prompt(query=query, docs=docs)
     rag_response = generate_response_to_query(prompt)
     return rag_response, docs
 
-def rag_command(query : str) -> None:
-    rag_response, result_docs = rag(query=query)
+def rag_command(query : str, server: Optional[str]=None) -> None:
+    if server:
+        rag_response, result_docs = SearchClient(server).rag(kind="rag", query=query)
+    else:
+        rag_response, result_docs = rag(query=query)
     
     print("Search Results:")
     for doc in result_docs:
@@ -37,6 +41,8 @@ def rag_command(query : str) -> None:
 
 def generate_response_to_query(prompt: str, max_retries: int=5) -> str:
     time_delay = 1.0
+    # outside the retry loop: a missing API key fails at once instead of being retried
+    client = get_genai_client()
     for attempt in range(max_retries):
         try:
             response = client.models.generate_content(
@@ -51,16 +57,18 @@ def generate_response_to_query(prompt: str, max_retries: int=5) -> str:
             time_delay *= 2
 
 
-def summarize(query: str, limit: int = 5):
-    movies = get_movie_data_from_file()
-    searcher = HybridSearch(documents=movies)
+def summarize(query: str, limit: int = 5, searcher: Optional[HybridSearch]=None):
+    searcher = _hybrid_searcher(searcher)
     results = searcher.rrf_search(query=query, limit=limit)
     prompt = rag_summarize_prompt(query=query, docs=results)
     rag_summary = generate_response_to_query(prompt=prompt)
     return rag_summary, results
 
-def summarize_command(query: str, limit: int=5):
-    rag_summary, docs = summarize(query=query, limit=limit)
+def summarize_command(query: str, limit: int=5, server: Optional[str]=None):
+    if server:
+        rag_summary, docs = SearchClient(server).rag(kind="summarize", query=query, limit=limit)
+    else:
+        rag_summary, docs = summarize(query=query, limit=limit)
 
     print("Search Results:")
     for doc in docs:
@@ -69,16 +77,18 @@ def summarize_command(query: str, limit: int=5):
     print("\nLLM Summary:")
     rag_summary if rag_summary else 'Unable to summarize results via LLM.'
 
-def citations(query: str, limit: int=5):
-    movies = get_movie_data_from_file()
-    searcher = HybridSearch(documents=movies)
+def citations(query: str, limit: int=5, searcher: Optional[HybridSearch]=None):
+    searcher = _hybrid_searcher(searcher)
     results = searcher.rrf_search(query=query, limit=10)
     prompt = rag_citations_prompt(query=query, docs=results)
     rag_ans_with_citations = generate_response_to_query(prompt=prompt)
     return rag_ans_with_citations, results
 
-def citations_command(query: str, limit: int=5):
-    rag_ans, docs = citations(query=query, limit=limit)
+def citations_command(query: str, limit: int=5, server: Optional[str]=None):
+    if server:
+        rag_ans, docs = SearchClient(server).rag(kind="citations", query=query, limit=limit)
+    else:
+        rag_ans, docs = citations(query=query, limit=limit)
 
     print("Search Results:")
     for doc in docs:
@@ -87,16 +97,18 @@ def citations_command(query: str, limit: int=5):
     print("\nLLM Answer:")
     print(rag_ans if rag_ans else 'Unable to answer user query')
 
-def question(query: str, limit: int=5):
-    movies = get_movie_data_from_file()
-    searcher = HybridSearch(documents=movies)
+def question(query: str, limit: int=5, searcher: Optional[HybridSearch]=None):
+    searcher = _hybrid_searcher(searcher)
     results = searcher.rrf_search(query=query, limit=limit)
     prompt = rag_questions_prompt(query=query, docs=results)
     rag_ans_question = generate_response_to_query(prompt=prompt)
     return rag_ans_question, results
 
-def question_command(query: str, limit: int=5) -> None:
-    rag_ans, docs = question(query=query, limit=limit)
+def question_command(query: str, limit: int=5, server: Optional[str]=None) -> None:
+    if server:
+        rag_ans, docs = SearchClient(server).rag(kind="question", query=query, limit=limit)
+    else:
+        rag_ans, docs = question(query=query, limit=limit)
 
     print("Search Results:")
     for doc in docs:
@@ -105,3 +117,10 @@ def question_command(query: str, limit: int=5) -> None:
     print("\nAnswer:")
     print(rag_ans if rag_ans else 'Unable to answer user query')
 
+# answer generators by name, as served by the search server
+RAG_GENERATORS = {
+    "rag": rag,
+    "summarize": summarize,
+    "citations": citations,
+    "question": question
+}
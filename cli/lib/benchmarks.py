@@ -0,0 +1,464 @@
+import json
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from .ann_index import IVFIndex
+from .quantization import ScalarQuantizedEmbeddings, ProductQuantizedEmbeddings
+from .constants import (
+    STOPWORDS_FILE_PATH,
+    MOVIE_EMBEDDINGS_PATH,
+    CHUNK_EMBEDDINGS_PATH,
+    DEFAULT_PQ_SUBSPACES,
+    DEFAULT_RESCORE_FACTOR,
+    DEFAULT_RETRIEVAL_WORKERS
+)
+from .inverted_index import InvertedIndex
+from .query_cache import QueryEmbeddingCache
+from .hybrid_search.logic import HybridSearch
+from .utils import TextAnalyzer, get_movie_data_from_file
+
+_SYLLABLES = ["ba", "ca", "de", "fi", "go", "hu", "ja", "ke", "li", "mo", "nu", "pa", "qui", "ro",
+              "sa", "te", "vi", "wo", "xa", "yu", "ze", "str", "ph", "th", "ch", "sh", "gr", "pl"]
+_SUFFIXES = ["", "", "", "s", "ed", "ing", "er", "ly", "ness", "ation", "ful", "ies", "ment"]
+_FILLER = ["the", "a", "an", "of", "and", "to", "in", "is", "with", "for", "on", "at", "by", "from"]
+
+
+def synthetic_movies(num_docs: int, vocab_size: int=20_000, doc_length: int=120, seed: int=0) -> list[dict]:
+    """Generate ```num_docs``` movie-shaped docs {id, title, description} from a
+    random pseudo-English vocabulary, with stop words mixed in."""
+    rng = random.Random(seed)
+    vocab = set()
+    while len(vocab) < vocab_size:
+        stem = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        vocab.add(stem + rng.choice(_SUFFIXES))
+    vocab = sorted(vocab)
+    # roughly Zipfian word frequencies
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+
+    movies = []
+    for doc_id in range(1, num_docs + 1):
+        words = rng.choices(vocab, weights=weights, k=doc_length)
+        for i in range(0, len(words), 4):
+            words[i] = rng.choice(_FILLER)
+        title = " ".join(rng.choices(vocab, weights=weights, k=3)).title()
+        movies.append({"id": doc_id, "title": title, "description": " ".join(words) + "."})
+    return movies
+
+
+def synthetic_embeddings(num_vectors: int, dimension: int=384, num_topics: int=200, seed: int=0) -> np.ndarray:
+    """Generate unit-length embedding-shaped vectors clustered around
+    ```num_topics``` random topic directions, like sentence embeddings of a
+    corpus are."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((num_topics, dimension)).astype(np.float32)
+    vectors = topics[rng.integers(num_topics, size=num_vectors)]
+    vectors += rng.standard_normal((num_vectors, dimension)).astype(np.float32) * 1.5
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _benchmark_vectors(source: str, num_vectors: int, dimension: int) -> np.ndarray:
+    if source == "synthetic":
+        return synthetic_embeddings(num_vectors=num_vectors, dimension=dimension)
+    path = MOVIE_EMBEDDINGS_PATH if source == "movies" else CHUNK_EMBEDDINGS_PATH
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found, build the {source} embeddings first")
+    vectors = np.load(path).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _benchmark_queries(vectors: np.ndarray, num_queries: int, seed: int=1) -> np.ndarray:
+    # perturbed copies of random rows, so queries land where the data is
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(len(vectors), size=num_queries)].copy()
+    queries += rng.standard_normal(queries.shape).astype(np.float32) * (0.5 / np.sqrt(vectors.shape[1]))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, limit: int) -> tuple[list[np.ndarray], float]:
+    start = time.perf_counter()
+    results = []
+    for query in queries:
+        scores = vectors @ query
+        results.append(np.argpartition(-scores, limit - 1)[:limit])
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def benchmark_ann(source: str="synthetic", num_vectors: int=100_000, dimension: int=384,
+                  num_queries: int=200, limit: int=10, nprobes: list[int]=[1, 4, 16, 64],
+                  nlist: int | None=None) -> dict:
+    """Build an IVF index and measure recall@```limit``` and per-query latency
+    against the exact scan for every ```nprobe``` in ```nprobes```."""
+    vectors = _benchmark_vectors(source=source, num_vectors=num_vectors, dimension=dimension)
+    queries = _benchmark_queries(vectors, num_queries=num_queries)
+    limit = min(limit, len(vectors))
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors, nlist=nlist)
+    build_seconds = time.perf_counter() - start
+
+    exact, exact_seconds = _exact_top_k(vectors, queries, limit)
+    runs = []
+    for nprobe in nprobes:
+        recall = 0.0
+        scanned = 0
+        start = time.perf_counter()
+        for query, exact_rows in zip(queries, exact):
+            rows, scores = index.scan(vectors, query, nprobe)
+            top = rows[np.argpartition(-scores, min(limit, len(rows)) - 1)[:limit]]
+            recall += len(np.intersect1d(top, exact_rows)) / limit
+            scanned += len(rows)
+        runs.append({
+            "nprobe": nprobe,
+            "recall": recall / len(queries),
+            "seconds_per_query": (time.perf_counter() - start) / len(queries),
+            "scanned_fraction": scanned / (len(queries) * len(vectors))
+        })
+
+    return {
+        "num_vectors": len(vectors),
+        "dimension": vectors.shape[1],
+        "nlist": index.nlist,
+        "limit": limit,
+        "build_seconds": build_seconds,
+        "exact_seconds_per_query": exact_seconds,
+        "runs": runs
+    }
+
+
+def benchmark_ann_command(source: str="synthetic", num_vectors: int=100_000, num_queries: int=200,
+                          limit: int=10, nprobes: list[int]=[1, 4, 16, 64], nlist: int | None=None) -> None:
+    print(f"Benchmarking IVF recall@{limit} against the exact scan ({source} embeddings)...")
+    result = benchmark_ann(source=source, num_vectors=num_vectors, num_queries=num_queries,
+                           limit=limit, nprobes=nprobes, nlist=nlist)
+    print(f"Vectors: {result['num_vectors']} x {result['dimension']}, nlist: {result['nlist']}, "
+          f"build: {result['build_seconds']:.2f}s")
+    exact_ms = result["exact_seconds_per_query"] * 1000
+    print(f"Exact scan: {exact_ms:.2f} ms/query")
+    for run in result["runs"]:
+        ann_ms = run["seconds_per_query"] * 1000
+        print(f"nprobe={run['nprobe']:<4} recall@{limit}: {run['recall']:.3f}  "
+              f"{ann_ms:.2f} ms/query ({exact_ms / ann_ms:.1f}x)  "
+              f"scanned {run['scanned_fraction']:.1%}")
+
+
+def benchmark_quantization(source: str="synthetic", num_vectors: int=100_000, dimension: int=384,
+                           num_queries: int=200, limit: int=10, num_subspaces: int=DEFAULT_PQ_SUBSPACES,
+                           rescore_factor: int=DEFAULT_RESCORE_FACTOR) -> dict:
+    """Build int8 and product-quantized copies of the embeddings and measure
+    their memory, recall@```limit``` against the exact float scan and
+    per-query latency, with and without float re-scoring of a
+    ```limit * rescore_factor``` shortlist."""
+    vectors = _benchmark_vectors(source=source, num_vectors=num_vectors, dimension=dimension)
+    queries = _benchmark_queries(vectors, num_queries=num_queries)
+    limit = min(limit, len(vectors))
+    exact, exact_seconds = _exact_top_k(vectors, queries, limit)
+
+    runs = []
+    for name, build in (
+        ("int8", lambda: ScalarQuantizedEmbeddings.build(vectors)),
+        (f"pq{num_subspaces}", lambda: ProductQuantizedEmbeddings.build(vectors, num_subspaces=num_subspaces))
+    ):
+        start = time.perf_counter()
+        quantized = build()
+        build_seconds = time.perf_counter() - start
+        for factor in (0, rescore_factor):
+            recall = 0.0
+            start = time.perf_counter()
+            for query, exact_rows in zip(queries, exact):
+                scores = quantized.scores(query)
+                shortlist = min(len(scores), limit * max(factor, 1))
+                rows = np.argpartition(-scores, shortlist - 1)[:shortlist]
+                if factor:
+                    rescored = vectors[rows] @ query
+                    rows = rows[np.argpartition(-rescored, limit - 1)[:limit]]
+                recall += len(np.intersect1d(rows, exact_rows)) / limit
+            runs.append({
+                "name": name,
+                "rescore_factor": factor,
+                "nbytes": quantized.nbytes,
+                "build_seconds": build_seconds,
+                "recall": recall / len(queries),
+                "seconds_per_query": (time.perf_counter() - start) / len(queries)
+            })
+
+    return {
+        "num_vectors": len(vectors),
+        "dimension": vectors.shape[1],
+        "limit": limit,
+        "float_nbytes": vectors.astype(np.float32).nbytes,
+        "exact_seconds_per_query": exact_seconds,
+        "runs": runs
+    }
+
+
+def benchmark_quantization_command(source: str="synthetic", num_vectors: int=100_000, num_queries: int=200,
+                                   limit: int=10, num_subspaces: int=DEFAULT_PQ_SUBSPACES,
+                                   rescore_factor: int=DEFAULT_RESCORE_FACTOR) -> None:
+    print(f"Benchmarking quantized embeddings recall@{limit} against the exact scan ({source} embeddings)...")
+    result = benchmark_quantization(source=source, num_vectors=num_vectors, num_queries=num_queries, limit=limit,
+                                    num_subspaces=num_subspaces, rescore_factor=rescore_factor)
+    float_mb = result["float_nbytes"] / 2**20
+    print(f"Vectors: {result['num_vectors']} x {result['dimension']}, float32: {float_mb:.1f} MB, "
+          f"exact scan: {result['exact_seconds_per_query'] * 1000:.2f} ms/query")
+    for run in result["runs"]:
+        rescore = f"rescore x{run['rescore_factor']}" if run["rescore_factor"] else "no rescore"
+        print(f"{run['name']:<6} {rescore:<11} {run['nbytes'] / 2**20:6.1f} MB "
+              f"({result['float_nbytes'] / run['nbytes']:.1f}x smaller, build {run['build_seconds']:.1f}s)  "
+              f"recall@{limit}: {run['recall']:.3f}  {run['seconds_per_query'] * 1000:.2f} ms/query")
+
+
+CLI_DIR_PATH = Path(__file__).resolve().parent.parent
+# modules that take seconds to import and must only be loaded by commands that use them
+HEAVY_MODULES = ("torch", "sentence_transformers", "google.genai", "PIL", "nltk")
+
+# run in a fresh interpreter: import one CLI module and report what it cost
+_STARTUP_PROBE = """
+import importlib, json, sys, time
+sys.path.insert(0, {cli_dir!r})
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def benchmark_startup(repeats: int=5) -> list[dict]:
+    """Time importing every CLI entry point (```cli/*_cli.py```), each in a fresh
+    interpreter so nothing is already imported, and list which of the
+    ```HEAVY_MODULES``` the import pulled in."""
+    results = []
+    for cli_path in sorted(CLI_DIR_PATH.glob("*_cli.py")):
+        probe = _STARTUP_PROBE.format(cli_dir=str(CLI_DIR_PATH), module=cli_path.stem, heavy=HEAVY_MODULES)
+        runs = []
+        for _ in range(repeats):
+            completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True)
+            if completed.returncode != 0:
+                error = completed.stderr.strip().splitlines()
+                runs = [{"error": error[-1] if error else f"exit status {completed.returncode}"}]
+                break
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        if "error" in runs[0]:
+            results.append({"cli": cli_path.name, "error": runs[0]["error"]})
+            continue
+        results.append({
+            "cli": cli_path.name,
+            "median_seconds": statistics.median(run["seconds"] for run in runs),
+            "min_seconds": min(run["seconds"] for run in runs),
+            "heavy_modules": runs[0]["heavy"]
+        })
+    return results
+
+
+def benchmark_startup_command(repeats: int=5) -> None:
+    print(f"Importing every CLI entry point in a fresh interpreter ({repeats} runs each)...")
+    for result in benchmark_startup(repeats=repeats):
+        if "error" in result:
+            print(f"{result['cli']:<30} failed: {result['error']}")
+            continue
+        heavy = ", ".join(result["heavy_modules"]) or "none"
+        print(f"{result['cli']:<30} median {result['median_seconds'] * 1000:7.1f} ms  "
+              f"min {result['min_seconds'] * 1000:7.1f} ms  heavy modules loaded: {heavy}")
+
+
+def _legacy_process_text_to_tokens(text: str) -> list[str]:
+    # the text pipeline before TextAnalyzer: stop words re-read per call and
+    # matched against a list, a new stemmer per call, tokens stemmed twice
+    from nltk.stem import PorterStemmer
+
+    tokens = text.translate(str.maketrans("", "", string.punctuation)).lower().split()
+    with open(STOPWORDS_FILE_PATH, "r") as f:
+        stop_words = f.read().splitlines()
+    tokens = [token for token in tokens if token not in stop_words]
+    stemmer = PorterStemmer()
+    tokens = [stemmer.stem(token) for token in tokens]
+    stemmer = PorterStemmer()
+    return [stemmer.stem(token) for token in tokens]
+
+
+def benchmark_analyzer(num_docs: int=10_000) -> dict:
+    """Time tokenizing a synthetic corpus with the legacy pipeline and with
+    ```TextAnalyzer```, and a full in-memory index build with the analyzer."""
+    movies = synthetic_movies(num_docs=num_docs)
+    texts = [f'{movie["title"]} {movie["description"]}' for movie in movies]
+
+    start = time.perf_counter()
+    for text in texts:
+        _legacy_process_text_to_tokens(text)
+    legacy_seconds = time.perf_counter() - start
+
+    analyzer = TextAnalyzer.from_stopwords_file()
+    start = time.perf_counter()
+    for text in texts:
+        analyzer.analyze(text)
+    analyzer_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    InvertedIndex().build(movies)
+    build_seconds = time.perf_counter() - start
+
+    return {
+        "num_docs": num_docs,
+        "num_tokens": sum(len(text.split()) for text in texts),
+        "legacy_seconds": legacy_seconds,
+        "analyzer_seconds": analyzer_seconds,
+        "build_seconds": build_seconds,
+        "stem_cache": analyzer.stem.cache_info()
+    }
+
+
+def benchmark_analyzer_command(num_docs: int=10_000) -> None:
+    print(f"Tokenizing {num_docs} synthetic docs...")
+    result = benchmark_analyzer(num_docs=num_docs)
+    print(f"Tokens: {result['num_tokens']}")
+    print(f"Legacy pipeline:  {result['legacy_seconds']:.2f}s")
+    print(f"TextAnalyzer:     {result['analyzer_seconds']:.2f}s "
+          f"({result['legacy_seconds'] / result['analyzer_seconds']:.1f}x faster)")
+    print(f"Full index build with TextAnalyzer: {result['build_seconds']:.2f}s")
+    cache = result["stem_cache"]
+    print(f"Stem cache: {cache.hits} hits, {cache.misses} misses, {cache.currsize} entries")
+
+
+def benchmark_candidates(num_queries: int=100, limit: int=10, seed: int=0) -> dict:
+    """Run weighted and RRF hybrid search with the fixed candidate pools and
+    with ```adaptive``` pools, on queries made of the titles of random movies.
+    Reports how many candidates the adaptive searches needed, their latency,
+    and how often both returned the same documents in the same order."""
+    documents = get_movie_data_from_file()
+    searcher = HybridSearch(documents=documents)
+    queries = [doc["title"] for doc in random.Random(seed).sample(documents, min(num_queries, len(documents)))]
+    searches = {
+        "rrf": lambda query, adaptive: searcher.rrf_search(query=query, limit=limit, adaptive=adaptive),
+        "weighted": lambda query, adaptive: searcher.weighted_search(query=query, alpha=0.5, limit=limit, adaptive=adaptive)
+    }
+    # embed every query once so both modes hit the query embedding cache
+    searcher.semantic_search.generate_embeddings(queries)
+
+    runs = []
+    for name, search in searches.items():
+        fixed_seconds = adaptive_seconds = 0.0
+        pools, rounds, same = [], [], 0
+        for query in queries:
+            start = time.perf_counter()
+            fixed = search(query, False)
+            fixed_seconds += time.perf_counter() - start
+            max_pool = searcher.last_search_stats["max_pool"]
+
+            start = time.perf_counter()
+            adaptive = search(query, True)
+            adaptive_seconds += time.perf_counter() - start
+            pools.append(searcher.last_search_stats["pool"])
+            rounds.append(searcher.last_search_stats["rounds"])
+            same += [doc["id"] for doc in fixed] == [doc["id"] for doc in adaptive]
+        runs.append({
+            "name": name,
+            "max_pool": max_pool,
+            "mean_pool": statistics.mean(pools),
+            "median_pool": statistics.median(pools),
+            "largest_pool": max(pools),
+            "mean_rounds": statistics.mean(rounds),
+            "agreement": same / len(queries),
+            "fixed_seconds_per_query": fixed_seconds / len(queries),
+            "adaptive_seconds_per_query": adaptive_seconds / len(queries)
+        })
+    return {"num_queries": len(queries), "limit": limit, "runs": runs}
+
+
+def benchmark_candidates_command(num_queries: int=100, limit: int=10) -> None:
+    print(f"Comparing fixed and adaptive candidate pools of hybrid search on {num_queries} queries (limit {limit})...")
+    result = benchmark_candidates(num_queries=num_queries, limit=limit)
+    for run in result["runs"]:
+        print(f"{run['name']:<8} candidates per retriever: mean {run['mean_pool']:.0f}, "
+              f"median {run['median_pool']:.0f}, max {run['largest_pool']} of {run['max_pool']} "
+              f"({run['mean_rounds']:.1f} rounds)  "
+              f"same top {result['limit']}: {run['agreement']:.1%}  "
+              f"{run['fixed_seconds_per_query'] * 1000:.1f} ms fixed, "
+              f"{run['adaptive_seconds_per_query'] * 1000:.1f} ms adaptive")
+
+
+def benchmark_retrieval(num_queries: int=100, limit: int=10, workers: int=DEFAULT_RETRIEVAL_WORKERS,
+                        seed: int=0) -> dict:
+    """Run RRF hybrid search with BM25 and semantic retrieval one after the
+    other (```retrieval_workers=0```) and concurrently (```retrieval_workers=workers```),
+    on queries made of the titles of random movies. Each mode gets its own empty
+    query embedding cache, so every query is encoded. Reports the mean time of
+    each stage and how often both modes returned the same documents."""
+    documents = get_movie_data_from_file()
+    queries = [doc["title"] for doc in random.Random(seed).sample(documents, min(num_queries, len(documents)))]
+
+    runs, results = [], []
+    for retrieval_workers in (0, workers):
+        searcher = HybridSearch(documents=documents, retrieval_workers=retrieval_workers)
+        searcher.semantic_search.query_cache = QueryEmbeddingCache()
+        stages = {"bm25_seconds": [], "semantic_seconds": [], "retrieval_seconds": [],
+                  "fusion_seconds": [], "total_seconds": []}
+        ids = []
+        for query in queries:
+            ids.append([doc["id"] for doc in searcher.rrf_search(query=query, limit=limit)])
+            for stage, seconds in stages.items():
+                seconds.append(searcher.last_search_stats[stage])
+        runs.append({"retrieval_workers": retrieval_workers,
+                     **{stage: statistics.mean(seconds) for stage, seconds in stages.items()}})
+        results.append(ids)
+    agreement = sum(a == b for a, b in zip(*results)) / len(queries)
+    return {"num_queries": len(queries), "limit": limit, "agreement": agreement, "runs": runs}
+
+
+def benchmark_retrieval_command(num_queries: int=100, limit: int=10, workers: int=DEFAULT_RETRIEVAL_WORKERS) -> None:
+    print(f"Comparing sequential and concurrent hybrid retrieval on {num_queries} uncached queries (limit {limit})...")
+    result = benchmark_retrieval(num_queries=num_queries, limit=limit, workers=workers)
+    for run in result["runs"]:
+        mode = "sequential" if run["retrieval_workers"] == 0 else f"concurrent ({run['retrieval_workers']} worker(s))"
+        print(f"{mode:<26} BM25 {run['bm25_seconds'] * 1000:6.1f} ms  semantic {run['semantic_seconds'] * 1000:6.1f} ms  "
+              f"retrieval {run['retrieval_seconds'] * 1000:6.1f} ms  fusion {run['fusion_seconds'] * 1000:5.1f} ms  "
+              f"total {run['total_seconds'] * 1000:6.1f} ms")
+    print(f"Same top {result['limit']}: {result['agreement']:.1%}")
+
+
+def benchmark_batch(num_queries: int=200, limit: int=10, workers: int | None=None, seed: int=0) -> dict:
+    """Answer the same uncached queries (titles of random movies) with a loop
+    of ```rrf_search``` calls and with one ```rrf_search_batch``` call, each mode
+    with its own empty query embedding cache. Reports the time per query of
+    both and how often they returned the same documents."""
+    documents = get_movie_data_from_file()
+    queries = [doc["title"] for doc in random.Random(seed).sample(documents, min(num_queries, len(documents)))]
+    searcher = HybridSearch(documents=documents, bm25_workers=workers)
+
+    searcher.semantic_search.query_cache = QueryEmbeddingCache()
+    start = time.perf_counter()
+    looped = [searcher.rrf_search(query=query, limit=limit) for query in queries]
+    loop_seconds = time.perf_counter() - start
+
+    searcher.semantic_search.query_cache = QueryEmbeddingCache()
+    start = time.perf_counter()
+    batched = searcher.rrf_search_batch(queries=queries, limit=limit)
+    batch_seconds = time.perf_counter() - start
+    searcher.close()
+
+    same = sum([doc["id"] for doc in a] == [doc["id"] for doc in b] for a, b in zip(looped, batched))
+    return {
+        "num_queries": len(queries),
+        "limit": limit,
+        "agreement": same / len(queries),
+        "loop_seconds_per_query": loop_seconds / len(queries),
+        "batch_seconds_per_query": batch_seconds / len(queries),
+        "batch_stats": searcher.last_search_stats
+    }
+
+
+def benchmark_batch_command(num_queries: int=200, limit: int=10, workers: int | None=None) -> None:
+    print(f"Comparing looped and batched RRF hybrid search on {num_queries} uncached queries (limit {limit})...")
+    result = benchmark_batch(num_queries=num_queries, limit=limit, workers=workers)
+    stats = result["batch_stats"]
+    print(f"loop:  {result['loop_seconds_per_query'] * 1000:.1f} ms per query")
+    print(f"batch: {result['batch_seconds_per_query'] * 1000:.1f} ms per query "
+          f"(BM25 {stats['bm25_seconds']:.2f} s, semantic {stats['semantic_seconds']:.2f} s, "
+          f"retrieval {stats['retrieval_seconds']:.2f} s, fusion {stats['fusion_seconds']:.2f} s)")
+    print(f"Same top {result['limit']}: {result['agreement']:.1%}")
@@ -0,0 +1,159 @@
+import heapq
+from collections import Counter
+from typing import TYPE_CHECKING
+from .utils import process_text_to_tokens
+from .constants import BM25_K1, BM25_B
+
+if TYPE_CHECKING:
+    from .inverted_index import InvertedIndex
+
+class BM25Scorer:
+    """
+    Term-at-a-time BM25 scoring engine over a loaded ```InvertedIndex```.
+
+    Nothing that is independent of the query is computed per posting: the
+    average document length and, for every document, the length normalisation
+    term ```k1 * (1 - b + b * doc_len / avg_doc_len)``` come precomputed from the
+    index (or are computed once when the scorer is created for a different
+    ```k1```/```b```).
+    A query is tokenized once and scores are accumulated directly from each
+    token's posting list, using the index's precomputed IDF table.
+
+    ```search``` selects the top ```limit``` docs with a heap and, when the
+    index carries per-term upper-bound scores for the scorer's ```k1```/```b```,
+    applies MaxScore pruning: query terms are processed from highest to lowest
+    upper bound, and once the scores still to come cannot lift an unseen doc
+    above the current k-th best score, the remaining terms only update docs
+    that are already candidates; candidates that can no longer reach the
+    top k are dropped.
+
+    Attributes:
+        index (InvertedIndex):
+            The loaded inverted index to score against.
+        k1 (float):
+            BM25 term frequency saturation parameter.
+        b (float):
+            BM25 document length normalisation parameter.
+        avg_doc_length (float):
+            Average number of tokens per document.
+        length_norms (Mapping[int, float]):
+            Mapping from doc id to its precomputed length normalisation term.
+        last_query_stats (dict[str, int]):
+            Postings scored and skipped by the most recent ```search``` call."""
+    def __init__(self, index: "InvertedIndex", k1: float=BM25_K1, b: float=BM25_B):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = index.avg_doc_length
+        self.last_query_stats = {"postings_scored": 0, "postings_skipped": 0}
+
+        # length norms and upper bounds are precomputed by the index for one (k1, b)
+        self.term_upper_bounds = None
+        if (k1, b) == index.bm25_params:
+            self.length_norms = index.length_norms
+            self.term_upper_bounds = index.term_upper_bounds
+            return
+
+        self.length_norms = {}
+        if self.avg_doc_length > 0:
+            for doc_id, doc_length in index.doc_lengths.items():
+                length_norm = 1 - b + b * (doc_length / self.avg_doc_length)
+                self.length_norms[doc_id] = k1 * length_norm
+
+    def score_tokens(self, query_tokens: list[str]) -> dict[int, float]:
+        """Accumulate the BM25 score of every doc matching at least one of the
+        (already processed) query tokens. Returns a dict doc_id -> score."""
+        length_norms = self.length_norms
+        k1_plus_one = self.k1 + 1
+
+        scores: dict[int, float] = {}
+        for token in query_tokens:
+            postings = self.index.index.get(token)
+            if not postings:
+                continue
+            idf = self.index.bm25_idfs[token]
+            for doc_id, tf in postings.items():
+                bm25tf = (tf * k1_plus_one) / (tf + length_norms[doc_id])
+                scores[doc_id] = scores.get(doc_id, 0.0) + bm25tf * idf
+        return scores
+
+    def search(self, query: str, limit: int) -> list[tuple[int, float]]:
+        """Score ```query``` and return the top ```limit``` (doc_id, bm25 score)
+        pairs sorted by score."""
+        query_tokens = process_text_to_tokens(query)
+        return self.top_k(query_tokens=query_tokens, limit=limit)
+
+    def top_k(self, query_tokens: list[str], limit: int) -> list[tuple[int, float]]:
+        """Return the top ```limit``` (doc_id, bm25 score) pairs for the (already
+        processed) query tokens, pruning with the per-term upper bounds when
+        they are available."""
+        if limit <= 0:
+            return []
+        if not self.term_upper_bounds:
+            scores = self.score_tokens(query_tokens)
+            postings_scored = sum(len(self.index.index.get(token, ())) for token in query_tokens)
+            self.last_query_stats = {"postings_scored": postings_scored, "postings_skipped": 0}
+            return heapq.nlargest(limit, scores.items(), key=lambda d: d[1])
+
+        # repeated tokens contribute once per occurrence
+        query_terms = [
+            (token, count) for token, count in Counter(query_tokens).items()
+            if self.index.index.get(token)
+        ]
+        query_terms.sort(key=lambda t: self.term_upper_bounds[t[0]] * t[1], reverse=True)
+
+        # remaining_bounds[i] -> max score still obtainable from terms i..end
+        remaining_bounds = [0.0] * (len(query_terms) + 1)
+        for i in range(len(query_terms) - 1, -1, -1):
+            token, count = query_terms[i]
+            remaining_bounds[i] = remaining_bounds[i + 1] + self.term_upper_bounds[token] * count
+
+        length_norms = self.length_norms
+        k1_plus_one = self.k1 + 1
+
+        scores: dict[int, float] = {}
+        postings_scored = 0
+        postings_skipped = 0
+        for i, (token, count) in enumerate(query_terms):
+            postings = self.index.index[token]
+            weight = self.index.bm25_idfs[token] * count
+
+            threshold = None
+            if len(scores) >= limit:
+                threshold = heapq.nlargest(limit, scores.values())[-1]
+
+            if threshold is None or remaining_bounds[i] >= threshold:
+                # a doc not seen yet can still make the top k
+                for doc_id, tf in postings.items():
+                    bm25tf = (tf * k1_plus_one) / (tf + length_norms[doc_id])
+                    scores[doc_id] = scores.get(doc_id, 0.0) + bm25tf * weight
+                postings_scored += len(postings)
+                continue
+
+            # only current candidates can make the top k, drop the hopeless ones
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if score + remaining_bounds[i] >= threshold
+            }
+            if len(scores) < len(postings):
+                # few candidates left, binary search each one in the posting list
+                candidate_tfs = ((doc_id, postings.get_tf(doc_id)) for doc_id in scores)
+            else:
+                candidate_tfs = (
+                    (doc_id, tf) for doc_id, tf in postings.items() if doc_id in scores
+                )
+            matched = 0
+            for doc_id, tf in candidate_tfs:
+                if not tf:
+                    continue
+                bm25tf = (tf * k1_plus_one) / (tf + length_norms[doc_id])
+                scores[doc_id] += bm25tf * weight
+                matched += 1
+            postings_scored += matched
+            postings_skipped += len(postings) - matched
+
+        self.last_query_stats = {
+            "postings_scored": postings_scored,
+            "postings_skipped": postings_skipped
+        }
+        return heapq.nlargest(limit, scores.items(), key=lambda d: d[1])
@@ -1,6 +1,6 @@
 import json
 from .constants import GOLDEN_DATASET_FILE_PATH
-from .hybrid_search import HybridSearch
+from .hybrid_search.logic import HybridSearch
 from .utils import get_movie_data_from_file
 
 
@@ -14,10 +14,13 @@ def calculate_evaluation_scores(k: int=5):
     movies = get_movie_data_from_file()
     searcher = HybridSearch(documents=movies)  
     
+    # all queries are searched in one batch
+    queries = [test_case["query"] for test_case in test_cases]
+    batch_results = searcher.rrf_search_batch(queries=queries, k=60, limit=k)
+
     results = []
-    for test_case in test_cases:
+    for test_case, retrieved_docs in zip(test_cases, batch_results):
         query = test_case["query"]
-        retrieved_docs = searcher.rrf_search(query=query, k=60, limit=k)
         precision_score = _calculate_precision_score(
             retrieved=retrieved_docs, 
             relevant=test_case["relevant_docs"])
@@ -4,6 +4,7 @@ from lib.constants import (
 )
 from .logic import ChunkedSemanticSearch, semantic_chunk
 from lib.utils import get_movie_data_from_file
+from lib.search_client import SearchClient
 import re
 
 def semantic_chunk(text: str, max_chunk_size: int = DEFAULT_SEMANTIC_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP) -> list[str]:
@@ -43,11 +44,27 @@ def embed_chunks_command():
     chunk_embeddings = chunked_sem_search.load_or_create_chunk_embeddings(movies_list)
     print(f"Generated {len(chunk_embeddings)} chunked embeddings")
 
-def search_chunked_command(query: str, limit: int=5) -> list[dict]:
+def build_chunk_ann_command(nlist: int | None=None):
     movies_list = get_movie_data_from_file()
-    searcher = ChunkedSemanticSearch()
-    chunk_embeddings = searcher.load_or_create_chunk_embeddings(documents=movies_list)
-    results = searcher.search_chunks(query=query, limit=limit)
+    chunked_sem_search = ChunkedSemanticSearch()
+    chunked_sem_search.load_or_create_chunk_embeddings(movies_list)
+    ann_index = chunked_sem_search.load_or_create_chunk_ann_index(nlist=nlist)
+    print(f"IVF index over {len(ann_index.list_rows)} chunk embeddings with {ann_index.nlist} lists")
+
+def search_chunked_command(query: str, limit: int=5, nprobe: int | None=None, quantized: str | None=None,
+                           server: str | None=None) -> list[dict]:
+    if server:
+        # ANN / quantization are configured when the server starts
+        results = SearchClient(server).chunked_search(query=query, limit=limit)
+    else:
+        movies_list = get_movie_data_from_file()
+        searcher = ChunkedSemanticSearch()
+        chunk_embeddings = searcher.load_or_create_chunk_embeddings(documents=movies_list)
+        if nprobe is not None:
+            searcher.load_or_create_chunk_ann_index(nprobe=nprobe)
+        if quantized is not None:
+            searcher.load_or_create_chunk_quantized_embeddings(kind=quantized)
+        results = searcher.search_chunks(query=query, limit=limit)
 
     print(f"Searching for '{query}'. Generating upto {limit} results...")
     for i, result in enumerate(results, 1):
@@ -4,11 +4,33 @@ import json
 from lib.constants import (
     CACHE_DIR_PATH,
     CHUNK_EMBEDDINGS_PATH, 
+    LEGACY_CHUNK_EMBEDDINGS_PATH,
+    CHUNK_EMBEDDINGS_MANIFEST_PATH,
     CHUNK_METADATA_PATH, 
+    LEGACY_CHUNK_METADATA_PATH,
+    CHUNK_ANN_INDEX_PATH,
+    CHUNK_QUANTIZED_EMBEDDINGS_PATHS,
+    DEFAULT_ANN_NPROBE,
+    DEFAULT_RESCORE_FACTOR,
     DEFAULT_SEMANTIC_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP,
-    SCORE_PRECISION
+    SCORE_PRECISION,
+    SEMANTIC_BATCH_BLOCK_SIZE
 )
-from lib.semantic_search.logic import SemanticSearch, cosine_similarity
+from lib.ann_index import IVFIndex, load_or_build_ivf_index
+from lib.quantization import load_or_build_quantized_embeddings
+from lib.embedding_store import (
+    EmbeddingManifest,
+    normalize_rows,
+    save_embeddings,
+    load_embeddings,
+    migrate_legacy_embeddings,
+    merge_embeddings,
+    content_hashes
+)
+from lib.query_cache import QueryEmbeddingCache
+from lib.semantic_search.logic import SemanticSearch, top_k_indices
+
+CHUNK_METADATA_FIELDS = ("movie_idx", "chunk_idx", "total_chunks")
 
 class ChunkedSemanticSearch(SemanticSearch):
     """
@@ -26,23 +48,71 @@ class ChunkedSemanticSearch(SemanticSearch):
         • Per-chunk embedding creation and caching
         • Search that scores individual chunks, then aggregates scores
           at the document level
+
+    Chunk scoring is vectorized: chunk embeddings are stored L2-normalized
+    (and memory-mapped like the document embeddings), a query is scored against every chunk with one matrix-vector product, and
+    the max score per document is taken with ```np.maximum.reduceat``` over the
+    runs of chunks belonging to the same document.
+
+    Once ```load_or_create_chunk_ann_index()``` is called, only the chunks in the
+    ```chunk_ann_nprobe``` nearest lists of an IVF index over the chunk
+    embeddings are scored and pooled.
+
+    Once ```load_or_create_chunk_quantized_embeddings()``` is called, chunks are
+    scored from quantized codes and the top ```limit * chunk_rescore_factor```
+    docs are re-scored from the float embeddings of all their chunks.
     Attributes:
         chunk_embeddings (np.ndarray | None):
-            Embedding matrix of all text chunks generated from all documents.
+            L2-normalized embedding matrix of all text chunks generated from all documents,
+            in the order they are stored on disk.
 
-        chunk_metadata (list[dict] | None):
-            Metadata objects describing each chunk, including:
+        chunk_metadata (dict[str, np.ndarray] | None):
+            Columnar metadata, one ```int32``` array per field with one entry per chunk:
             {
                 "movie_idx": <document id>,
                 "chunk_idx": <chunk index within the document>,
                 "total_chunks": <total chunks for this document>
             }
+
+        normalized_chunk_embeddings (np.ndarray | None):
+            ```chunk_embeddings``` ordered so that the chunks of each document are
+            contiguous (the same matrix when they already are).
+
+        chunk_order (np.ndarray | None):
+            Row of ```chunk_embeddings``` for each row of ```normalized_chunk_embeddings```,
+            ```None``` when they are in the same order.
+
+        chunk_group_starts (np.ndarray | None):
+            Row in ```normalized_chunk_embeddings``` where each document's run of chunks starts.
+
+        chunk_group_doc_ids (np.ndarray | None):
+            Doc id of each run in ```chunk_group_starts```.
+
+        chunk_ann_index (IVFIndex | None):
+            Approximate nearest neighbour index over ```normalized_chunk_embeddings```, if enabled.
+
+        chunk_ann_nprobe (int):
+            Number of IVF lists each query scores when ```chunk_ann_index``` is set.
+
+        chunk_quantized_embeddings (ScalarQuantizedEmbeddings | ProductQuantizedEmbeddings | None):
+            Compressed ```normalized_chunk_embeddings```, if enabled.
+
+        chunk_rescore_factor (int):
+            Docs re-scored with float embeddings, as a multiple of ```limit``` (0 = no re-scoring).
 """
 
-    def __init__(self, model_name="all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
+    def __init__(self, model_name="all-MiniLM-L6-v2", query_cache: QueryEmbeddingCache | None=None) -> None:
+        super().__init__(model_name, query_cache=query_cache)
         self.chunk_embeddings = None
         self.chunk_metadata = None
+        self.normalized_chunk_embeddings = None
+        self.chunk_order = None
+        self.chunk_group_starts = None
+        self.chunk_group_doc_ids = None
+        self.chunk_ann_index = None
+        self.chunk_ann_nprobe = DEFAULT_ANN_NPROBE
+        self.chunk_quantized_embeddings = None
+        self.chunk_rescore_factor = DEFAULT_RESCORE_FACTOR
 
     def build_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
         """
@@ -52,95 +122,217 @@ class ChunkedSemanticSearch(SemanticSearch):
         1. Populate the ```document_map``` attribute. 
         2. For every document, split the description text for doc into a list of chunks.
         3. For every chunk in a doc's list of chunks, append the chunk to a list containing all chunks from all docs.
-        4. Then, append to the ```chunk_metadata``` attribute a ```dict``` containing metadata about the current chunk.
+        4. Then, append the doc id, chunk index and total chunks of the current chunk to the metadata columns.
         5. Encode (create embeddings vector list) for the list containing all chunks, store in ```chunk_embeddings```attribute.
-        6. Store the ```list[dict]``` of **chunks_metadata** in ```chunks_metadata``` attribute.
+        6. Store the metadata columns as arrays in the ```chunk_metadata``` attribute.
         7. Create **cache/** directory in project root if it does not exist.
-        8. Save the ```chunk_embeddings``` to a **.npy** file, ```chunks_metadata``` to a **.json file** in the **cache/** directory.
+        8. Save the normalized ```chunk_embeddings``` to a **.npy** file, ```chunk_metadata``` to a **.npz file**
+           and the content hashes of every doc and chunk to a manifest in the **cache/** directory.
         """
         # documents -> list of {movie_id, title, description}
         self.documents = documents
-        all_chunks = []
-        chunks_metadata: list[dict] = []
         self.document_map = {}
-        for doc_index, doc in enumerate(self.documents):
+        for doc in self.documents:
             self.document_map[doc["id"]] = doc
-            if not doc["description"].strip():
-                continue
-            # split the description text for doc/movie into chunks
-            doc_description_chunks = semantic_chunk(text=doc["description"], max_chunk_size=DEFAULT_SEMANTIC_CHUNK_SIZE, 
-                                                            overlap=DEFAULT_CHUNK_OVERLAP)
-            for chunk_index, description_chunk in enumerate(doc_description_chunks):
-                all_chunks.append(description_chunk)
-                chunks_metadata.append(
-                    {
-                        "movie_idx": doc["id"],
-                        "chunk_idx": chunk_index,
-                        "total_chunks": len(doc_description_chunks)
-                    }
-                )
-        self.chunk_embeddings = self.model.encode(all_chunks, show_progress_bar=True)
-        self.chunk_metadata = chunks_metadata
-        CACHE_DIR_PATH.mkdir(parents=True, exist_ok=True)
-        np.save(CHUNK_EMBEDDINGS_PATH, self.chunk_embeddings)
-        
-        with open(CHUNK_METADATA_PATH, "w") as f:
-            json.dump({"chunks": self.chunk_metadata, "total_chunks": len(all_chunks)}, f, indent=2)
-        
-        return self.chunk_embeddings
+        return self._update_chunk_embeddings(chunk_source_hashes(documents))
     
     def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
         """
         Populate the ```document_map``` attribute. Load precomputed **chunk embeddings** and **chunks metadata** into 
         the ```chunk_embeddings``` and ```chunk_metadata``` attributes respectively. If the data does not exist,
-        call ```build_chunk_embeddings(document)``` to build embeddings."""
+        call ```build_chunk_embeddings(document)``` to build embeddings.
+
+        The cache is checked against the content hash of every document: the chunks of unchanged
+        docs are reused as they are, edited and new docs are re-chunked and only chunks whose text
+        is not in the cache are encoded. A different model or chunking configuration rebuilds it.
+
+        Chunk embeddings are memory-mapped unless ```mmap_embeddings``` is off. Metadata cached as
+        **.json** and un-normalized embeddings cached by older versions are converted once."""
         self.documents = documents
         self.document_map = {}
         for doc in self.documents:
             self.document_map[doc["id"]] = doc
 
+        if not CHUNK_METADATA_PATH.exists() and LEGACY_CHUNK_METADATA_PATH.exists():
+            migrate_json_chunk_metadata(LEGACY_CHUNK_METADATA_PATH, CHUNK_METADATA_PATH)
+        if not CHUNK_EMBEDDINGS_PATH.exists() and LEGACY_CHUNK_EMBEDDINGS_PATH.exists():
+            migrate_legacy_embeddings(LEGACY_CHUNK_EMBEDDINGS_PATH, CHUNK_EMBEDDINGS_PATH)
+
         if CHUNK_EMBEDDINGS_PATH.exists() and CHUNK_METADATA_PATH.exists():
-            self.chunk_embeddings = np.load(CHUNK_EMBEDDINGS_PATH)
-            with open(CHUNK_METADATA_PATH, "r") as f:
-                metadata = json.load(f)
-                self.chunk_metadata = metadata["chunks"]
-            return self.chunk_embeddings
+            source_hashes = chunk_source_hashes(documents)
+            cached = load_embeddings(CHUNK_EMBEDDINGS_PATH, mmap=self.mmap_embeddings)
+            chunk_metadata = load_chunk_metadata(CHUNK_METADATA_PATH)
+            manifest = self._cached_chunk_manifest(cached, chunk_metadata)
+            if manifest is not None and np.array_equal(manifest.source_hashes, source_hashes):
+                self.chunk_embeddings = cached
+                self.chunk_metadata = chunk_metadata
+                self._index_chunks()
+                return self.chunk_embeddings
+            if manifest is not None:
+                return self._update_chunk_embeddings(source_hashes, cached, manifest)
         return self.build_chunk_embeddings(documents=documents)
+
+    def _chunk_cache_key(self) -> str:
+        return (f"{self.model_name}|semantic_chunk(max_chunk_size={DEFAULT_SEMANTIC_CHUNK_SIZE}, "
+                f"overlap={DEFAULT_CHUNK_OVERLAP})")
+
+    def _cached_chunk_manifest(self, cached: np.ndarray,
+                               chunk_metadata: dict[str, np.ndarray]) -> EmbeddingManifest | None:
+        """Manifest of the ```cached``` chunk embeddings if they can be reused. A cache
+        written before manifests existed is adopted (and a manifest is written) if
+        re-chunking the current documents reproduces its metadata."""
+        if len(chunk_metadata["movie_idx"]) != len(cached):
+            return None
+        if CHUNK_EMBEDDINGS_MANIFEST_PATH.exists():
+            manifest = EmbeddingManifest.load(CHUNK_EMBEDDINGS_MANIFEST_PATH)
+            return manifest if manifest.matches(self._chunk_cache_key(), len(cached)) else None
+
+        chunks, chunk_columns, source_hashes = [], {field: [] for field in CHUNK_METADATA_FIELDS}, []
+        for doc, source_hash in zip(self.documents, chunk_source_hashes(self.documents).tolist()):
+            doc_chunks = chunk_document(doc)
+            chunks.extend(doc_chunks)
+            source_hashes.extend([source_hash] * len(doc_chunks))
+            chunk_columns["movie_idx"].extend([doc["id"]] * len(doc_chunks))
+            chunk_columns["chunk_idx"].extend(range(len(doc_chunks)))
+        if not all(np.array_equal(chunk_metadata[field], chunk_columns[field]) for field in ("movie_idx", "chunk_idx")):
+            return None
+        manifest = EmbeddingManifest(
+            self._chunk_cache_key(),
+            row_hashes=content_hashes(chunks),
+            row_source_hashes=np.asarray(source_hashes, dtype=np.uint64),
+            source_hashes=chunk_source_hashes(self.documents)
+        )
+        manifest.save(CHUNK_EMBEDDINGS_MANIFEST_PATH)
+        return manifest
+
+    def _update_chunk_embeddings(self, source_hashes: np.ndarray, cached: np.ndarray | None=None,
+                                 manifest: EmbeddingManifest | None=None) -> np.ndarray:
+        """Chunk and encode ```documents``` (steps 2-8 of ```build_chunk_embeddings```),
+        reusing rows of ```cached```: a doc whose hash is in ```manifest``` keeps its
+        chunks without being re-chunked, and a chunk whose text hash is in ```manifest```
+        keeps its embedding. Only the remaining chunks are encoded."""
+        cached_docs: dict[int, tuple[int, int]] = {}  # doc hash -> (start, end) of its rows in ```cached```
+        cached_chunks: dict[int, int] = {}  # chunk hash -> row in ```cached```
+        if manifest is not None and len(manifest.row_hashes):
+            row_sources = manifest.row_source_hashes
+            run_starts = np.flatnonzero(np.concatenate(([True], row_sources[1:] != row_sources[:-1])))
+            run_ends = np.append(run_starts[1:], len(row_sources))
+            cached_docs = dict(zip(row_sources[run_starts].tolist(), zip(run_starts.tolist(), run_ends.tolist())))
+            cached_chunks = {h: row for row, h in enumerate(manifest.row_hashes.tolist())}
+
+        rows: list[int] = []
+        row_hashes: list[int] = []
+        row_source_hashes: list[int] = []
+        new_chunks: list[str] = []
+        chunks_metadata: dict[str, list[int]] = {field: [] for field in CHUNK_METADATA_FIELDS}
+        for doc, source_hash in zip(self.documents, source_hashes.tolist()):
+            if source_hash in cached_docs:
+                start, end = cached_docs[source_hash]
+                doc_rows = list(range(start, end))
+                chunk_hashes = manifest.row_hashes[start:end].tolist()
+            else:
+                # split the description text for doc/movie into chunks
+                doc_description_chunks = chunk_document(doc)
+                chunk_hashes = content_hashes(doc_description_chunks).tolist()
+                doc_rows = [cached_chunks.get(h, -1) for h in chunk_hashes]
+                new_chunks.extend(chunk for chunk, row in zip(doc_description_chunks, doc_rows) if row < 0)
+            rows.extend(doc_rows)
+            row_hashes.extend(chunk_hashes)
+            row_source_hashes.extend([source_hash] * len(doc_rows))
+            chunks_metadata["movie_idx"].extend([doc["id"]] * len(doc_rows))
+            chunks_metadata["chunk_idx"].extend(range(len(doc_rows)))
+            chunks_metadata["total_chunks"].extend([len(doc_rows)] * len(doc_rows))
+
+        encoded = self.model.encode(new_chunks, show_progress_bar=True) if new_chunks or cached is None else None
+        chunk_embeddings = merge_embeddings(cached, np.asarray(rows, dtype=np.int64), encoded)
+        self.chunk_metadata = {
+            field: np.asarray(values, dtype=np.int32) for field, values in chunks_metadata.items()
+        }
+        CACHE_DIR_PATH.mkdir(parents=True, exist_ok=True)
+        self.chunk_embeddings = save_embeddings(CHUNK_EMBEDDINGS_PATH, chunk_embeddings)
+        self._index_chunks()
+        save_chunk_metadata(CHUNK_METADATA_PATH, self.chunk_metadata)
+        EmbeddingManifest(
+            self._chunk_cache_key(),
+            row_hashes=np.asarray(row_hashes, dtype=np.uint64),
+            row_source_hashes=np.asarray(row_source_hashes, dtype=np.uint64),
+            source_hashes=source_hashes
+        ).save(CHUNK_EMBEDDINGS_MANIFEST_PATH)
+        LEGACY_CHUNK_METADATA_PATH.unlink(missing_ok=True)
+        
+        return self.chunk_embeddings
     
+    def _index_chunks(self) -> None:
+        """Prepare ```chunk_embeddings``` and ```chunk_metadata``` for vectorized search:
+        group the chunk embeddings into one contiguous run of rows per document."""
+        chunk_doc_ids = self.chunk_metadata["movie_idx"]
+        normalized = self.chunk_embeddings
+        run_starts = np.flatnonzero(np.diff(chunk_doc_ids, prepend=-1) != 0)
+        order = None
+        if len(run_starts) != len(np.unique(chunk_doc_ids)):
+            # a doc's chunks are not contiguous, regroup them (stable keeps chunk order)
+            order = np.argsort(chunk_doc_ids, kind="stable")
+            chunk_doc_ids = chunk_doc_ids[order]
+            normalized = normalized[order]
+            run_starts = np.flatnonzero(np.diff(chunk_doc_ids, prepend=-1) != 0)
+        self.normalized_chunk_embeddings = normalized
+        self.chunk_order = order
+        self.chunk_group_starts = run_starts
+        self.chunk_group_doc_ids = chunk_doc_ids[run_starts]
+        self.chunk_ann_index = None
+        self.chunk_quantized_embeddings = None
+
+    def load_or_create_chunk_ann_index(self, nprobe: int=DEFAULT_ANN_NPROBE, nlist: int | None=None) -> IVFIndex:
+        """Load the IVF index over the chunk embeddings from ```cache/```, or build
+        and save it if it is missing or was built from other embeddings, and
+        use it for all following chunk searches with ```nprobe``` lists per query."""
+        self.chunk_ann_index = load_or_build_ivf_index(
+            CHUNK_ANN_INDEX_PATH, self._normalized_chunk_vectors(), nlist=nlist
+        )
+        self.chunk_ann_nprobe = nprobe
+        return self.chunk_ann_index
+
+    def load_or_create_chunk_quantized_embeddings(self, kind: str="int8", rescore_factor: int=DEFAULT_RESCORE_FACTOR):
+        """Load the ```kind``` (```int8``` or ```pq```) quantized chunk embeddings
+        from ```cache/```, or build and save them, and score all following
+        chunk searches from them. Like ```load_or_create_quantized_embeddings```,
+        the float chunk matrix is released and ```chunk_embeddings``` is
+        (re-)opened memory-mapped for re-scoring."""
+        vectors = self._normalized_chunk_vectors()
+        self.chunk_quantized_embeddings = load_or_build_quantized_embeddings(
+            CHUNK_QUANTIZED_EMBEDDINGS_PATHS[kind], vectors, kind
+        )
+        self.chunk_rescore_factor = rescore_factor
+        self.normalized_chunk_embeddings = None
+        self.chunk_embeddings = load_embeddings(CHUNK_EMBEDDINGS_PATH, mmap=True)
+        return self.chunk_quantized_embeddings
+
+    def _normalized_chunk_vectors(self) -> np.ndarray:
+        if self.chunk_group_starts is None or len(self.chunk_group_starts) == 0:
+            raise ValueError("No chunk embeddings loaded. Call `load_or_create_chunk_embeddings` first.")
+        if self.normalized_chunk_embeddings is not None:
+            return self.normalized_chunk_embeddings
+        if self.chunk_order is None:
+            return self.chunk_embeddings
+        return self.chunk_embeddings[self.chunk_order]
+
+    def _float_chunk_rows(self, rows: np.ndarray) -> np.ndarray:
+        # rows are positions in the grouped order, chunk_embeddings is in file order
+        return self.chunk_embeddings[rows if self.chunk_order is None else self.chunk_order[rows]]
+
     def search_chunks(self, query: str, limit: int=10):
         """Search for a user's query in the chunks generated for all docs.
         Given a query by the user, generate an **embedding vector** for it by calling the super class's ```generate_embedding(query)```
-        method. Iterate over every chunk embedding in ```chunk_embeddings``` attribute, compute the **cosine_similarity score** for
-        the query and the chunk, append to a list of chunk scores. Iterating over all chunk scores, create a dictionary 
-        where **key=doc_id** and **value=highest score amongst all chunks in that doc**. 
+        method. Score it against every chunk with one product against ```normalized_chunk_embeddings```
+        (**cosine similarity**), then take the **highest score amongst all chunks in each doc** with
+        ```np.maximum.reduceat``` and return the top ```limit``` docs.
+        With a chunk ANN index, only its candidate chunks are scored; with
+        quantized chunk embeddings, the best docs are re-scored with float embeddings.
          """
-        query_embedding = self.generate_embedding(text=query)
-        chunk_scores: list[dict] = []
-        for chunk_idx, ch_embedding in enumerate(self.chunk_embeddings):
-            similarity_score = cosine_similarity(ch_embedding, query_embedding)            
-            chunk_scores.append({
-                "chunk_idx": chunk_idx,
-                "movie_idx": self.chunk_metadata[chunk_idx]["movie_idx"],
-                "score": similarity_score
-            })        
-        # {movie_index/doc_id -> score}
-        movie_scores = {}
-
-        for chunk_score in chunk_scores:
-            movie_idx = chunk_score["movie_idx"]
-            if (
-                movie_idx not in movie_scores
-                or chunk_score["score"] > movie_scores[movie_idx]
-            ):
-                movie_scores[movie_idx] = chunk_score["score"]
-
-        sorted_scores = dict(
-            list(sorted(movie_scores.items(), key=lambda item: item[1], reverse=True))[:limit]
-        )
-
+        doc_ids, scores = self.search_chunk_scores(query=query, limit=limit)
 
         results: list[dict] = []
-        for doc_id, doc_score in sorted_scores.items():
+        for doc_id, score in zip(doc_ids.tolist(), scores.tolist()):
             doc_title = self.document_map[doc_id]["title"]
             doc_description = self.document_map[doc_id]["description"][:100]
             metadata = self.document_map[doc_id].get("metadata", {})
@@ -148,12 +340,125 @@ class ChunkedSemanticSearch(SemanticSearch):
                 "id": doc_id,
                 "title": doc_title,
                 "document": doc_description,
-                "score": round(doc_score, SCORE_PRECISION),
+                "score": score,
                 "metadata": metadata
             })
 
         return results
 
+    def search_chunk_scores(self, query: str, limit: int=10) -> tuple[np.ndarray, np.ndarray]:
+        """The ranking of ```search_chunks``` as arrays, without building result
+        dicts: doc IDs (```int64```) and their scores rounded to ```SCORE_PRECISION```,
+        best first. For callers that fuse or re-rank many candidates."""
+        query_embedding = normalize_rows(self.generate_embedding(text=query))
+        if self.chunk_group_starts is None or len(self.chunk_group_starts) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        groups, doc_scores = self._chunk_doc_scores(query_embedding, limit)
+        return self._top_docs(groups, doc_scores, limit)
+
+    def search_chunk_scores_batch(self, queries: list[str], limit: int=10) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Like ```search_chunk_scores```, for several queries at once: all queries
+        are encoded in one call and scored against every chunk with one
+        matrix-matrix product per block of ```SEMANTIC_BATCH_BLOCK_SIZE``` queries,
+        reduced to one score per doc with ```np.maximum.reduceat``` along the
+        chunk axis and to the top ```limit``` docs before the next block, which
+        bounds memory for thousands of queries. With a chunk ANN index or
+        quantized chunk embeddings each query is scored on its own. Returns one
+        (doc IDs, scores) pair per query, in order."""
+        if not queries:
+            return []
+        query_embeddings = normalize_rows(self.generate_embeddings(texts=queries))
+        if self.chunk_group_starts is None or len(self.chunk_group_starts) == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)) for _ in queries]
+
+        if self.chunk_ann_index is None and self.chunk_quantized_embeddings is None:
+            groups = np.arange(len(self.chunk_group_starts))
+            results = []
+            for block_start in range(0, len(query_embeddings), SEMANTIC_BATCH_BLOCK_SIZE):
+                block = query_embeddings[block_start:block_start + SEMANTIC_BATCH_BLOCK_SIZE]
+                # (block_size, num_chunks) -> (block_size, num_docs)
+                block_doc_scores = np.maximum.reduceat(block @ self.normalized_chunk_embeddings.T,
+                                                       self.chunk_group_starts, axis=1)
+                results.extend(self._top_docs(groups, doc_scores, limit) for doc_scores in block_doc_scores)
+            return results
+        return [self._top_docs(*self._chunk_doc_scores(query_embedding, limit), limit)
+                for query_embedding in query_embeddings]
+
+    def _top_docs(self, groups: np.ndarray, doc_scores: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        top = top_k_indices(doc_scores, limit)
+        doc_ids = self.chunk_group_doc_ids[groups[top]].astype(np.int64)
+        return doc_ids, np.round(doc_scores[top].astype(np.float64), SCORE_PRECISION)
+
+    def _chunk_doc_scores(self, query_embedding: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        """(groups, max chunk score per group) for the (normalized) query, over
+        all chunks or over the ANN candidate chunks. Groups index
+        ```chunk_group_starts```/```chunk_group_doc_ids```."""
+        rows = None
+        if self.chunk_ann_index is not None:
+            rows = self.chunk_ann_index.candidates(query_embedding, self.chunk_ann_nprobe)
+        if self.chunk_quantized_embeddings is not None:
+            chunk_scores = self.chunk_quantized_embeddings.scores(query_embedding, rows)
+        elif rows is None:
+            chunk_scores = self.normalized_chunk_embeddings @ query_embedding
+        else:
+            chunk_scores = self.normalized_chunk_embeddings[rows] @ query_embedding
+
+        if rows is None:
+            # one score per doc: the max over its contiguous run of chunks
+            groups = np.arange(len(self.chunk_group_starts))
+            doc_scores = np.maximum.reduceat(chunk_scores, self.chunk_group_starts)
+        else:
+            # candidate rows are ascending, so each doc's candidates are still contiguous
+            row_groups = np.searchsorted(self.chunk_group_starts, rows, side="right") - 1
+            run_starts = np.flatnonzero(np.diff(row_groups, prepend=-1) != 0)
+            groups = row_groups[run_starts]
+            doc_scores = np.maximum.reduceat(chunk_scores, run_starts)
+
+        if self.chunk_quantized_embeddings is not None and self.chunk_rescore_factor:
+            groups = groups[top_k_indices(doc_scores, limit * self.chunk_rescore_factor)]
+            doc_scores = self._exact_group_scores(groups, query_embedding)
+        return groups, doc_scores
+
+    def _exact_group_scores(self, groups: np.ndarray, query_embedding: np.ndarray) -> np.ndarray:
+        """Max float cosine similarity over all chunks of each group."""
+        if len(groups) == 0:
+            return np.empty(0, dtype=np.float32)
+        group_ends = np.append(self.chunk_group_starts[1:], len(self.chunk_embeddings))
+        rows = np.concatenate([np.arange(self.chunk_group_starts[g], group_ends[g]) for g in groups])
+        chunk_scores = self._float_chunk_rows(rows) @ query_embedding
+        run_starts = np.concatenate(([0], np.cumsum(group_ends[groups] - self.chunk_group_starts[groups])[:-1]))
+        return np.maximum.reduceat(chunk_scores, run_starts)
+
+def save_chunk_metadata(path, chunk_metadata: dict[str, np.ndarray]) -> None:
+    """Write the metadata columns to an uncompressed **.npz** file, so they load back in one read."""
+    np.savez(path, **{field: chunk_metadata[field] for field in CHUNK_METADATA_FIELDS})
+
+def load_chunk_metadata(path) -> dict[str, np.ndarray]:
+    with np.load(path) as columns:
+        return {field: columns[field] for field in CHUNK_METADATA_FIELDS}
+
+def migrate_json_chunk_metadata(json_path, npz_path) -> None:
+    """Convert ```{"chunks": [{movie_idx, chunk_idx, total_chunks}, ...]}``` JSON
+    metadata to the **.npz** layout and remove the JSON file."""
+    with open(json_path, "r") as f:
+        chunks = json.load(f)["chunks"]
+    chunk_metadata = {
+        field: np.fromiter((chunk[field] for chunk in chunks), dtype=np.int32, count=len(chunks))
+        for field in CHUNK_METADATA_FIELDS
+    }
+    save_chunk_metadata(npz_path, chunk_metadata)
+    json_path.unlink()
+
+def chunk_source_hashes(documents: list[dict]) -> np.ndarray:
+    """Content hash of the part of every document its chunks are built from (id and description)."""
+    return content_hashes(f"{doc['id']}\n{doc['description']}" for doc in documents)
+
+def chunk_document(doc: dict) -> list[str]:
+    if not doc["description"].strip():
+        return []
+    return semantic_chunk(text=doc["description"], max_chunk_size=DEFAULT_SEMANTIC_CHUNK_SIZE,
+                          overlap=DEFAULT_CHUNK_OVERLAP)
+
 def semantic_chunk(text: str, max_chunk_size: int = DEFAULT_SEMANTIC_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP) -> list[str]:
     text = text.strip()
     if not text:
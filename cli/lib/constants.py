@@ -6,22 +6,55 @@ STOPWORDS_FILE_PATH = DATA_DIR_PATH / "stopwords.txt"
 GOLDEN_DATASET_FILE_PATH = DATA_DIR_PATH / "golden_dataset.json"
 
 CACHE_DIR_PATH = Path(__file__).resolve().parent.parent.parent / "cache"
-# Inverted Index 
-INDEX_FILE_PATH = CACHE_DIR_PATH / "index.pkl"
-DOCMAP_FILE_PATH = CACHE_DIR_PATH / "docmap.pkl"
-TERM_FREQUENCIES_FILE_PATH = CACHE_DIR_PATH / "term_frequencies.pkl"
-DOC_LENGTHS_PATH = CACHE_DIR_PATH / "doc_lengths.pkl"
+# Inverted Index (single memory-mapped segment, see lib/index_segment.py)
+INDEX_FILE_PATH = CACHE_DIR_PATH / "index.seg"
+# docs added/replaced/deleted since index.seg was written
+INDEX_DELTA_PATH = CACHE_DIR_PATH / "index_delta.pkl"
+# index.seg is rewritten once pending changes exceed this fraction of its docs
+INDEX_COMPACTION_RATIO = 0.1
 
 # Tunable Parameters for calculating BM25 score
 BM25_K1 = 1.5
 BM25_B = 0.75
 
 # Semantic Search
-MOVIE_EMBEDDINGS_PATH = CACHE_DIR_PATH / "movie_embeddings.npy"
+# L2-normalized float32 rows, memory-mapped at load
+MOVIE_EMBEDDINGS_PATH = CACHE_DIR_PATH / "movie_embeddings_normalized.npy"
+# pre-normalization embeddings, migrated to MOVIE_EMBEDDINGS_PATH on first load
+LEGACY_MOVIE_EMBEDDINGS_PATH = CACHE_DIR_PATH / "movie_embeddings.npy"
+# content hash of every embedded text, so only new/edited documents are re-encoded
+MOVIE_EMBEDDINGS_MANIFEST_PATH = CACHE_DIR_PATH / "movie_embeddings_manifest.npz"
+
+# Query embeddings: LRU of (model name, normalized query text) -> embedding
+QUERY_EMBEDDING_CACHE_PATH = CACHE_DIR_PATH / "query_embeddings.npz"
+DEFAULT_QUERY_CACHE_SIZE = 4096
+
+# Approximate nearest neighbour (IVF) indexes over the embeddings above
+MOVIE_ANN_INDEX_PATH = CACHE_DIR_PATH / "movie_embeddings_ivf.npz"
+CHUNK_ANN_INDEX_PATH = CACHE_DIR_PATH / "chunk_embeddings_ivf.npz"
+DEFAULT_ANN_NPROBE = 16
+DEFAULT_IVF_ITERATIONS = 10
+
+# Quantized (int8 / product quantized) copies of the embeddings, keyed by kind
+MOVIE_QUANTIZED_EMBEDDINGS_PATHS = {
+    "int8": CACHE_DIR_PATH / "movie_embeddings_int8.npz",
+    "pq": CACHE_DIR_PATH / "movie_embeddings_pq.npz"
+}
+CHUNK_QUANTIZED_EMBEDDINGS_PATHS = {
+    "int8": CACHE_DIR_PATH / "chunk_embeddings_int8.npz",
+    "pq": CACHE_DIR_PATH / "chunk_embeddings_pq.npz"
+}
+DEFAULT_PQ_SUBSPACES = 96  # bytes per vector, 384 float32 dims -> 16x smaller
+DEFAULT_PQ_ITERATIONS = 10
+DEFAULT_RESCORE_FACTOR = 4  # float re-scoring shortlist = limit * factor
 
 # Chunked Semantic Search
-CHUNK_EMBEDDINGS_PATH = CACHE_DIR_PATH / "chunk_embeddings.npy"
-CHUNK_METADATA_PATH = CACHE_DIR_PATH / "chunk_metadata.json"
+CHUNK_EMBEDDINGS_PATH = CACHE_DIR_PATH / "chunk_embeddings_normalized.npy"
+LEGACY_CHUNK_EMBEDDINGS_PATH = CACHE_DIR_PATH / "chunk_embeddings.npy"
+CHUNK_EMBEDDINGS_MANIFEST_PATH = CACHE_DIR_PATH / "chunk_embeddings_manifest.npz"
+CHUNK_METADATA_PATH = CACHE_DIR_PATH / "chunk_metadata.npz"
+# pre-.npz metadata, migrated to CHUNK_METADATA_PATH on first load
+LEGACY_CHUNK_METADATA_PATH = CACHE_DIR_PATH / "chunk_metadata.json"
 
 DEFAULT_CHUNK_SIZE = 5  # number of words in a chunk
 DEFAULT_CHUNK_OVERLAP = 1
@@ -30,4 +63,27 @@ SCORE_PRECISION = 3
 
 # Multimodal Search
 # TEXT_EMBEDDINGS_PATH = CACHE_DIR_PATH / "text_embeddings.npy"
-MOVIE_EMBEDDINGS_MULTIMODAL_PATH = CACHE_DIR_PATH / "movie_embeddings_multimodal.npy"
\ No newline at end of file
+MOVIE_EMBEDDINGS_MULTIMODAL_PATH = CACHE_DIR_PATH / "movie_embeddings_multimodal_normalized.npy"
+LEGACY_MOVIE_EMBEDDINGS_MULTIMODAL_PATH = CACHE_DIR_PATH / "movie_embeddings_multimodal.npy"
+# Search server (search_server_cli.py); CLIs act as thin clients with --server or SEARCH_SERVER_URL
+DEFAULT_SEARCH_SERVER_HOST = "127.0.0.1"
+DEFAULT_SEARCH_SERVER_PORT = 8765
+SEARCH_SERVER_URL_ENV = "SEARCH_SERVER_URL"
+# concurrent queries are encoded together: up to this many, waiting at most this long for more
+DEFAULT_QUERY_BATCH_SIZE = 64
+DEFAULT_QUERY_BATCH_WAIT_MS = 2.0
+# threads awaiting LLM responses (I/O bound, kept apart from the search threads)
+DEFAULT_LLM_WORKERS = 16
+
+# hybrid search candidates per retriever, as a multiple of the result limit
+WEIGHTED_SEARCH_POOL_FACTOR = 500
+RRF_SEARCH_POOL_FACTOR = 100
+# adaptive candidate pools start at limit * initial factor and grow by this factor per round
+ADAPTIVE_POOL_INITIAL_FACTOR = 5
+ADAPTIVE_POOL_GROWTH = 4
+# threads running semantic retrieval alongside BM25 in hybrid search (0: one after the other)
+DEFAULT_RETRIEVAL_WORKERS = 1
+# batch hybrid search scores BM25 on one worker process per this many queries (up to the worker count)
+BM25_BATCH_QUERIES_PER_WORKER = 64
+# batch semantic search scores this many queries per matrix product, bounding the (queries x chunks) score matrix
+SEMANTIC_BATCH_BLOCK_SIZE = 256
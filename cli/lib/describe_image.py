@@ -1,12 +1,7 @@
-import os
 import mimetypes
 from pathlib import Path
-from dotenv import load_dotenv
-from google import genai
+from .genai_client import get_genai_client
 
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash-001"
 
 system_prompt = """Given the included image and text query, rewrite the text query to improve search results from a movie database. Make sure to:
@@ -35,13 +30,15 @@ def describe_image(path: str, query: str):
         print(f"Total tokens:    {response_usage_metadata.total_token_count}")
 
 def send_request_to_llm(img: bytes, mime: str, query: str):
+    from google.genai import types
+
     message = [
         system_prompt, 
-        genai.types.Part.from_bytes(data=img, mime_type=mime),
+        types.Part.from_bytes(data=img, mime_type=mime),
         query.strip()
     ]
 
-    response = client.models.generate_content(
+    response = get_genai_client().models.generate_content(
         model=model,
         contents=message
     )
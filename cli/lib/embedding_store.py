@@ -0,0 +1,114 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterable
+import numpy as np
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale every row of ```matrix``` to unit L2 norm, so a dot product
+    between normalized rows is their cosine similarity. All-zero rows are
+    left as zeros (cosine similarity 0 with everything)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def save_embeddings(path: Path, embeddings: np.ndarray) -> np.ndarray:
+    """Write ```embeddings``` L2-normalized as a ```float32``` **.npy** file and
+    return the normalized matrix.
+
+    The file is written next to ```path``` and renamed over it, so processes
+    that have the previous file memory-mapped keep reading a consistent copy."""
+    normalized = normalize_rows(embeddings)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        np.save(f, normalized)
+    os.replace(tmp_path, path)
+    return normalized
+
+
+def load_embeddings(path: Path, mmap: bool=True) -> np.ndarray:
+    """Load a matrix written by ```save_embeddings```. With ```mmap``` the file is
+    memory-mapped read-only: nothing is read until rows are used, and every
+    process mapping the file shares one copy in the OS page cache."""
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def migrate_legacy_embeddings(legacy_path: Path, path: Path) -> None:
+    """Rewrite un-normalized embeddings cached by older versions in the
+    normalized layout and remove the old file."""
+    save_embeddings(path, np.load(legacy_path))
+    legacy_path.unlink()
+
+
+class EmbeddingManifest:
+    """
+    Content hashes of the rows of a cached embedding matrix, so that when the
+    corpus changes only new or edited texts are encoded again and every
+    other row is copied from the cached matrix.
+
+    Attributes:
+        cache_key (str):
+            Model name plus every parameter that changes the embedding of the
+            same text (e.g. chunking); rows are only reused under the same key.
+        row_hashes (np.ndarray):
+            ```uint64``` content hash of the text embedded in each row.
+        row_source_hashes (np.ndarray | None):
+            For rows derived from a larger document (chunks), hash of the
+            document each row came from.
+        source_hashes (np.ndarray | None):
+            Hash of every source document, in corpus order."""
+    def __init__(self, cache_key: str, row_hashes: np.ndarray,
+                 row_source_hashes: np.ndarray | None=None, source_hashes: np.ndarray | None=None):
+        self.cache_key = cache_key
+        self.row_hashes = row_hashes
+        self.row_source_hashes = row_source_hashes
+        self.source_hashes = source_hashes
+
+    def matches(self, cache_key: str, num_rows: int) -> bool:
+        """Whether the manifest describes a matrix of ```num_rows``` rows built under ```cache_key```."""
+        return self.cache_key == cache_key and len(self.row_hashes) == num_rows
+
+    def save(self, path: Path) -> None:
+        arrays = {"cache_key": self.cache_key, "row_hashes": self.row_hashes}
+        if self.row_source_hashes is not None:
+            arrays["row_source_hashes"] = self.row_source_hashes
+            arrays["source_hashes"] = self.source_hashes
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "EmbeddingManifest":
+        with np.load(path) as arrays:
+            return cls(
+                cache_key=str(arrays["cache_key"]),
+                row_hashes=arrays["row_hashes"],
+                row_source_hashes=arrays["row_source_hashes"] if "row_source_hashes" in arrays else None,
+                source_hashes=arrays["source_hashes"] if "source_hashes" in arrays else None
+            )
+
+
+def content_hashes(texts: Iterable[str]) -> np.ndarray:
+    """64-bit BLAKE2b hash of every text, as a ```uint64``` array."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little") for text in texts),
+        dtype=np.uint64
+    )
+
+
+def merge_embeddings(cached: np.ndarray | None, rows: np.ndarray, encoded: np.ndarray | None) -> np.ndarray:
+    """Assemble an embedding matrix whose i-th row is ```cached[rows[i]]```, or
+    the next row of the freshly ```encoded``` embeddings where ```rows[i] == -1```."""
+    missing = rows < 0
+    if cached is None or missing.all():
+        return normalize_rows(encoded)
+    if not missing.any():
+        return np.asarray(cached[rows], dtype=np.float32)
+    encoded = normalize_rows(encoded)
+    merged = np.empty((len(rows), encoded.shape[1]), dtype=np.float32)
+    merged[missing] = encoded
+    merged[~missing] = cached[rows[~missing]]
+    return merged
@@ -1,13 +1,5 @@
-import os
-from google import genai
-from dotenv import load_dotenv
+from .genai_client import get_genai_client
 
-
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    raise EnvironmentError("Missing GEMINI_API_KEY in .env file")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash-001"
 
 def query_spell_correct(query: str) -> str:
@@ -80,6 +72,8 @@ def _clean_response(text: str) -> str:
     return text.strip().strip('"').strip("'").strip('*').strip()
 
 def generate_respone(prompt: str) -> str:
+    # outside the try: a missing API key is an error, not a failed enhancement
+    client = get_genai_client()
     try:
         response = client.models.generate_content(
             model=model, contents=prompt
@@ -0,0 +1,24 @@
+import os
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_genai_client():
+    """
+    The ```google-genai``` client shared by every LLM call, created on first use.
+
+    ```google.genai``` and ```dotenv``` are imported here rather than at module
+    import, so commands that never call the LLM do not pay for them."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from dotenv import load_dotenv
+            from google import genai
+
+            load_dotenv()
+            api_key = os.environ.get("GEMINI_API_KEY")
+            if not api_key:
+                raise EnvironmentError("Missing GEMINI_API_KEY in .env file")
+            _client = genai.Client(api_key=api_key)
+        return _client
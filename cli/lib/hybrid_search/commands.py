@@ -4,17 +4,30 @@ from .logic import HybridSearch
 from typing import Optional
 from lib.enhance_query import enhance_query
 from lib.re_rank_results import re_rank_scores
+from lib.search_client import SearchClient
 from .utils import llm_evaluation_prompt, generate_response_evaluate_results
 
 
-def weighted_search(query: str, alpha: float=0.5, limit: int=5) -> list[dict]:
-    movies = get_movie_data_from_file()
-    searcher = HybridSearch(movies)
-    return searcher.weighted_search(query=query, alpha=alpha, limit=limit)
+def weighted_search(query: str, alpha: float=0.5, limit: int=5, normalization: str="minmax",
+                    adaptive: bool=False, searcher: Optional[HybridSearch]=None) -> list[dict]:
+    if searcher is None:
+        searcher = HybridSearch(get_movie_data_from_file())
+    return searcher.weighted_search(query=query, alpha=alpha, limit=limit, normalization=normalization, adaptive=adaptive)
 
-def weighted_search_command(query: str, alpha: float=0.5, limit: int=5) -> None:
+def weighted_search_command(query: str, alpha: float=0.5, limit: int=5, normalization: str="minmax",
+                            adaptive: bool=False, timings: bool=False, server: Optional[str]=None) -> None:
     print(f"Searching for '{query}'. Generating upto {limit} results...")
-    results = weighted_search(query=query, alpha=alpha, limit=limit)    
+    if server:
+        results = SearchClient(server).weighted_search(query=query, alpha=alpha, limit=limit,
+                                                       normalization=normalization, adaptive=adaptive)
+    else:
+        searcher = HybridSearch(get_movie_data_from_file())
+        results = weighted_search(query=query, alpha=alpha, limit=limit, normalization=normalization,
+                                  adaptive=adaptive, searcher=searcher)
+        if adaptive:
+            _print_search_stats(searcher.last_search_stats)
+        if timings:
+            _print_timings(searcher.last_search_stats)
     for i, result in enumerate(results, 1):
         print(f"\n{i}. {result['title']}")
         print(f"Hybrid Score: {result['hybrid_score']:.4f}")
@@ -24,49 +37,61 @@ def weighted_search_command(query: str, alpha: float=0.5, limit: int=5) -> None:
 def rrf_search(query: str, k: int=60, 
                limit: int=5, 
                enhance: Optional[str]=None,
-               re_rank: Optional[str]= None) -> dict:
-    movies = get_movie_data_from_file()
-    searcher = HybridSearch(documents=movies)
+               re_rank: Optional[str]= None,
+               adaptive: bool=False,
+               searcher: Optional[HybridSearch]=None) -> dict:
+    if searcher is None:
+        searcher = HybridSearch(documents=get_movie_data_from_file())
 
-    print(f"Original query: {query}")
-    
     enhanced_query = None
     if enhance:
         enhanced_query = enhance_query(query=query, method=enhance)
     
     query_to_use = enhanced_query if enhanced_query else query
-    if query_to_use == enhanced_query:
-        print(f"Enhanced query ({enhance}): '{query}' -> '{query_to_use}'")
 
     # initial rrf search (list of docs ranked by rrf score)
-    results = searcher.rrf_search(query=query_to_use, k=k, limit=limit)
-    print(f"Initial RRF search before re-ranking (list of docs ranked by RRF score):")
-    for i, doc in enumerate(results, 1):
-        print(f"{i}. Movie: {doc['title']}, RRF Score: {doc['rrf_score']}")
+    results = searcher.rrf_search(query=query_to_use, k=k, limit=limit, adaptive=adaptive)
+    search_stats = searcher.last_search_stats
     
     # results ranked by re_rank method
     re_ranked_results = re_rank_scores(query=query_to_use, scores=results, method=re_rank)
-    # print(f"Docs/Movies re-ranked by '{re_rank}' method:")
-    # for i, doc in enumerate(re_ranked_results, 1):
-    #     print(f"{i}. {doc['title']}")
 
     return {
         "enhanced_query": enhanced_query,
         "enhance_method": enhance,
         "query_used": query_to_use,
-        "results": re_ranked_results
+        "initial_results": results,
+        "results": re_ranked_results,
+        "search_stats": search_stats
     }
 
 
 def rrf_search_command(query: str, k: int=60, limit: int=5, 
                        enhance: Optional[str]=None,
                        re_rank: Optional[str]=None,
-                       evaluate: Optional[bool]=None) -> None:    
+                       evaluate: Optional[bool]=None,
+                       adaptive: bool=False,
+                       timings: bool=False,
+                       server: Optional[str]=None) -> None:    
     search_limit = limit
     if re_rank:
         search_limit *= 5
 
-    results = rrf_search(query=query, k=k, limit=search_limit, enhance= enhance, re_rank=re_rank)   
+    print(f"Original query: {query}")
+    if server:
+        results = SearchClient(server).rrf_search(query=query, k=k, limit=search_limit, enhance=enhance,
+                                                  re_rank=re_rank, adaptive=adaptive)
+    else:
+        results = rrf_search(query=query, k=k, limit=search_limit, enhance= enhance, re_rank=re_rank, adaptive=adaptive)   
+    if adaptive:
+        _print_search_stats(results["search_stats"])
+    if timings:
+        _print_timings(results["search_stats"])
+    if results["enhanced_query"]:
+        print(f"Enhanced query ({enhance}): '{query}' -> '{results['query_used']}'")
+    print(f"Initial RRF search before re-ranking (list of docs ranked by RRF score):")
+    for i, doc in enumerate(results["initial_results"], 1):
+        print(f"{i}. Movie: {doc['title']}, RRF Score: {doc['rrf_score']}")
 
     if re_rank:
         print(f"Reranking top {limit} results using {re_rank} method...\n")
@@ -91,6 +116,15 @@ def rrf_search_command(query: str, k: int=60, limit: int=5,
     if evaluate:
         _evaluate_results(query=results["query_used"], results=results["results"][:limit])
 
+def _print_search_stats(stats: dict) -> None:
+    print(f"Candidates: {stats['bm25_candidates']} BM25, {stats['semantic_candidates']} semantic "
+          f"in {stats['rounds']} round(s) (fixed pool: {stats['max_pool']} each)")
+
+def _print_timings(stats: dict) -> None:
+    print(f"Timings: BM25 {stats['bm25_seconds'] * 1000:.1f} ms, semantic {stats['semantic_seconds'] * 1000:.1f} ms, "
+          f"retrieval {stats['retrieval_seconds'] * 1000:.1f} ms (wall), "
+          f"fusion {stats['fusion_seconds'] * 1000:.1f} ms, total {stats['total_seconds'] * 1000:.1f} ms")
+
 def _evaluate_results(query: str, results: list[dict]) -> None:
     prompt = llm_evaluation_prompt(query=query, results=results)
     scores = generate_response_evaluate_results(prompt=prompt)
@@ -1,7 +1,18 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from lib.inverted_index import InvertedIndex
+import numpy as np
+from lib.inverted_index import InvertedIndex, bm25_search_parallel, bm25_search_process_pool
+from lib.index_segment import read_segment_header, SegmentFormatError
 from lib.chunked_semantic_search.logic import ChunkedSemanticSearch
-from lib.constants import INDEX_FILE_PATH
+from lib.semantic_search.logic import top_k_indices
+from lib.constants import (
+    INDEX_FILE_PATH, INDEX_DELTA_PATH, WEIGHTED_SEARCH_POOL_FACTOR, RRF_SEARCH_POOL_FACTOR,
+    ADAPTIVE_POOL_INITIAL_FACTOR, ADAPTIVE_POOL_GROWTH, DEFAULT_RETRIEVAL_WORKERS,
+    BM25_BATCH_QUERIES_PER_WORKER
+)
 
 class HybridSearch:
     """
@@ -16,14 +27,44 @@ class HybridSearch:
     1. Weighted combination of normalized BM25 and semantic scores
     2. Reciprocal Rank Fusion (RRF)
 
+    Both fuse a fixed pool of candidates from each retriever (```limit``` times
+    ```WEIGHTED_SEARCH_POOL_FACTOR```/```RRF_SEARCH_POOL_FACTOR```). With
+    ```adaptive=True``` they fetch growing pools instead and stop as soon as the
+    top results can no longer change: provably for RRF, heuristically for the
+    weighted fusion (see ```candidate_pools```).
+
+    BM25 (pure Python, holds the GIL) and semantic retrieval (query encoding
+    and matrix products, which release it) run concurrently: BM25 on the
+    calling thread while the semantic stage runs on a small thread pool.
+    ```weighted_search_batch```/```rrf_search_batch``` answer many queries at
+    once: one encode call and one matrix product for all semantic scores, and
+    BM25 spread over worker processes.
+
     Attributes:
         documents (list[dict]):
             Collection of movie documents used for both searches.
+        document_map (dict[int, dict]):
+            Mapping from document IDs to documents, built once.
         semantic_search (ChunkedSemanticSearch):
             Engine performing chunk-level semantic similarity search.
         idx (InvertedIndex):
-            Inverted index used for BM25 keyword scoring."""
-    def __init__(self, documents):
+            Inverted index used for BM25 keyword scoring. It is loaded once and
+            reused by every query; if the index files on disk change (e.g. by
+            ```keyword_search_cli.py build``` or ```upsert```) it is reloaded
+            before the next query, and ```reload_index()``` forces a reload.
+        last_search_stats (dict):
+            Candidates fetched by the most recent ```weighted_search```/```rrf_search```
+            on the calling thread: rounds, pool size per retriever, candidates
+            each retriever returned, and the fixed pool size the search would
+            use without ```adaptive```; and the time spent per stage in seconds:
+            ```bm25_seconds```, ```semantic_seconds```, ```retrieval_seconds``` (wall
+            time of both, overlapped), ```fusion_seconds``` and ```total_seconds```.
+        retrieval_workers (int):
+            Threads running the semantic stage concurrently with BM25; 0 runs
+            the two one after the other.
+        bm25_workers (int):
+            Worker processes scoring BM25 for batch searches."""
+    def __init__(self, documents, retrieval_workers: int=DEFAULT_RETRIEVAL_WORKERS, bm25_workers: int | None=None):
         """
         Initialize hybrid search by preparing the chunked semantic search engine and
         constructing or loading the BM25 inverted index.
@@ -31,17 +72,84 @@ class HybridSearch:
         Arguments:
             documents (list[dict]):
                 Static list of movie dictionaries with keys:
-                {id, title, description}."""
+                {id, title, description}.
+            retrieval_workers (int):
+                Threads for the semantic stage, which then overlaps with BM25
+                (default 1); 0 runs the stages sequentially. A server answering
+                queries on N threads wants N.
+            bm25_workers (int | None):
+                Worker processes for BM25 in batch searches (default: one per
+                core). Started by the first batch large enough to use them,
+                reused by later batches, and stopped by ```close()```."""
         self.documents = documents
+        self.retrieval_workers = retrieval_workers
+        self.bm25_workers = bm25_workers or os.cpu_count() or 1
+        self._bm25_pool = None
+        self._bm25_pool_lock = threading.Lock()
+        # threads start on first use
+        self._retrieval_executor = (
+            ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="retrieval")
+            if retrieval_workers > 0 else None
+        )
+        self.document_map = {doc["id"]: doc for doc in documents}
+        self._search_stats = threading.local()
         self.semantic_search = ChunkedSemanticSearch()
         self.semantic_search.load_or_create_chunk_embeddings(documents=documents)
 
         self.idx = InvertedIndex()
-        if not INDEX_FILE_PATH.exists():
+        if not _index_is_usable():
             self.idx.build()
-            self.idx.save()        
+            self.idx.save()
+        self._index_signature = None
+        self._reload_lock = threading.Lock()
+        self.reload_index()
+
+    def close(self) -> None:
+        """
+        Stop the retrieval threads and the BM25 worker processes, if started."""
+        if self._retrieval_executor is not None:
+            self._retrieval_executor.shutdown()
+        with self._bm25_pool_lock:
+            if self._bm25_pool is not None:
+                self._bm25_pool.shutdown()
+                self._bm25_pool = None
+
+    @property
+    def last_search_stats(self) -> dict:
+        # per thread, so concurrent searches on a shared instance report their own
+        return getattr(self._search_stats, "value", {})
+
+    @last_search_stats.setter
+    def last_search_stats(self, stats: dict) -> None:
+        self._search_stats.value = stats
+
+    def reload_index(self) -> None:
+        """
+        (Re)load the BM25 index from disk and remember which version of the
+        index file it came from. The reloaded index replaces ```idx``` once it
+        is fully loaded, so searches running on other threads finish on the
+        previous one."""
+        with self._reload_lock:
+            # signature taken before loading so a concurrent rebuild is picked up next time
+            signature = _index_signature()
+            idx = InvertedIndex()
+            idx.load()
+            self.idx = idx
+            self._index_signature = signature
+
+    def invalidate_index(self) -> None:
+        """
+        Mark the loaded BM25 index as stale, the next query reloads it."""
+        self._index_signature = None
 
-    def _bm25_search(self, query, limit):
+    def _ensure_index_loaded(self) -> None:
+        """
+        Reload the BM25 index if it was invalidated or the index files changed
+        on disk since they were loaded. Costs two ```stat``` calls otherwise."""
+        if self._index_signature is None or _index_signature() != self._index_signature:
+            self.reload_index()
+
+    def bm25_search(self, query, limit):
         """
         Run BM25 search on the inverted index.
 
@@ -51,10 +159,58 @@ class HybridSearch:
 
         Returns:
             list[tuple[int, float]]: (doc_id, bm25_score) pairs sorted by score."""
-        self.idx.load()
+        self._ensure_index_loaded()
         return self.idx.bm25_search(query=query, limit=limit)
     
-    def weighted_search(self, query, alpha, limit=5) -> list[dict]:
+    def _retrieve(self, query: str, pool: int, timings: dict[str, float], previous: tuple | None=None,
+                  previous_pool: int=0, semantic_pool: int | None=None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Top ```pool``` candidates of both retrievers, best first, as arrays:
+        (bm25 ids, bm25 scores, semantic ids, semantic scores). The semantic
+        stage runs on the retrieval pool while BM25 runs on this thread, and
+        the time of each is added to ```timings```.
+
+        ```previous``` is the result of the previous round of an adaptive search,
+        for ```previous_pool``` candidates: a retriever that returned fewer than
+        that has no more to give and is not asked again. ```semantic_pool```
+        fetches a different number of semantic candidates, and only once."""
+        fetch_bm25 = previous is None or len(previous[0]) >= previous_pool
+        fetch_semantic = previous is None or (semantic_pool is None and len(previous[2]) >= previous_pool)
+        start = time.perf_counter()
+
+        semantic_future = None
+        if fetch_semantic and fetch_bm25 and self._retrieval_executor is not None:
+            semantic_future = self._retrieval_executor.submit(self._semantic_candidates, query, semantic_pool or pool)
+
+        if fetch_bm25:
+            bm25_ids, bm25_scores, seconds = self._bm25_candidates(query, pool)
+            timings["bm25_seconds"] += seconds
+        else:
+            bm25_ids, bm25_scores = previous[0], previous[1]
+
+        if semantic_future is not None:
+            semantic_ids, semantic_scores, seconds = semantic_future.result()
+            timings["semantic_seconds"] += seconds
+        elif fetch_semantic:
+            semantic_ids, semantic_scores, seconds = self._semantic_candidates(query, semantic_pool or pool)
+            timings["semantic_seconds"] += seconds
+        else:
+            semantic_ids, semantic_scores = previous[2], previous[3]
+
+        timings["retrieval_seconds"] += time.perf_counter() - start
+        return bm25_ids, bm25_scores, semantic_ids, semantic_scores
+
+    def _bm25_candidates(self, query: str, pool: int) -> tuple[np.ndarray, np.ndarray, float]:
+        start = time.perf_counter()
+        bm25_ids, bm25_scores = _bm25_arrays(self.bm25_search(query=query, limit=pool))
+        return bm25_ids, bm25_scores, time.perf_counter() - start
+
+    def _semantic_candidates(self, query: str, pool: int) -> tuple[np.ndarray, np.ndarray, float]:
+        start = time.perf_counter()
+        semantic_ids, semantic_scores = self.semantic_search.search_chunk_scores(query=query, limit=pool)
+        return semantic_ids, semantic_scores, time.perf_counter() - start
+
+    def weighted_search(self, query, alpha, limit=5, normalization: str="minmax", adaptive: bool=False) -> list[dict]:
         """
         Perform hybrid search using a weighted combination of
         BM25 and chunked semantic scores.
@@ -62,62 +218,64 @@ class HybridSearch:
         Workflow:
             • Compute BM25 scores for the query.
             • Compute semantic chunk scores for the query.
-            • Normalize both score sets to [0, 1].
+            • Align both score sets on the union of their documents
+              (0.0 where a side did not return the document).
+            • Normalize both score arrays (see ```NORMALIZERS```).
             • Combine scores using: alpha*bm25 + (1 - alpha)*semantic.
-            • Sort results by hybrid score.
+            • Select the top results by hybrid score.
 
         Arguments:
             query (str): Search query.
             alpha (float): Weight for BM25 (range 0–1).
             limit (int): Number of results to return.
+            normalization (str): ```minmax```, ```zscore``` or ```rank```.
+            adaptive (bool): Fetch candidates in growing rounds, stopping once
+                the top results are stable across two rounds and no document
+                outside the pool could outscore them.
 
         Returns:
             list[dict]: Ranked results containing:
                 id, title, snippet, bm25_score, semantic_score, hybrid_score."""
-        
-        # list of tuples - (doc_id, bm25 score) sorted by score 
-        bm25_results = self._bm25_search(query=query, limit=limit*500)
-        bm25_results = sorted(bm25_results, key=lambda item: item[0])
-        # sorted by doc_id -> 1, 2, ...
-        bm25_dict = {doc_id: score for doc_id, score in bm25_results}
-
-        # list of dict - {doc_id, doc_title, doc_description, score, doc_metadata or {}}
-        semantic_results = self.semantic_search.search_chunks(query=query, limit=limit*500)
-        semantic_results = sorted(semantic_results, key=lambda item: item["id"])
-        semantic_dict = {result["id"]: result["score"] for result in semantic_results}
-
-        all_doc_ids = sorted(set(bm25_dict.keys()) | set(semantic_dict.keys()))
-        
-        bm_25_scores = [bm25_dict.get(doc_id, 0.0) for doc_id in all_doc_ids]
-        normalized_bm25_scores = normalize_scores(bm_25_scores)        
-
-        semantic_scores = [semantic_dict.get(doc_id, 0.0) for doc_id in all_doc_ids]
-        normalized_semantic_scores = normalize_scores(semantic_scores)
-    
-        document_map = {doc["id"]: doc for doc in self.documents}
-        doc_scores = {}        
-        for i, doc_id in enumerate(all_doc_ids):
-            bm25_score = normalized_bm25_scores[i]
-            semantic_score = normalized_semantic_scores[i]
-            hybrid = _hybrid_score(bm25_score=bm25_score,
-                                  semantic_score=semantic_score,
-                                  alpha=alpha)
-            
-            # get matching doc from self.documents, or None
-            doc = document_map.get(doc_id)
-            if doc:
-                doc_scores[doc_id] = {
-                    "id": doc_id,
-                    "title": doc.get("title", ""),
-                    "document": doc.get("description", "")[:100],
-                    "bm25_score": bm25_score,
-                    "semantic_score": semantic_score,
-                    "hybrid_score": hybrid
-                }
-        sorted_results = sorted(doc_scores.values(), key=lambda d: d["hybrid_score"], reverse=True)
-        return sorted_results[:limit]
-
-    def rrf_search(self, query, k: int=60, limit=10) -> list[dict]:
+        if normalization not in NORMALIZERS:
+            raise ValueError(f"Unknown normalization '{normalization}', expected one of {sorted(NORMALIZERS)}")
+
+        start = time.perf_counter()
+        timings = _new_timings()
+        max_pool = limit * WEIGHTED_SEARCH_POOL_FACTOR
+        candidates, previous_pool = None, 0
+        for round_number, pool in enumerate(candidate_pools(limit, max_pool, adaptive), 1):
+            # normalization depends on the whole semantic score distribution, and a
+            # larger semantic pool costs little (every chunk is scored either way):
+            # only the BM25 pool grows
+            candidates = self._retrieve(query=query, pool=pool, timings=timings, previous=candidates,
+                                        previous_pool=previous_pool, semantic_pool=max_pool)
+            bm25_ids, bm25_scores, semantic_ids, semantic_scores = candidates
+            previous_pool = pool
+
+            fusion = self._weighted_fusion(candidates, alpha=alpha, limit=limit, normalization=normalization)
+            doc_ids, bm25_aligned, semantic_aligned, known, top = fusion[:5]
+            if pool >= max_pool:
+                break
+
+            # heuristic, as normalization depends on the whole pool: stop when
+            # the scores not fetched yet could neither bring in nor reorder the
+            # top results; a document outside a truncated pool scores at most
+            # its last candidate there
+            bm25_bound = bm25_scores[-1] if len(bm25_ids) >= pool else 0.0
+            semantic_bound = semantic_scores[-1] if len(semantic_ids) >= max_pool else 0.0
+            bm25_missing = ~np.isin(doc_ids[known], bm25_ids)
+            semantic_missing = ~np.isin(doc_ids[known], semantic_ids)
+            if not _weighted_top_may_change(bm25_aligned[known], semantic_aligned[known], bm25_missing,
+                                            semantic_missing, np.searchsorted(known, top),
+                                            bm25_bound, semantic_bound, alpha, normalization):
+                break
+
+        results = self._weighted_results(fusion)
+        self.last_search_stats = _search_stats(round_number, pool, max_pool, bm25_ids, semantic_ids,
+                                               timings, total_seconds=time.perf_counter() - start)
+        return results
+
+    def rrf_search(self, query, k: int=60, limit=10, adaptive: bool=False) -> list[dict]:
         """
         Perform Reciprocal Rank Fusion (RRF) between BM25 results and
         chunked semantic search results.
@@ -132,73 +290,390 @@ class HybridSearch:
             query (str): Search query.
             k (int): RRF smoothing constant (default 60).
             limit (int): Number of results to return.
+            adaptive (bool): Fetch candidates in growing rounds, stopping once
+                the top results (documents and order) are guaranteed to be
+                those of the full pool. A document a retriever did not return
+                gets the rank after the pool that was fetched.
 
         Returns:
             list[dict]: Ranked result dictionaries containing:
                 id, title, snippet, bm25_rank, semantic_rank, rrf_score."""
-        bm25_results = self._bm25_search(query=query, limit=limit*100)
-        bm25_ranks = [doc_id for doc_id, _ in bm25_results]
-
-        semantic_results = self.semantic_search.search_chunks(query=query, limit=limit*100)
-        semantic_ranks = [result["id"] for result in semantic_results]
-        # all doc ids in both results
-        all_doc_ids = list(dict.fromkeys(bm25_ranks + semantic_ranks))
-        document_map = {doc["id"]: doc for doc in self.documents}
-
-        doc_scores_map = {}
-
-        for doc_id in all_doc_ids:
-            bm25_rank = bm25_ranks.index(doc_id) + 1 if doc_id in bm25_ranks else len(bm25_ranks) + 1
-            semantic_rank = semantic_ranks.index(doc_id) + 1 if doc_id in semantic_ranks else len(semantic_ranks) + 1
-
-            rrf = 0.0
-            if bm25_rank is not None:
-                rrf += _rrf_score(rank=bm25_rank, k=k)
-            if semantic_rank is not None:
-                rrf += _rrf_score(rank=semantic_rank, k=k)
-            
-            doc = document_map.get(doc_id)
-            if doc:
-                doc_scores_map[doc_id] = {
-                    "id": doc_id,
-                    "title": doc.get("title", ""),
-                    "document": doc.get("description", "")[:100],
-                    "bm25_rank": bm25_rank,
-                    "semantic_rank": semantic_rank,
-                    "rrf_score": rrf
-                }
-        sorted_results = sorted(doc_scores_map.values(), key=lambda d: d["rrf_score"], reverse=True)
-        return sorted_results[:limit]
-    
-def normalize_scores(scores: list[float]) -> list[float]:
+        start = time.perf_counter()
+        timings = _new_timings()
+        max_pool = limit * RRF_SEARCH_POOL_FACTOR
+        candidates, previous_pool = None, 0
+        for round_number, pool in enumerate(candidate_pools(limit, max_pool, adaptive), 1):
+            candidates = self._retrieve(query=query, pool=pool, timings=timings, previous=candidates,
+                                        previous_pool=previous_pool)
+            bm25_ids, _, semantic_ids, _ = candidates
+            previous_pool = pool
+            fusion = self._rrf_fusion(candidates, k=k, limit=limit)
+            _, ranks, rrf_scores, top = fusion
+            if pool >= max_pool or _rrf_top_is_final(ranks, rrf_scores, top, [len(bm25_ids), len(semantic_ids)],
+                                                     pool=pool, max_pool=max_pool, k=k, limit=limit):
+                break
+
+        results = self._rrf_results(fusion)
+        self.last_search_stats = _search_stats(round_number, pool, max_pool, bm25_ids, semantic_ids,
+                                               timings, total_seconds=time.perf_counter() - start)
+        return results
+
+    def weighted_search_batch(self, queries: list[str], alpha: float, limit: int=5,
+                              normalization: str="minmax") -> list[list[dict]]:
+        """
+        ```weighted_search``` (with the fixed candidate pools) for many queries
+        at once, e.g. offline evaluation or bulk re-ranking: see ```_retrieve_batch```.
+        Returns one result list per query, in order, each the same as
+        ```weighted_search``` returns for that query. ```last_search_stats```
+        holds the stage timings of the whole batch."""
+        if normalization not in NORMALIZERS:
+            raise ValueError(f"Unknown normalization '{normalization}', expected one of {sorted(NORMALIZERS)}")
+
+        start = time.perf_counter()
+        timings = _new_timings()
+        max_pool = limit * WEIGHTED_SEARCH_POOL_FACTOR
+        batch_candidates = self._retrieve_batch(queries=queries, pool=max_pool, timings=timings)
+        results = [
+            self._weighted_results(self._weighted_fusion(candidates, alpha=alpha, limit=limit, normalization=normalization))
+            for candidates in batch_candidates
+        ]
+        self.last_search_stats = _batch_search_stats(len(queries), max_pool, timings,
+                                                     total_seconds=time.perf_counter() - start)
+        return results
+
+    def rrf_search_batch(self, queries: list[str], k: int=60, limit: int=10) -> list[list[dict]]:
+        """
+        ```rrf_search``` (with the fixed candidate pools) for many queries at
+        once, e.g. offline evaluation or bulk re-ranking: see ```_retrieve_batch```.
+        Returns one result list per query, in order, each the same as
+        ```rrf_search``` returns for that query. ```last_search_stats``` holds
+        the stage timings of the whole batch."""
+        start = time.perf_counter()
+        timings = _new_timings()
+        max_pool = limit * RRF_SEARCH_POOL_FACTOR
+        batch_candidates = self._retrieve_batch(queries=queries, pool=max_pool, timings=timings)
+        results = [self._rrf_results(self._rrf_fusion(candidates, k=k, limit=limit)) for candidates in batch_candidates]
+        self.last_search_stats = _batch_search_stats(len(queries), max_pool, timings,
+                                                     total_seconds=time.perf_counter() - start)
+        return results
+
+    def _retrieve_batch(self, queries: list[str], pool: int,
+                        timings: dict[str, float]) -> list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        ```_retrieve``` for every query of a batch, in one round. The semantic
+        candidates of all queries come from one ```encode``` call and one matrix
+        product per block of queries against the chunk embeddings
+        (```search_chunk_scores_batch```), on this thread. Meanwhile BM25 is
+        scored on up to ```bm25_workers``` worker processes, one per
+        ```BM25_BATCH_QUERIES_PER_WORKER``` queries, or on the retrieval thread
+        for smaller batches."""
+        start = time.perf_counter()
+        self._ensure_index_loaded()
+        workers = min(self.bm25_workers, len(queries) // BM25_BATCH_QUERIES_PER_WORKER)
+
+        bm25_future = None
+        if self._retrieval_executor is not None:
+            bm25_future = self._retrieval_executor.submit(self._bm25_candidates_batch, queries, pool, workers)
+        else:
+            bm25_candidates, seconds = self._bm25_candidates_batch(queries, pool, workers)
+
+        semantic_start = time.perf_counter()
+        semantic_candidates = self.semantic_search.search_chunk_scores_batch(queries=queries, limit=pool)
+        timings["semantic_seconds"] += time.perf_counter() - semantic_start
+
+        if bm25_future is not None:
+            bm25_candidates, seconds = bm25_future.result()
+        timings["bm25_seconds"] += seconds
+        timings["retrieval_seconds"] += time.perf_counter() - start
+        return [(bm25_ids, bm25_scores, semantic_ids, semantic_scores)
+                for (bm25_ids, bm25_scores), (semantic_ids, semantic_scores) in zip(bm25_candidates, semantic_candidates)]
+
+    def _bm25_candidates_batch(self, queries: list[str], pool: int,
+                               workers: int) -> tuple[list[tuple[np.ndarray, np.ndarray]], float]:
+        start = time.perf_counter()
+        if workers > 1:
+            # workers reload the index when it changed on disk since their last batch
+            batch_results = bm25_search_parallel(self._bm25_process_pool(), queries=queries, limit=pool,
+                                                 workers=workers, index_version=self._index_signature)
+        else:
+            batch_results = [self.idx.bm25_search(query=query, limit=pool) for query in queries]
+        return [_bm25_arrays(bm25_results) for bm25_results in batch_results], time.perf_counter() - start
+
+    def _bm25_process_pool(self):
+        with self._bm25_pool_lock:
+            if self._bm25_pool is None:
+                self._bm25_pool = bm25_search_process_pool(self.bm25_workers)
+            return self._bm25_pool
+
+    def _weighted_fusion(self, candidates: tuple, alpha: float, limit: int, normalization: str) -> tuple:
+        """
+        Weighted fusion of one query's candidates: (doc IDs, aligned BM25 scores,
+        aligned semantic scores, positions of the docs in the corpus, top positions
+        best first, normalized BM25 scores, normalized semantic scores, hybrid scores)."""
+        bm25_ids, bm25_scores, semantic_ids, semantic_scores = candidates
+        # sorted by doc_id -> 1, 2, ...
+        doc_ids = np.union1d(bm25_ids, semantic_ids)
+        bm25_aligned = align_scores(doc_ids, bm25_ids, bm25_scores)
+        semantic_aligned = align_scores(doc_ids, semantic_ids, semantic_scores)
+        normalized_bm25_scores = normalize_scores(bm25_aligned, method=normalization)
+        normalized_semantic_scores = normalize_scores(semantic_aligned, method=normalization)
+        hybrid_scores = _hybrid_score(bm25_score=normalized_bm25_scores,
+                                      semantic_score=normalized_semantic_scores,
+                                      alpha=alpha)
+
+        # documents missing from the corpus (index out of date) are not returned
+        known = np.flatnonzero(np.fromiter((doc_id in self.document_map for doc_id in doc_ids.tolist()), dtype=bool, count=len(doc_ids)))
+        top = known[top_k_indices(hybrid_scores[known], limit)]
+        return (doc_ids, bm25_aligned, semantic_aligned, known, top,
+                normalized_bm25_scores, normalized_semantic_scores, hybrid_scores)
+
+    def _weighted_results(self, fusion: tuple) -> list[dict]:
+        doc_ids, _, _, _, top, normalized_bm25_scores, normalized_semantic_scores, hybrid_scores = fusion
+        results = []
+        for i in top.tolist():
+            doc_id = int(doc_ids[i])
+            doc = self.document_map[doc_id]
+            results.append({
+                "id": doc_id,
+                "title": doc.get("title", ""),
+                "document": doc.get("description", "")[:100],
+                "bm25_score": float(normalized_bm25_scores[i]),
+                "semantic_score": float(normalized_semantic_scores[i]),
+                "hybrid_score": float(hybrid_scores[i])
+            })
+        return results
+
+    def _rrf_fusion(self, candidates: tuple, k: int, limit: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        RRF of one query's candidates, over the docs in the corpus: (doc IDs,
+        ranks matrix, RRF scores, top positions best first)."""
+        bm25_ids, _, semantic_ids, _ = candidates
+        doc_ids, ranks, rrf_scores = reciprocal_rank_fusion([bm25_ids, semantic_ids], k=k)
+        # documents missing from the corpus (index out of date) are not returned
+        known = np.fromiter((doc_id in self.document_map for doc_id in doc_ids.tolist()), dtype=bool, count=len(doc_ids))
+        doc_ids, ranks, rrf_scores = doc_ids[known], ranks[:, known], rrf_scores[known]
+        return doc_ids, ranks, rrf_scores, top_k_indices(rrf_scores, limit)
+
+    def _rrf_results(self, fusion: tuple) -> list[dict]:
+        doc_ids, ranks, rrf_scores, top = fusion
+        results = []
+        for i in top.tolist():
+            doc_id = int(doc_ids[i])
+            doc = self.document_map[doc_id]
+            results.append({
+                "id": doc_id,
+                "title": doc.get("title", ""),
+                "document": doc.get("description", "")[:100],
+                "bm25_rank": int(ranks[0, i]),
+                "semantic_rank": int(ranks[1, i]),
+                "rrf_score": float(rrf_scores[i])
+            })
+        return results
+
+def candidate_pools(limit: int, max_pool: int, adaptive: bool=True) -> list[int]:
+    """
+    Candidate pool sizes per retriever for each round of a search: just
+    ```max_pool``` without ```adaptive```, else ```limit * ADAPTIVE_POOL_INITIAL_FACTOR```
+    growing by ```ADAPTIVE_POOL_GROWTH``` per round up to ```max_pool```, so the
+    last round always equals the fixed pool."""
+    if not adaptive:
+        return [max_pool]
+    pools = []
+    pool = max(limit * ADAPTIVE_POOL_INITIAL_FACTOR, 1)
+    while pool < max_pool:
+        pools.append(pool)
+        pool *= ADAPTIVE_POOL_GROWTH
+    pools.append(max_pool)
+    return pools
+
+def _bm25_arrays(bm25_results: list[tuple[int, float]]) -> tuple[np.ndarray, np.ndarray]:
+    # list of tuples - (doc_id, bm25 score) sorted by score
+    bm25_ids = np.fromiter((doc_id for doc_id, _ in bm25_results), dtype=np.int64, count=len(bm25_results))
+    bm25_scores = np.fromiter((score for _, score in bm25_results), dtype=np.float64, count=len(bm25_results))
+    return bm25_ids, bm25_scores
+
+def _new_timings() -> dict[str, float]:
+    return {"bm25_seconds": 0.0, "semantic_seconds": 0.0, "retrieval_seconds": 0.0}
+
+def _search_stats(rounds: int, pool: int, max_pool: int, bm25_ids: np.ndarray, semantic_ids: np.ndarray,
+                  timings: dict[str, float], total_seconds: float) -> dict:
+    return {
+        "rounds": rounds,
+        "pool": pool,
+        "max_pool": max_pool,
+        "bm25_candidates": len(bm25_ids),
+        "semantic_candidates": len(semantic_ids),
+        **timings,
+        # fusion, normalization, stopping checks and building the results
+        "fusion_seconds": total_seconds - timings["retrieval_seconds"],
+        "total_seconds": total_seconds
+    }
+
+def _batch_search_stats(queries: int, pool: int, timings: dict[str, float], total_seconds: float) -> dict:
+    return {
+        "queries": queries,
+        "pool": pool,
+        **timings,
+        "fusion_seconds": total_seconds - timings["retrieval_seconds"],
+        "total_seconds": total_seconds
+    }
+
+def _rrf_top_is_final(ranks: np.ndarray, rrf_scores: np.ndarray, top: np.ndarray, list_lengths: list[int],
+                      pool: int, max_pool: int, k: int, limit: int) -> bool:
+    """
+    Whether RRF over the full pools is guaranteed to return the documents
+    ```top``` in this order.
+
+    A document missing from a truncated list (one that returned all ```pool```
+    candidates asked for) ranks somewhere in ```pool + 1 .. max_pool + 1```
+    there, so its full score lies between ```rrf_scores``` (missing rank
+    ```pool + 1```, the one used here) and that minus the difference for the
+    ```max_pool + 1``` rank. A document in neither list scores at most the
+    missing-rank score of every list. The order is final when every
+    document's lower bound beats the upper bound of everything below it."""
+    truncated = np.array([length >= pool for length in list_lengths])
+    if len(top) < limit:
+        # more documents can only come from a truncated list
+        return not truncated.any()
+
+    lengths = np.array(list_lengths)
+    missing = ranks == lengths[:, None] + 1
+    slack = np.where(truncated, _rrf_score(rank=pool + 1, k=k) - _rrf_score(rank=max_pool + 1, k=k), 0.0)
+    lower_bounds = rrf_scores - (missing * slack[:, None]).sum(axis=0)
+
+    rest = np.ones(len(rrf_scores), dtype=bool)
+    rest[top] = False
+    best_rest = rrf_scores[rest].max() if rest.any() else -np.inf
+    if truncated.any():
+        unseen_upper_bound = _rrf_score(rank=lengths + 1, k=k).sum()
+        best_rest = max(best_rest, unseen_upper_bound)
+    # best upper bound among the documents ranked below each top document
+    below = np.append(rrf_scores[top][1:], best_rest)
+    below = np.maximum.accumulate(below[::-1])[::-1]
+    return bool(np.all(lower_bounds[top] > below))
+
+def _weighted_top_may_change(bm25_scores: np.ndarray, semantic_scores: np.ndarray, bm25_missing: np.ndarray,
+                             semantic_missing: np.ndarray, top: np.ndarray, bm25_bound: float, semantic_bound: float,
+                             alpha: float, normalization: str) -> bool:
     """
-    Normalize a list of scores to the range [0, 1].
+    Whether scores not fetched yet could change the top results ```top```
+    (indices into the score arrays) of the weighted fusion.
+
+    Optimistically, a candidate missing from a retriever's pool
+    (```bm25_missing```/```semantic_missing```) scores the pool's last score
+    there (```bm25_bound```/```semantic_bound```, 0.0 for a pool that is
+    complete), and documents in neither pool are stood in for by two more
+    candidates: the best an unseen document can score, and one scoring 0.0
+    on both sides, which may still shift the normalization. The top results
+    may change unless they are the same under these optimistic scores."""
+    bm25_scores = np.append(np.where(bm25_missing, bm25_bound, bm25_scores), [bm25_bound, 0.0])
+    semantic_scores = np.append(np.where(semantic_missing, semantic_bound, semantic_scores), [semantic_bound, 0.0])
+    hybrid_scores = _hybrid_score(bm25_score=normalize_scores(bm25_scores, method=normalization),
+                                  semantic_score=normalize_scores(semantic_scores, method=normalization),
+                                  alpha=alpha)
+    if len(top) == 0:
+        return True
+    optimistic_top = top_k_indices(hybrid_scores, len(top))
+    return not np.array_equal(optimistic_top, top)
+
+def _index_is_usable() -> bool:
+    """
+    True if the index file exists and was written in the current segment format."""
+    try:
+        read_segment_header(INDEX_FILE_PATH)
+    except (FileNotFoundError, SegmentFormatError):
+        return False
+    return True
+
+def _index_signature() -> tuple:
+    """
+    Version of the on-disk BM25 index: the segment plus any saved delta."""
+    return (_file_signature(INDEX_FILE_PATH), _file_signature(INDEX_DELTA_PATH))
 
-    If all scores are identical, returns all 1.0.
+def _file_signature(path: Path) -> tuple[int, int, int] | None:
+    """
+    Identify the current version of a file on disk: (inode, size, mtime).
+    Rewrites and atomic replacements both change it. None if it is missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def align_scores(doc_ids: np.ndarray, ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    Scatter ```scores``` of the documents ```ids``` onto ```doc_ids```, a sorted
+    array containing every ID in ```ids```. Documents without a score get 0.0.
 
     Arguments:
-        scores (list[float]): Raw scores.
+        doc_ids (np.ndarray): Sorted union of document IDs.
+        ids (np.ndarray): Document IDs that have a score.
+        scores (np.ndarray): Score of each of ```ids```.
 
     Returns:
-        list[float]: Normalized scores."""
-    if not scores:
-        return []
-    
-    min_score = min(scores)
-    max_score = max(scores)
+        np.ndarray: One score per entry of ```doc_ids```."""
+    aligned = np.zeros(len(doc_ids), dtype=np.float64)
+    aligned[np.searchsorted(doc_ids, ids)] = scores
+    return aligned
 
+def normalize_minmax(scores: np.ndarray) -> np.ndarray:
+    """
+    Scale scores linearly to the range [0, 1]. If all scores are identical,
+    returns all 1.0."""
+    min_score = scores.min()
+    max_score = scores.max()
     if min_score == max_score:
-        return [1.0 for i in range(len(scores))]
-    
-    normalized_scores = []
-    for score in scores:
-        value = (score - min_score) / (max_score - min_score)
-        normalized_scores.append(value)
-    return normalized_scores
-
-def normalize_command(scores: list[float]) -> None:
-    normalized_scores = normalize_scores(scores=scores)
-    if not normalized_scores:
+        return np.ones_like(scores)
+    return (scores - min_score) / (max_score - min_score)
+
+def normalize_zscore(scores: np.ndarray) -> np.ndarray:
+    """
+    Standard scores: distance from the mean in standard deviations. If all
+    scores are identical, returns all 0.0."""
+    std = scores.std()
+    if std == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.mean()) / std
+
+def normalize_rank(scores: np.ndarray) -> np.ndarray:
+    """
+    Replace scores by their rank, scaled to [0, 1]: the highest score gets
+    1.0, the lowest 0.0, and equal scores share their average rank. Ignores
+    the score distribution entirely, like RRF."""
+    if len(scores) == 1:
+        return np.ones_like(scores)
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    # 0-based ascending rank of each distinct score, averaged over its ties
+    first_rank = np.cumsum(counts) - counts
+    average_rank = first_rank + (counts - 1) / 2
+    return average_rank[inverse] / (len(scores) - 1)
+
+NORMALIZERS = {
+    "minmax": normalize_minmax,
+    "zscore": normalize_zscore,
+    "rank": normalize_rank
+}
+
+def normalize_scores(scores, method: str="minmax") -> np.ndarray:
+    """
+    Normalize scores with one of ```NORMALIZERS```.
+
+    Arguments:
+        scores (array-like): Raw scores.
+        method (str): ```minmax``` (default), ```zscore``` or ```rank```.
+
+    Returns:
+        np.ndarray: Normalized scores, as ```float64```."""
+    if method not in NORMALIZERS:
+        raise ValueError(f"Unknown normalization '{method}', expected one of {sorted(NORMALIZERS)}")
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.size == 0:
+        return scores
+    return NORMALIZERS[method](scores)
+
+def normalize_command(scores: list[float], method: str="minmax") -> None:
+    normalized_scores = normalize_scores(scores=scores, method=method)
+    if not normalized_scores.size:
         print("No scores given to normalize.")
         return
     for score in normalized_scores:
@@ -212,14 +687,48 @@ def _hybrid_score(bm25_score, semantic_score, alpha=0.5):
         alpha * bm25_score + (1 - alpha) * semantic_score
 
     Arguments:
-        bm25_score (float): Normalized BM25 score.
-        semantic_score (float): Normalized semantic score.
+        bm25_score (float | np.ndarray): Normalized BM25 score.
+        semantic_score (float | np.ndarray): Normalized semantic score.
         alpha (float): Weight for BM25.
 
     Returns:
-        float: Hybrid score."""
+        float | np.ndarray: Hybrid score."""
     return alpha * bm25_score + (1 - alpha) * semantic_score
 
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k: int=60) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fuse ranked lists of document IDs with Reciprocal Rank Fusion.
+
+    Every list is sorted once, and the rank of every candidate in it is found
+    with one ```np.searchsorted```, so fusion costs O(n log n) for n candidates.
+    A document missing from a list gets the rank after its last entry.
+
+    Arguments:
+        rankings (list[np.ndarray]): Document IDs of each ranking, best first.
+        k (int): Smoothing constant.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The union of the document
+        IDs in order of first appearance, their 1-based rank in every list
+        (shape ```(len(rankings), n)```) and their summed RRF scores."""
+    all_ids = np.concatenate(rankings) if rankings else np.empty(0, dtype=np.int64)
+    _, first_seen = np.unique(all_ids, return_index=True)
+    doc_ids = all_ids[np.sort(first_seen)]
+
+    ranks = np.empty((len(rankings), len(doc_ids)), dtype=np.int64)
+    for row, ranking in enumerate(rankings):
+        if len(ranking) == 0:
+            ranks[row] = 1
+            continue
+        order = np.argsort(ranking, kind="stable")
+        sorted_ids = ranking[order]
+        positions = np.minimum(np.searchsorted(sorted_ids, doc_ids), len(ranking) - 1)
+        found = sorted_ids[positions] == doc_ids
+        ranks[row] = np.where(found, order[positions] + 1, len(ranking) + 1)
+
+    rrf_scores = _rrf_score(rank=ranks, k=k).sum(axis=0)
+    return doc_ids, ranks, rrf_scores
+
 def _rrf_score(rank, k=60):
     """
     Compute Reciprocal Rank Fusion (RRF) score for a given rank.
@@ -228,9 +737,9 @@ def _rrf_score(rank, k=60):
         RRF = 1 / (k + rank)
 
     Arguments:
-        rank (int): Rank position of the document (1 = highest).
+        rank (int | np.ndarray): Rank position of the document (1 = highest).
         k (int): Smoothing constant to avoid large swings.
 
     Returns:
-        float: RRF score."""
+        float | np.ndarray: RRF score."""
     return 1 / (k + rank)
\ No newline at end of file
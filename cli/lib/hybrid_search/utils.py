@@ -1,8 +1,6 @@
-import os
 import json
 import time
-from dotenv import load_dotenv
-from google import genai
+from lib.genai_client import get_genai_client
 
 def llm_evaluation_prompt(query: str, results: list):
     formatted_results = [
@@ -28,19 +26,13 @@ Return ONLY the scores in the same order you were given the documents. Return a
 [2, 0, 3, 2, 0, 1]"""
     return prompt
 
-load_dotenv()
-try:
-    api_key = os.environ.get("GEMINI_API_KEY")
-except Exception as e:
-    print(f"Unable to retrieve GEMINI_API_KEY from .env file")
-    print(f"{e}")
-
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash-001"
 
 # API call to evaluate the final results after re-ranking
 def generate_response_evaluate_results(prompt: str, max_retries: int=5) -> list[int]:
     time_delay = 5.0
+    # outside the retry loop: a missing API key fails at once instead of being retried
+    client = get_genai_client()
     for attempt in range(max_retries):
         try:
             response = client.models.generate_content(
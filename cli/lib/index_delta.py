@@ -0,0 +1,270 @@
+import os
+import pickle
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from math import log
+from pathlib import Path
+from typing import Iterator
+from .postings import CompactPostings, PostingList
+
+class IndexDelta:
+    """
+    Pending changes on top of an immutable base index: docs added or replaced
+    since the base was written, and tombstones for base docs that were
+    deleted or replaced.
+
+    Tombstones keep the length and distinct terms of the base doc they hide
+    so df and corpus stats can be corrected without touching the base.
+
+    Attributes:
+        base_fingerprint (tuple | None):
+            Identifies the base segment this delta applies to.
+        docs (dict[int, dict]):
+            doc id -> full doc object of every added/replaced doc.
+        doc_term_frequencies (dict[int, dict[str, int]]):
+            doc id -> {term: tf} of every added/replaced doc.
+        tombstones (dict[int, tuple[int, list[str]]]):
+            base doc id -> (doc length, distinct terms) of hidden base docs.
+        postings (dict[str, dict[int, int]]):
+            term -> {doc id: tf} over the added/replaced docs (derived).
+        deleted_terms (Counter[str]):
+            term -> number of tombstoned base docs containing it (derived)."""
+    def __init__(self, base_fingerprint: tuple | None = None):
+        self.base_fingerprint = base_fingerprint
+        self.docs = {}
+        self.doc_term_frequencies = {}
+        self.tombstones = {}
+        self.postings = {}
+        self.deleted_terms = Counter()
+
+    def __len__(self) -> int:
+        # number of changed docs, used to decide when to compact
+        return len(self.docs) + len(self.tombstones)
+
+    def add(self, doc: dict, term_frequencies: dict[str, int]) -> None:
+        doc_id = doc["id"]
+        self.discard(doc_id)
+        self.docs[doc_id] = doc
+        self.doc_term_frequencies[doc_id] = term_frequencies
+        for term, tf in term_frequencies.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def discard(self, doc_id: int) -> None:
+        """Drop an added/replaced doc from the delta, if present."""
+        if doc_id not in self.docs:
+            return
+        del self.docs[doc_id]
+        for term in self.doc_term_frequencies.pop(doc_id):
+            del self.postings[term][doc_id]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def tombstone(self, doc_id: int, doc_length: int, terms: list[str]) -> None:
+        self.tombstones[doc_id] = (doc_length, terms)
+        self.deleted_terms.update(terms)
+
+    def save(self, path: Path) -> None:
+        state = {
+            "base_fingerprint": self.base_fingerprint,
+            "docs": self.docs,
+            "doc_term_frequencies": self.doc_term_frequencies,
+            "tombstones": self.tombstones
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IndexDelta":
+        with path.open("rb") as f:
+            state = pickle.load(f)
+        delta = cls(base_fingerprint=state["base_fingerprint"])
+        for doc_id, tombstone in state["tombstones"].items():
+            delta.tombstone(doc_id, *tombstone)
+        for doc_id, doc in state["docs"].items():
+            delta.add(doc, state["doc_term_frequencies"][doc_id])
+        return delta
+
+
+class LiveIndexView:
+    """
+    Read-only view of a base index with an ```IndexDelta``` applied, exposing
+    the same mappings as ```InvertedIndex``` (postings, docmap, doc lengths,
+    df, BM25 IDF, length norms). Statistics are corrected for the delta:
+    N, average doc length, df and therefore IDF and length norms reflect the
+    live corpus, not the base.
+
+    Per-term upper bounds are not maintained; they are only valid for the
+    base statistics, so ```term_upper_bounds``` is empty until compaction.
+
+    Attributes:
+        postings (Mapping[str, PostingList]):
+            Live posting lists, merged on access for terms the delta touches.
+        docmap, doc_lengths, length_norms, doc_frequencies, bm25_idfs (Mapping):
+            Live equivalents of the ```InvertedIndex``` attributes.
+        avg_doc_length (float):
+            Average doc length over live docs."""
+    def __init__(self, base_postings, base_docmap: Mapping, base_doc_lengths: Mapping,
+                 base_doc_frequencies: Mapping, base_avg_doc_length: float,
+                 delta: IndexDelta, k1: float, b: float):
+        self.delta = delta
+        doc_lengths = {
+            doc_id: sum(term_frequencies.values())
+            for doc_id, term_frequencies in delta.doc_term_frequencies.items()
+        }
+        self.doc_lengths = _OverlayMapping(base_doc_lengths, doc_lengths, delta.tombstones)
+        self.docmap = _OverlayMapping(base_docmap, delta.docs, delta.tombstones)
+
+        base_total_length = base_avg_doc_length * len(base_doc_lengths)
+        removed_length = sum(length for length, _ in delta.tombstones.values())
+        num_docs = len(self.doc_lengths)
+        total_length = base_total_length - removed_length + sum(doc_lengths.values())
+        self.avg_doc_length = total_length / num_docs if num_docs else 0.0
+
+        self.__num_docs = num_docs
+        self.postings = _LivePostings(base_postings, base_doc_frequencies, delta)
+        self.doc_frequencies = _LiveTermMapping(self.postings, self.postings.df)
+        self.bm25_idfs = _LiveTermMapping(self.postings, self.__bm25_idf)
+        avg_doc_length = self.avg_doc_length
+        self.length_norms = _DerivedDocMapping(
+            self.doc_lengths, lambda doc_length: k1 * (1 - b + b * (doc_length / avg_doc_length))
+        )
+        self.term_upper_bounds = {}
+
+    def __bm25_idf(self, term: str) -> float:
+        df = self.postings.df(term)
+        return log((self.__num_docs - df + 0.5) / (df + 0.5) + 1)
+
+    def compacted_postings(self) -> CompactPostings:
+        """Materialize the live posting lists into a new ```CompactPostings```
+        without re-tokenizing any doc."""
+        term_ids = {}
+        offsets = array("Q", [0])
+        doc_ids = array("I")
+        tfs = array("I")
+        for term_id, term in enumerate(sorted(self.postings)):
+            term_ids[term] = term_id
+            posting_list = self.postings[term]
+            doc_ids.extend(posting_list.doc_ids)
+            tfs.extend(posting_list.tfs)
+            offsets.append(len(doc_ids))
+        return CompactPostings(term_ids=term_ids, offsets=offsets, doc_ids=doc_ids, tfs=tfs)
+
+
+class _OverlayMapping(Mapping):
+    # base entries, minus tombstoned ids, plus (overriding) delta entries
+    def __init__(self, base: Mapping, overlay: dict, tombstones: dict):
+        self.__base = base
+        self.__overlay = overlay
+        self.__tombstones = tombstones
+
+    def __getitem__(self, doc_id: int):
+        if doc_id in self.__overlay:
+            return self.__overlay[doc_id]
+        if doc_id in self.__tombstones:
+            raise KeyError(doc_id)
+        return self.__base[doc_id]
+
+    def __iter__(self) -> Iterator[int]:
+        for doc_id in self.__base:
+            if doc_id not in self.__tombstones and doc_id not in self.__overlay:
+                yield doc_id
+        yield from self.__overlay
+
+    def __len__(self) -> int:
+        hidden = sum(1 for doc_id in self.__tombstones if doc_id not in self.__overlay)
+        added = sum(1 for doc_id in self.__overlay if doc_id not in self.__base)
+        return len(self.__base) - hidden + added
+
+
+class _DerivedDocMapping(Mapping):
+    def __init__(self, doc_lengths: Mapping, derive):
+        self.__doc_lengths = doc_lengths
+        self.__derive = derive
+
+    def __getitem__(self, doc_id: int):
+        return self.__derive(self.__doc_lengths[doc_id])
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__doc_lengths)
+
+    def __len__(self) -> int:
+        return len(self.__doc_lengths)
+
+
+class _LivePostings:
+    """Base posting lists with tombstoned docs filtered out and delta postings
+    merged in. Terms untouched by the delta return the base list as is."""
+    def __init__(self, base, base_doc_frequencies: Mapping, delta: IndexDelta):
+        self.__base = base
+        self.__base_doc_frequencies = base_doc_frequencies
+        self.__delta = delta
+        self.__merged: dict[str, PostingList] = {}
+
+    def df(self, term: str) -> int:
+        base_df = self.__base_doc_frequencies.get(term, 0)
+        return base_df - self.__delta.deleted_terms[term] + len(self.__delta.postings.get(term, ()))
+
+    def __contains__(self, term: str) -> bool:
+        return self.df(term) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        for term in self.__base:
+            if term in self:
+                yield term
+        for term in self.__delta.postings:
+            if term not in self.__base:
+                yield term
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __getitem__(self, term: str) -> PostingList:
+        posting_list = self.get(term)
+        if posting_list is None:
+            raise KeyError(term)
+        return posting_list
+
+    def get(self, term: str, default=None) -> PostingList | None:
+        if term not in self.__delta.deleted_terms and term not in self.__delta.postings:
+            return self.__base.get(term, default)
+        if term in self.__merged:
+            return self.__merged[term]
+
+        tombstones = self.__delta.tombstones
+        doc_tfs = {}
+        base_posting_list = self.__base.get(term)
+        if base_posting_list is not None:
+            doc_tfs = {doc_id: tf for doc_id, tf in base_posting_list.items() if doc_id not in tombstones}
+        doc_tfs.update(self.__delta.postings.get(term, {}))
+        if not doc_tfs:
+            return default
+
+        doc_ids = array("I", sorted(doc_tfs))
+        tfs = array("I", (doc_tfs[doc_id] for doc_id in doc_ids))
+        posting_list = PostingList(doc_ids=memoryview(doc_ids), tfs=memoryview(tfs))
+        self.__merged[term] = posting_list
+        return posting_list
+
+    def items(self) -> Iterator[tuple[str, PostingList]]:
+        for term in self:
+            yield term, self[term]
+
+
+class _LiveTermMapping(Mapping):
+    def __init__(self, postings: _LivePostings, value):
+        self.__postings = postings
+        self.__value = value
+
+    def __getitem__(self, term: str):
+        if term not in self.__postings:
+            raise KeyError(term)
+        return self.__value(term)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__postings)
+
+    def __len__(self) -> int:
+        return len(self.__postings)
@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator
+from .postings import CompactPostings
+
+# Binary layout of an index segment (all integers little-endian):
+#
+#   header   magic, format version, N docs, vocab size, total postings,
+#            avg doc length, k1, b, number of sections
+#   sections (byte offset, byte length) for each entry of SEGMENT_SECTIONS
+#   data     every section, 8-byte aligned
+#
+# The header and section table have a fixed size, so corpus stats can be read
+# without touching postings. Sections are typed arrays that are used in place
+# through memoryviews over an mmap of the file, a lookup only faults in the
+# pages it reads.
+SEGMENT_MAGIC = b"RSIX"
+# v2: terms are stemmed once (v1 segments hold double-stemmed terms)
+SEGMENT_VERSION = 2
+
+_HEADER = struct.Struct("<4sIQQQdddI")
+_SECTION = struct.Struct("<QQ")
+
+# (section name, array typecode or None for raw bytes)
+SEGMENT_SECTIONS = (
+    ("doc_ids", "I"),           # sorted doc ids
+    ("doc_lengths", "I"),       # tokens per doc, parallel to doc_ids
+    ("length_norms", "d"),      # k1 * (1 - b + b * doc_len / avg_doc_len), parallel to doc_ids
+    ("docmap_offsets", "Q"),    # N + 1 offsets into docmap_data
+    ("docmap_data", None),      # JSON encoded docs, parallel to doc_ids
+    ("term_offsets", "Q"),      # V + 1 offsets into term_data
+    ("term_data", None),        # UTF-8 terms, sorted
+    ("posting_offsets", "Q"),   # V + 1 offsets into posting_doc_ids / posting_tfs
+    ("posting_doc_ids", "I"),
+    ("posting_tfs", "I"),
+    ("bm25_idfs", "d"),         # per term, parallel to sorted terms
+    ("term_upper_bounds", "d"), # per term, parallel to sorted terms
+)
+_SECTION_TABLE_SIZE = _SECTION.size * len(SEGMENT_SECTIONS)
+
+
+class SegmentFormatError(ValueError):
+    """Raised when a file is not an index segment or has an unsupported version."""
+
+
+def read_segment_header(path: Path) -> dict:
+    """Read the corpus stats of the segment at ```path``` without mapping or
+    loading any postings.
+
+    Returns:
+        dict: version, num_docs, vocab_size, total_postings, avg_doc_length, k1, b."""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+    return _parse_header(header)
+
+
+def write_segment(
+    path: Path,
+    postings: CompactPostings,
+    doc_lengths: Mapping[int, int],
+    length_norms: Mapping[int, float],
+    docmap: Mapping[int, dict],
+    bm25_idfs: Mapping[str, float],
+    term_upper_bounds: Mapping[str, float],
+    avg_doc_length: float,
+    k1: float,
+    b: float
+) -> None:
+    """Write a complete index to ```path``` in the segment format.
+
+    The file is written next to ```path``` and moved into place, so readers
+    that still have the previous segment mapped keep a consistent view."""
+    doc_ids = array("I", sorted(doc_lengths))
+    docmap_offsets = array("Q", [0])
+    docmap_data = bytearray()
+    for doc_id in doc_ids:
+        docmap_data += json.dumps(docmap[doc_id]).encode("utf-8")
+        docmap_offsets.append(len(docmap_data))
+
+    terms = sorted(postings)
+    term_offsets = array("Q", [0])
+    term_data = bytearray()
+    posting_offsets = array("Q", [0])
+    posting_doc_ids = array("I")
+    posting_tfs = array("I")
+    for term in terms:
+        term_data += term.encode("utf-8")
+        term_offsets.append(len(term_data))
+        posting_list = postings[term]
+        posting_doc_ids.extend(posting_list.doc_ids)
+        posting_tfs.extend(posting_list.tfs)
+        posting_offsets.append(len(posting_doc_ids))
+
+    sections = {
+        "doc_ids": doc_ids,
+        "doc_lengths": array("I", (doc_lengths[doc_id] for doc_id in doc_ids)),
+        "length_norms": array("d", (length_norms[doc_id] for doc_id in doc_ids)),
+        "docmap_offsets": docmap_offsets,
+        "docmap_data": bytes(docmap_data),
+        "term_offsets": term_offsets,
+        "term_data": bytes(term_data),
+        "posting_offsets": posting_offsets,
+        "posting_doc_ids": posting_doc_ids,
+        "posting_tfs": posting_tfs,
+        "bm25_idfs": array("d", (bm25_idfs[term] for term in terms)),
+        "term_upper_bounds": array("d", (term_upper_bounds[term] for term in terms)),
+    }
+
+    payloads = []
+    for name, typecode in SEGMENT_SECTIONS:
+        data = sections[name]
+        if typecode is not None:
+            if sys.byteorder != "little":
+                data = array(typecode, data)
+                data.byteswap()
+            data = data.tobytes()
+        payloads.append(data)
+
+    table = bytearray()
+    offset = _align(_HEADER.size + _SECTION_TABLE_SIZE)
+    for payload in payloads:
+        table += _SECTION.pack(offset, len(payload))
+        offset = _align(offset + len(payload))
+
+    header = _HEADER.pack(
+        SEGMENT_MAGIC, SEGMENT_VERSION,
+        len(doc_ids), len(terms), len(posting_doc_ids),
+        avg_doc_length, k1, b, len(SEGMENT_SECTIONS)
+    )
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(table)
+        for payload in payloads:
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(payload)
+    os.replace(tmp_path, path)
+
+
+class IndexSegment:
+    """
+    An index segment opened read-only through ```mmap```.
+
+    Opening a segment only parses the fixed size header and section table;
+    every structure below is a lazy view over the mapped file.
+
+    Attributes:
+        header (dict):
+            Corpus stats, as returned by ```read_segment_header```.
+        postings (CompactPostings):
+            Posting lists with a binary-searched term dictionary.
+        doc_lengths (Mapping[int, int]):
+            doc id -> number of tokens in the doc.
+        length_norms (Mapping[int, float]):
+            doc id -> BM25 length normalisation term for the header's k1 and b.
+        docmap (Mapping[int, dict]):
+            doc id -> full doc object, decoded on access.
+        doc_frequencies (Mapping[str, int]):
+            term -> number of docs containing it.
+        bm25_idfs (Mapping[str, float]):
+            term -> BM25 IDF.
+        term_upper_bounds (Mapping[str, float]):
+            term -> highest BM25 score the term gives any single doc."""
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = _parse_header(self.__mmap[:_HEADER.size])
+
+        buffer = memoryview(self.__mmap)
+        sections = {}
+        for i, (name, typecode) in enumerate(SEGMENT_SECTIONS):
+            offset, length = _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+            sections[name] = _typed_view(buffer[offset:offset + length], typecode)
+
+        self.terms = _SegmentTerms(sections["term_offsets"], sections["term_data"])
+        self.postings = CompactPostings(
+            term_ids=self.terms,
+            offsets=sections["posting_offsets"],
+            doc_ids=sections["posting_doc_ids"],
+            tfs=sections["posting_tfs"]
+        )
+        self.doc_ids = _DocIds(sections["doc_ids"])
+        self.doc_lengths = _DocArrayView(self.doc_ids, sections["doc_lengths"])
+        self.length_norms = _DocArrayView(self.doc_ids, sections["length_norms"])
+        self.docmap = _DocMapView(self.doc_ids, sections["docmap_offsets"], sections["docmap_data"])
+        self.doc_frequencies = _TermArrayView(self.terms, _PostingCounts(sections["posting_offsets"]))
+        self.bm25_idfs = _TermArrayView(self.terms, sections["bm25_idfs"])
+        self.term_upper_bounds = _TermArrayView(self.terms, sections["term_upper_bounds"])
+
+
+def _parse_header(header: bytes) -> dict:
+    if len(header) < _HEADER.size:
+        raise SegmentFormatError("File is too short to be an index segment")
+    magic, version, num_docs, vocab_size, total_postings, avg_doc_length, k1, b, num_sections = (
+        _HEADER.unpack(header[:_HEADER.size])
+    )
+    if magic != SEGMENT_MAGIC:
+        raise SegmentFormatError("Not an index segment, rebuild the index")
+    if version != SEGMENT_VERSION or num_sections != len(SEGMENT_SECTIONS):
+        raise SegmentFormatError(
+            f"Index segment version {version} is not supported (want {SEGMENT_VERSION}), rebuild the index"
+        )
+    return {
+        "version": version,
+        "num_docs": num_docs,
+        "vocab_size": vocab_size,
+        "total_postings": total_postings,
+        "avg_doc_length": avg_doc_length,
+        "k1": k1,
+        "b": b
+    }
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _typed_view(buffer: memoryview, typecode: str | None):
+    if typecode is None:
+        return buffer
+    if sys.byteorder == "little":
+        return buffer.cast(typecode)
+    # big-endian hosts pay for a copy, the format is little-endian on disk
+    data = array(typecode, buffer.tobytes())
+    data.byteswap()
+    return data
+
+
+class _SegmentTerms:
+    """Sorted term dictionary, term -> term id by binary search over the
+    mapped term data. Looked-up ids are memoised since queries repeat terms."""
+    def __init__(self, offsets, data: memoryview):
+        self.__offsets = offsets
+        self.__data = data
+        self.__cache: dict[str, int | None] = {}
+
+    def __len__(self) -> int:
+        return len(self.__offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.term(i)
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+    def term(self, term_id: int) -> str:
+        return bytes(self.__data[self.__offsets[term_id]:self.__offsets[term_id + 1]]).decode("utf-8")
+
+    def get(self, term: str, default=None) -> int | None:
+        if term in self.__cache:
+            term_id = self.__cache[term]
+            return default if term_id is None else term_id
+
+        key = term.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self.__data[self.__offsets[mid]:self.__offsets[mid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        term_id = None
+        if lo < len(self) and bytes(self.__data[self.__offsets[lo]:self.__offsets[lo + 1]]) == key:
+            term_id = lo
+
+        if len(self.__cache) >= 65536:
+            self.__cache.clear()
+        self.__cache[term] = term_id
+        return default if term_id is None else term_id
+
+
+class _DocIds:
+    """Sorted doc id table, doc id -> position. Dense ids (the usual 1..N)
+    are resolved arithmetically, anything else by binary search."""
+    def __init__(self, doc_ids):
+        self.doc_ids = doc_ids
+        self.__dense = len(doc_ids) > 0 and doc_ids[-1] - doc_ids[0] == len(doc_ids) - 1
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def position(self, doc_id: int) -> int | None:
+        if self.__dense:
+            i = doc_id - self.doc_ids[0]
+            return i if 0 <= i < len(self.doc_ids) else None
+        i = bisect_left(self.doc_ids, doc_id)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_id:
+            return i
+        return None
+
+
+class _DocArrayView(Mapping):
+    def __init__(self, doc_ids: _DocIds, values):
+        self.__doc_ids = doc_ids
+        self.__values = values
+
+    def __getitem__(self, doc_id: int):
+        i = self.__doc_ids.position(doc_id)
+        if i is None:
+            raise KeyError(doc_id)
+        return self.__values[i]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__doc_ids.doc_ids)
+
+    def __len__(self) -> int:
+        return len(self.__doc_ids)
+
+    def values(self):
+        return self.__values
+
+
+class _DocMapView(Mapping):
+    def __init__(self, doc_ids: _DocIds, offsets, data: memoryview):
+        self.__doc_ids = doc_ids
+        self.__offsets = offsets
+        self.__data = data
+
+    def __getitem__(self, doc_id: int) -> dict:
+        i = self.__doc_ids.position(doc_id)
+        if i is None:
+            raise KeyError(doc_id)
+        return json.loads(bytes(self.__data[self.__offsets[i]:self.__offsets[i + 1]]))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.__doc_ids.doc_ids)
+
+    def __len__(self) -> int:
+        return len(self.__doc_ids)
+
+
+class _PostingCounts:
+    """Posting list lengths (document frequencies) from the posting offsets."""
+    def __init__(self, offsets):
+        self.__offsets = offsets
+
+    def __getitem__(self, term_id: int) -> int:
+        return self.__offsets[term_id + 1] - self.__offsets[term_id]
+
+
+class _TermArrayView(Mapping):
+    def __init__(self, terms: _SegmentTerms, values):
+        self.__terms = terms
+        self.__values = values
+
+    def __getitem__(self, term: str):
+        term_id = self.__terms.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return self.__values[term_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__terms)
+
+    def __len__(self) -> int:
+        return len(self.__terms)
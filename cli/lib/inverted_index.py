@@ -1,80 +1,111 @@
 from .utils import process_text_to_tokens, get_movie_data_from_file
-from pathlib import Path
-import pickle
+from .bm25_scorer import BM25Scorer
+from .postings import CompactPostings
+from .index_segment import IndexSegment, write_segment
+from .index_delta import IndexDelta, LiveIndexView
 from collections import Counter
-from math import log
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from math import log, ceil
 from .constants import (
-    CACHE_DIR_PATH, INDEX_FILE_PATH, DOCMAP_FILE_PATH, TERM_FREQUENCIES_FILE_PATH, DOC_LENGTHS_PATH, BM25_K1, BM25_B
+    CACHE_DIR_PATH, INDEX_FILE_PATH, INDEX_DELTA_PATH, INDEX_COMPACTION_RATIO, BM25_K1, BM25_B
 )
 
 class InvertedIndex:
-    index: dict[str, set[int]]
-    docmap: dict[int, dict[str, object]]
-    term_frequencies: dict[int, Counter[str]]
-    doc_lengths: dict[int, int]
+    index: CompactPostings
+    docmap: Mapping[int, dict[str, object]]
+    doc_lengths: Mapping[int, int]
+    length_norms: Mapping[int, float]
+    doc_frequencies: Mapping[str, int]
+    bm25_idfs: Mapping[str, float]
+    term_upper_bounds: Mapping[str, float]
+    bm25_params: tuple[float, float]
+    avg_doc_length: float
 
     def __init__(self):
-        # dict mapping tokens(str) to sets of doc ids
-        self.index = {}
+        # maps tokens(str) to sorted doc id arrays with parallel term frequency
+        # arrays (how often the token appears in each doc)
+        self.index = CompactPostings.from_term_frequencies({})
 
         # dict mapping doc id to full doc objects {id, title, desciption}
         self.docmap = {}
 
-        # dict mapping doc ids to Counter objects
-        # doc id -> Counter keeping track of how often each term appears in doc
-        self.term_frequencies = {}
-
         self.doc_lengths = {}
 
-    def __add_document(self, doc_id: int, text: str):
-        tokens = process_text_to_tokens(text=text)
-        for token in tokens:
-            if token not in self.index:
-                self.index[token] = set()
-            self.index[token].add(doc_id)
+        # term -> number of docs containing the term, computed once at build time
+        self.doc_frequencies = {}
+
+        # term -> BM25 IDF score, derived from doc_frequencies
+        self.bm25_idfs = {}
+
+        # term -> highest BM25 score (default k1, b) the term gives any single doc,
+        # used by the scorer to skip postings that cannot change the top k
+        self.term_upper_bounds = {}
 
-        counter = Counter(tokens)
-        self.term_frequencies[doc_id] = counter
+        # doc id -> k1 * (1 - b + b * doc_len / avg_doc_len), precomputed like
+        # term_upper_bounds for the (k1, b) in bm25_params
+        self.length_norms = {}
+        self.bm25_params = (BM25_K1, BM25_B)
 
-        self.doc_lengths[doc_id] =  counter.total()
+        # cached once per build/load, doc_lengths does not change in between
+        self.avg_doc_length = 0.0
 
-        # total number of tokens in each doc
-        # for document_id, tokens_counter in self.term_frequencies.items():
-        #     self.doc_lengths[document_id] = tokens_counter.total()
+        # scoring engine for bm25_search, created on first use
+        self.__scorer = None
+
+        # incremental updates: pending changes on top of the base structures
+        # built/loaded last; while there are any, the attributes above are live
+        # views over base + delta (see index_delta.py)
+        self.__base = None
+        self.__base_fingerprint = None
+        self.__delta = None
 
     def get_tf(self, doc_id: int, term: str) -> int:
         term_token = process_text_to_tokens(term)
         if len(term_token) != 1:
             raise ValueError("multiple tokens given, need a single token")
-        tf = self.term_frequencies[doc_id][term_token[0]]
-        return tf
+        return self.get_token_tf(doc_id=doc_id, token=term_token[0])
+
+    def get_token_tf(self, doc_id: int, token: str) -> int:
+        posting_list = self.index.get(token)
+        if posting_list is None:
+            return 0
+        return posting_list.get_tf(doc_id)
     
+    def get_df(self, term: str) -> int:
+        tokenized_term = process_text_to_tokens(term)
+        if len(tokenized_term) != 1:
+            raise ValueError(f"Given term {term} has multiple tokens, single required")
+        return self.doc_frequencies.get(tokenized_term[0], 0)
+
     def get_bm25_idf(self, term: str) -> float:
         tokenized_term = process_text_to_tokens(term)
         if len(tokenized_term) != 1:
             raise ValueError(f"Given term {term} has multiple tokens, single required")
-        
-        # term appears in how many docs?
-        df = 0
-        for _, term_count in self.term_frequencies.items():
-            if tokenized_term[0] in term_count:
-                df += 1
-        
-        # N - total docs
-        n = len(self.term_frequencies)
+        return self.__get_token_bm25_idf(tokenized_term[0])
 
-        return log((n - df + 0.5) / (df + 0.5) + 1)
+    def __get_token_bm25_idf(self, token: str) -> float:
+        # terms missing from the table occur in no doc (df = 0)
+        idf = self.bm25_idfs.get(token)
+        if idf is None:
+            return _bm25_idf(n=len(self.doc_lengths), df=0)
+        return idf
     
     def get_bm25_tf(self, doc_id: int, term: str, k1: float=BM25_K1, b: float=BM25_B) -> float:
-        # raw tf
-        raw_tf = self.get_tf(doc_id=doc_id, term=term)
+        term_token = process_text_to_tokens(term)
+        if len(term_token) != 1:
+            raise ValueError("multiple tokens given, need a single token")
+        return self.get_token_bm25_tf(doc_id=doc_id, token=term_token[0], k1=k1, b=b)
+
+    def get_token_bm25_tf(self, doc_id: int, token: str, k1: float=BM25_K1, b: float=BM25_B) -> float:
+        # raw tf of an already processed token
+        raw_tf = self.get_token_tf(doc_id=doc_id, token=token)
 
         # given doc ids length
         doc_length = self.doc_lengths[doc_id]
 
-        avg_doc_length = self.__get_avg_doc_length()
-
-        ratio = doc_length / avg_doc_length
+        ratio = doc_length / self.avg_doc_length
         
         length_norm = 1 - b + b * (ratio)
 
@@ -87,57 +118,213 @@ class InvertedIndex:
         return bm25tf * bm25idf    
     
     def bm25_search(self, query: str, limit: int):
-        query_tokens = process_text_to_tokens(query)
-        docs_bm25_scores: dict[int, int] = {}
-
-        for token in query_tokens:
-            docs_having_token = self.index.get(token, {})
-            for doc_id in docs_having_token:
-                score = self.bm25(doc_id=doc_id, term=token)
-                docs_bm25_scores[doc_id] = docs_bm25_scores.get(doc_id, 0.0) + score
-        
         # list of tuples(doc_id, bm25 score)
-        sorted_scores = sorted(docs_bm25_scores.items(), key=lambda d: d[1], reverse=True)
-        return sorted_scores[:limit]
+        return self.get_scorer().search(query=query, limit=limit)
+
+    def get_scorer(self) -> BM25Scorer:
+        if self.__scorer is None:
+            self.__scorer = BM25Scorer(self)
+        return self.__scorer
     
     # get the set of doc ids in which term occurs
     def get_documents(self, term: str) -> list[int]:
-        doc_ids = self.index.get(term.lower())
-        if not doc_ids:
+        posting_list = self.index.get(term.lower())
+        if not posting_list:
             return []
-        return sorted(doc_ids)
+        # posting lists are stored sorted by doc id
+        return list(posting_list)
     
     
-    def build(self):
-        movies_list = get_movie_data_from_file()
+    def build(self, movies_list: list[dict] | None = None, workers: int = 1):
+        # defaults to the movies in data/movies.json
+        if movies_list is None:
+            movies_list = get_movie_data_from_file()
+        docs = [(movie["id"], f'{movie["title"]} {movie["description"]}') for movie in movies_list]
+        if workers > 1 and len(docs) > 1:
+            self.index, self.doc_lengths = _index_docs_parallel(docs, workers=workers)
+        else:
+            self.index, self.doc_lengths = _index_docs(docs)
         for movie in movies_list:
-            self.__add_document(movie["id"], f'{movie["title"]} {movie["description"]}')
             self.docmap[movie["id"]] = movie
+        self.avg_doc_length = self.__get_avg_doc_length()
+        self.__scorer = None
+        self.__compute_term_statistics()
+        self.__set_base(fingerprint=None)
+
+    def __compute_term_statistics(self):
+        # df of a term is the length of its posting list
+        n = len(self.doc_lengths)
+        self.doc_frequencies = {term: len(posting_list) for term, posting_list in self.index.items()}
+        self.bm25_idfs = {term: _bm25_idf(n=n, df=df) for term, df in self.doc_frequencies.items()}
+
+        self.bm25_params = (BM25_K1, BM25_B)
+        self.length_norms = {}
+        for doc_id, doc_length in self.doc_lengths.items():
+            length_norm = 1 - BM25_B + BM25_B * (doc_length / self.avg_doc_length)
+            self.length_norms[doc_id] = BM25_K1 * length_norm
+
+        k1_plus_one = BM25_K1 + 1
+        self.term_upper_bounds = {}
+        for term, posting_list in self.index.items():
+            max_bm25tf = 0.0
+            for doc_id, tf in posting_list.items():
+                bm25tf = (tf * k1_plus_one) / (tf + self.length_norms[doc_id])
+                max_bm25tf = max(max_bm25tf, bm25tf)
+            self.term_upper_bounds[term] = max_bm25tf * self.bm25_idfs[term]
 
     def save(self):
         CACHE_DIR_PATH.mkdir(parents=True, exist_ok=True)
-        with (
-            INDEX_FILE_PATH.open("wb") as index_dump,
-            DOCMAP_FILE_PATH.open("wb") as docmap_dump,
-            TERM_FREQUENCIES_FILE_PATH.open("wb") as term_frequencies_dump,
-            DOC_LENGTHS_PATH.open("wb") as doc_lengths_dump
-            ):
-            pickle.dump(self.index, index_dump)
-            pickle.dump(self.docmap, docmap_dump)
-            pickle.dump(self.term_frequencies, term_frequencies_dump)
-            pickle.dump(self.doc_lengths, doc_lengths_dump)
+        if self.__delta is not None and self.__base_fingerprint is not None:
+            # small deltas against the segment on disk are saved on their own,
+            # a full rewrite only happens once they grow past the compaction ratio
+            base_doc_count = max(len(self.__base["doc_lengths"]), 1)
+            if len(self.__delta) <= INDEX_COMPACTION_RATIO * base_doc_count:
+                self.__delta.save(INDEX_DELTA_PATH)
+                return
+        self.compact()
+
+        k1, b = self.bm25_params
+        write_segment(
+            INDEX_FILE_PATH,
+            postings=self.index,
+            doc_lengths=self.doc_lengths,
+            length_norms=self.length_norms,
+            docmap=self.docmap,
+            bm25_idfs=self.bm25_idfs,
+            term_upper_bounds=self.term_upper_bounds,
+            avg_doc_length=self.avg_doc_length,
+            k1=k1,
+            b=b
+        )
+        INDEX_DELTA_PATH.unlink(missing_ok=True)
+        self.__base_fingerprint = _fingerprint(
+            len(self.doc_lengths), len(self.index), self.index.total_postings(), self.avg_doc_length
+        )
 
     def load(self):
-        with (
-            INDEX_FILE_PATH.open("rb") as index_dump,
-            DOCMAP_FILE_PATH.open("rb") as docmap_dump,
-            TERM_FREQUENCIES_FILE_PATH.open("rb") as term_frequencies_dump,
-            DOC_LENGTHS_PATH.open("rb") as doc_lengths_dump
-            ):
-            self.index = pickle.load(index_dump)
-            self.docmap = pickle.load(docmap_dump)
-            self.term_frequencies = pickle.load(term_frequencies_dump)
-            self.doc_lengths = pickle.load(doc_lengths_dump)
+        # maps the segment, postings/docs are only read when looked up
+        segment = IndexSegment(INDEX_FILE_PATH)
+        self.index = segment.postings
+        self.docmap = segment.docmap
+        self.doc_lengths = segment.doc_lengths
+        self.length_norms = segment.length_norms
+        self.doc_frequencies = segment.doc_frequencies
+        self.bm25_idfs = segment.bm25_idfs
+        self.term_upper_bounds = segment.term_upper_bounds
+        self.bm25_params = (segment.header["k1"], segment.header["b"])
+        self.avg_doc_length = segment.header["avg_doc_length"]
+        self.__scorer = None
+        header = segment.header
+        self.__set_base(fingerprint=_fingerprint(
+            header["num_docs"], header["vocab_size"], header["total_postings"], header["avg_doc_length"]
+        ))
+
+        # changes saved since the segment was written
+        if INDEX_DELTA_PATH.exists():
+            delta = IndexDelta.load(INDEX_DELTA_PATH)
+            if delta.base_fingerprint != self.__base_fingerprint:
+                raise ValueError(
+                    f"{INDEX_DELTA_PATH} was saved against a different index, rebuild the index"
+                )
+            self.__delta = delta
+            self.__refresh_live_view()
+
+    def add_document(self, movie: dict):
+        # movie -> {id, title, description, ...}
+        if movie["id"] in self.docmap:
+            raise ValueError(f"Document {movie['id']} already exists, use replace_document")
+        self.__upsert(movie)
+
+    def replace_document(self, movie: dict):
+        if movie["id"] not in self.docmap:
+            raise KeyError(f"Document {movie['id']} does not exist, use add_document")
+        self.__upsert(movie)
+
+    def delete_document(self, doc_id: int):
+        if doc_id not in self.docmap:
+            raise KeyError(f"Document {doc_id} does not exist")
+        delta = self.__get_delta()
+        delta.discard(doc_id)
+        self.__tombstone_base_document(delta, doc_id)
+        self.__refresh_live_view()
+
+    @property
+    def pending_changes(self) -> int:
+        # number of docs added, replaced or deleted since the last compaction
+        return len(self.__delta) if self.__delta is not None else 0
+
+    def compact(self):
+        """Fold pending changes into the base structures (no doc is re-tokenized)
+        and recompute term statistics. ```save``` writes the result as a new segment."""
+        if self.__delta is None:
+            return
+        live_view = LiveIndexView(**self.__live_view_args())
+        self.index = live_view.compacted_postings()
+        self.docmap = dict(live_view.docmap.items())
+        self.doc_lengths = dict(live_view.doc_lengths.items())
+        self.avg_doc_length = self.__get_avg_doc_length()
+        self.__scorer = None
+        self.__compute_term_statistics()
+        self.__set_base(fingerprint=None)
+
+    def __upsert(self, movie: dict):
+        doc_id = movie["id"]
+        delta = self.__get_delta()
+        self.__tombstone_base_document(delta, doc_id)
+        tokens = process_text_to_tokens(f'{movie["title"]} {movie["description"]}')
+        delta.add(movie, dict(Counter(tokens)))
+        self.__refresh_live_view()
+
+    def __tombstone_base_document(self, delta: IndexDelta, doc_id: int):
+        base_doc_lengths = self.__base["doc_lengths"]
+        if doc_id in delta.tombstones or doc_id not in base_doc_lengths:
+            return
+        base_doc = self.__base["docmap"][doc_id]
+        terms = sorted(set(process_text_to_tokens(f'{base_doc["title"]} {base_doc["description"]}')))
+        delta.tombstone(doc_id, base_doc_lengths[doc_id], terms)
+
+    def __get_delta(self) -> IndexDelta:
+        if self.__delta is None:
+            self.__delta = IndexDelta(base_fingerprint=self.__base_fingerprint)
+        return self.__delta
+
+    def __set_base(self, fingerprint: tuple | None):
+        self.__base = {
+            "postings": self.index,
+            "docmap": self.docmap,
+            "doc_lengths": self.doc_lengths,
+            "doc_frequencies": self.doc_frequencies,
+            "avg_doc_length": self.avg_doc_length
+        }
+        self.__base_fingerprint = fingerprint
+        self.__delta = None
+
+    def __live_view_args(self) -> dict:
+        k1, b = self.bm25_params
+        return {
+            "base_postings": self.__base["postings"],
+            "base_docmap": self.__base["docmap"],
+            "base_doc_lengths": self.__base["doc_lengths"],
+            "base_doc_frequencies": self.__base["doc_frequencies"],
+            "base_avg_doc_length": self.__base["avg_doc_length"],
+            "delta": self.__delta,
+            "k1": k1,
+            "b": b
+        }
+
+    def __refresh_live_view(self):
+        live_view = LiveIndexView(**self.__live_view_args())
+        self.index = live_view.postings
+        self.docmap = live_view.docmap
+        self.doc_lengths = live_view.doc_lengths
+        self.length_norms = live_view.length_norms
+        self.doc_frequencies = live_view.doc_frequencies
+        self.bm25_idfs = live_view.bm25_idfs
+        # upper bounds only hold for the base statistics, BM25 search is
+        # exhaustive until the next compaction
+        self.term_upper_bounds = live_view.term_upper_bounds
+        self.avg_doc_length = live_view.avg_doc_length
+        self.__scorer = None
 
     def __get_avg_doc_length(self) -> float:
         # calculate avg doc length
@@ -151,6 +338,66 @@ class InvertedIndex:
 
         avg = sum_of_lengths / number_of_docs
         return avg
-        
-       
 
+
+def _index_docs(docs: list[tuple[int, str]]) -> tuple[CompactPostings, dict[int, int]]:
+    # tokenize (doc_id, text) pairs into compact postings and doc lengths,
+    # used for the whole corpus or, in a worker process, for one shard of it
+    postings: dict[str, dict[int, int]] = {}
+    doc_lengths: dict[int, int] = {}
+    for doc_id, text in docs:
+        counter = Counter(process_text_to_tokens(text=text))
+        for token, tf in counter.items():
+            if token not in postings:
+                postings[token] = {}
+            postings[token][doc_id] = tf
+        doc_lengths[doc_id] = counter.total()
+    return CompactPostings.from_term_frequencies(postings), doc_lengths
+
+def _index_docs_parallel(docs: list[tuple[int, str]], workers: int) -> tuple[CompactPostings, dict[int, int]]:
+    # a few shards per worker keeps the pool busy when shards tokenize unevenly;
+    # shards are contiguous so merging in shard order matches a serial build
+    shard_size = ceil(len(docs) / (workers * 4))
+    shards = [docs[i:i + shard_size] for i in range(0, len(docs), shard_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partial_indexes = list(pool.map(_index_docs, shards))
+
+    doc_lengths: dict[int, int] = {}
+    for _, shard_doc_lengths in partial_indexes:
+        doc_lengths.update(shard_doc_lengths)
+    postings = CompactPostings.merge([shard_postings for shard_postings, _ in partial_indexes])
+    return postings, doc_lengths
+
+def bm25_search_process_pool(workers: int) -> ProcessPoolExecutor:
+    # forkserver: workers are not forked from the caller, which may be running
+    # other threads (e.g. the embedding model) at the time
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+
+def bm25_search_parallel(pool: ProcessPoolExecutor, queries: list[str], limit: int, workers: int,
+                         index_version: object=None) -> list[list[tuple[int, float]]]:
+    # BM25 scoring is pure Python, so a batch of queries is spread over the
+    # worker processes of ```pool``` (see ```bm25_search_process_pool```), which
+    # keep the saved index loaded between batches and reload it when
+    # ```index_version``` changes; shards are contiguous so results come back in query order
+    shard_size = ceil(len(queries) / (workers * 4))
+    shards = [queries[i:i + shard_size] for i in range(0, len(queries), shard_size)]
+    shard_results = pool.map(_bm25_search_shard, shards, [limit] * len(shards), [index_version] * len(shards))
+    return [results for shard in shard_results for results in shard]
+
+_worker_index: InvertedIndex | None = None
+_worker_index_version: object = None
+
+def _bm25_search_shard(queries: list[str], limit: int, index_version: object) -> list[list[tuple[int, float]]]:
+    global _worker_index, _worker_index_version
+    if _worker_index is None or index_version != _worker_index_version:
+        _worker_index = InvertedIndex()
+        _worker_index.load()
+        _worker_index_version = index_version
+    return [_worker_index.bm25_search(query=query, limit=limit) for query in queries]
+
+def _fingerprint(num_docs: int, vocab_size: int, total_postings: int, avg_doc_length: float) -> tuple:
+    # identifies a segment, so a saved delta is only applied to the index it was made against
+    return (num_docs, vocab_size, total_postings, avg_doc_length)
+
+def _bm25_idf(n: int, df: int) -> float:
+    return log((n - df + 0.5) / (df + 0.5) + 1)
@@ -1,14 +1,70 @@
 import math
+import json
 from .inverted_index import InvertedIndex
+from .index_segment import read_segment_header
 from .utils import process_text_to_tokens
-from .constants import BM25_K1,  BM25_B
+from .constants import BM25_K1,  BM25_B, INDEX_FILE_PATH
 
-def build_command() -> None:
+def build_command(workers: int=1) -> None:
     index = InvertedIndex()
     print("Building the Inverted Index...")
-    index.build()
+    if workers > 1:
+        print(f"Tokenizing across {workers} worker processes...")
+    index.build(workers=workers)
     index.save()
     print("Inverted Index built!! Saved to cache on disk.")
+
+def upsert_command(movies_file: str) -> None:
+    # movies_file uses the data/movies.json layout: {"movies": [{id, title, description}, ...]}
+    with open(movies_file, "r") as f:
+        movies = json.load(f)["movies"]
+
+    index = InvertedIndex()
+    index.load()
+    added = replaced = 0
+    for movie in movies:
+        if movie["id"] in index.docmap:
+            index.replace_document(movie)
+            replaced += 1
+        else:
+            index.add_document(movie)
+            added += 1
+    index.save()
+    print(f"Added {added} and replaced {replaced} documents.")
+    _print_pending_changes(index)
+
+def delete_command(doc_ids: list[int]) -> None:
+    index = InvertedIndex()
+    index.load()
+    for doc_id in doc_ids:
+        index.delete_document(doc_id)
+    index.save()
+    print(f"Deleted {len(doc_ids)} documents.")
+    _print_pending_changes(index)
+
+def compact_command() -> None:
+    index = InvertedIndex()
+    index.load()
+    pending = index.pending_changes
+    index.compact()
+    index.save()
+    print(f"Compacted {pending} pending changes into the index segment.")
+
+def _print_pending_changes(index: InvertedIndex) -> None:
+    if index.pending_changes:
+        print(f"{index.pending_changes} changes pending, saved to the index delta.")
+    else:
+        print("Index segment rewritten, no changes pending.")
+
+def stats_command() -> None:
+    # only the segment header is read, no postings are loaded
+    header = read_segment_header(INDEX_FILE_PATH)
+    print(f"Index segment: {INDEX_FILE_PATH} (format v{header['version']})")
+    print(f"Documents: {header['num_docs']}")
+    print(f"Vocabulary size: {header['vocab_size']}")
+    print(f"Postings: {header['total_postings']}")
+    print(f"Average document length: {header['avg_doc_length']:.2f}")
+    print(f"BM25 parameters: k1={header['k1']}, b={header['b']}")
         
 def search(search_query: str) -> list[dict]:
     index = InvertedIndex()
@@ -54,7 +110,7 @@ def idf(term: str) -> float:
     index = InvertedIndex()
     index.load()
 
-    doc_count = len(index.term_frequencies)
+    doc_count = len(index.doc_lengths)
 
     term_tokens = process_text_to_tokens(term)
     if not term_tokens:
@@ -63,10 +119,7 @@ def idf(term: str) -> float:
     if len(term_tokens) != 1:
         raise ValueError(f"Given term {term} has too many tokens, want one")
     
-    term_doc_count = 0.0
-    for term_counter in index.term_frequencies.values():
-        if term_tokens[0] in term_counter:
-            term_doc_count += 1
+    term_doc_count = index.doc_frequencies.get(term_tokens[0], 0)
     
     idf_score = math.log((doc_count + 1) / (term_doc_count + 1))
     return idf_score
@@ -0,0 +1,27 @@
+import threading
+
+_models: dict[tuple[str, str], object] = {}
+_models_lock = threading.Lock()
+
+def get_sentence_transformer(model_name: str):
+    """
+    The ```SentenceTransformer``` ```model_name```, loaded on first use and shared
+    by every search engine in the process.
+
+    ```sentence_transformers``` (and with it torch) is imported here rather than
+    at module import, so commands that never embed text do not pay for it."""
+    return _load("sentence_transformer", model_name)
+
+def get_cross_encoder(model_name: str):
+    """The ```CrossEncoder``` ```model_name```, loaded on first use and shared."""
+    return _load("cross_encoder", model_name)
+
+def _load(kind: str, model_name: str):
+    with _models_lock:
+        key = (kind, model_name)
+        if key not in _models:
+            from sentence_transformers import CrossEncoder, SentenceTransformer
+
+            model_class = SentenceTransformer if kind == "sentence_transformer" else CrossEncoder
+            _models[key] = model_class(model_name)
+        return _models[key]
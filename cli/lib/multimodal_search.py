@@ -1,27 +1,40 @@
 import numpy as np
-from PIL import Image
-from sentence_transformers import SentenceTransformer, util
 from pathlib import Path
 from .utils import get_movie_data_from_file
-from .constants import MOVIE_EMBEDDINGS_MULTIMODAL_PATH
+from .constants import MOVIE_EMBEDDINGS_MULTIMODAL_PATH, LEGACY_MOVIE_EMBEDDINGS_MULTIMODAL_PATH
+from .embedding_store import normalize_rows, save_embeddings, load_embeddings, migrate_legacy_embeddings
+from .semantic_search.logic import top_k_indices
+from .models import get_sentence_transformer
 
 class MultimodalSearch():
-    def __init__(self, documents: list[dict], model_name="clip-ViT-B-32"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, documents: list[dict], model_name="clip-ViT-B-32", mmap_embeddings: bool=True):
+        self.model_name = model_name
+        self._model = None
+        self.mmap_embeddings = mmap_embeddings
         self.documents = documents
         self.texts = [f"{doc['title']}: {doc['description']}" 
                       for doc in documents]
         self.text_embeddings = None
 
+    @property
+    def model(self):
+        """The CLIP model, loaded on first use."""
+        if self._model is None:
+            self._model = get_sentence_transformer(self.model_name)
+        return self._model
+
     def build_text_embeddings(self):
-        self.text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
-        MOVIE_EMBEDDINGS_MULTIMODAL_PATH.parent.mkdir(parents=True, exist_ok=True)
-        np.save(MOVIE_EMBEDDINGS_MULTIMODAL_PATH, self.text_embeddings)
+        text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
+        # stored normalized, cosine similarity is then a plain dot product
+        self.text_embeddings = save_embeddings(MOVIE_EMBEDDINGS_MULTIMODAL_PATH, text_embeddings)
 
     def load_or_create_text_embeddings(self):
+        if not MOVIE_EMBEDDINGS_MULTIMODAL_PATH.exists() and LEGACY_MOVIE_EMBEDDINGS_MULTIMODAL_PATH.exists():
+            migrate_legacy_embeddings(LEGACY_MOVIE_EMBEDDINGS_MULTIMODAL_PATH, MOVIE_EMBEDDINGS_MULTIMODAL_PATH)
         if MOVIE_EMBEDDINGS_MULTIMODAL_PATH.exists():
-            self.text_embeddings = np.load(MOVIE_EMBEDDINGS_MULTIMODAL_PATH, allow_pickle=True)
-            return
+            self.text_embeddings = load_embeddings(MOVIE_EMBEDDINGS_MULTIMODAL_PATH, mmap=self.mmap_embeddings)
+            if len(self.text_embeddings) == len(self.texts):
+                return
         self.build_text_embeddings()
 
 
@@ -29,27 +42,27 @@ class MultimodalSearch():
         img_path = Path(image).resolve()
         if not img_path.exists():
             raise ValueError(f"Given image {image} not found or does not exist")
+        from PIL import Image
+
         img = Image.open(img_path).convert("RGB")
         image_embeddings = self.model.encode([img], show_progress_bar=True)
         return image_embeddings[0]
     
     def search_with_image(self, img_path: str):
-        img_embedding = self.embed_image(image=img_path)
-
-        results = []
+        img_embedding = normalize_rows(self.embed_image(image=img_path))
 
         self.load_or_create_text_embeddings()
-        for i, txt_emb in enumerate(self.text_embeddings):
-            cosine_sim = util.cos_sim(img_embedding, txt_emb).item()
+        similarity_scores = self.text_embeddings @ img_embedding
+
+        results = []
+        for i in top_k_indices(similarity_scores, 5):
             results.append({
-                "doc_id": i+1,
+                "doc_id": int(i)+1,
                 "title": self.documents[i]["title"],
                 "description": self.documents[i]["description"],
-                "similarity_score": cosine_sim
+                "similarity_score": float(similarity_scores[i])
             })
-        
-        sorted_results = sorted(results, key=lambda d: d["similarity_score"], reverse=True)
-        return sorted_results[:5]
+        return results
     
 def verify_image_embedding_command(img_path):
     img = Path(img_path).resolve()
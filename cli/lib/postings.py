@@ -0,0 +1,161 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterator
+
+class PostingList:
+    """
+    Read-only view of one term's postings inside a ```CompactPostings```.
+
+    Doc ids are sorted ascending and ```tfs[i]``` is the term frequency of the
+    term in doc ```doc_ids[i]```. Both are zero-copy slices of the shared
+    arrays, so creating a posting list does not allocate per posting.
+
+    Attributes:
+        doc_ids (memoryview):
+            Sorted doc ids containing the term.
+        tfs (memoryview):
+            Term frequencies parallel to ```doc_ids```."""
+    __slots__ = ("doc_ids", "tfs")
+
+    def __init__(self, doc_ids: memoryview, tfs: memoryview):
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.doc_ids)
+
+    def __contains__(self, doc_id: int) -> bool:
+        i = bisect_left(self.doc_ids, doc_id)
+        return i < len(self.doc_ids) and self.doc_ids[i] == doc_id
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        """Iterate (doc_id, tf) pairs in doc id order."""
+        return zip(self.doc_ids, self.tfs)
+
+    def get_tf(self, doc_id: int) -> int:
+        """Term frequency of the term in ```doc_id```, 0 if the doc does not contain it."""
+        i = bisect_left(self.doc_ids, doc_id)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_id:
+            return self.tfs[i]
+        return 0
+
+
+class CompactPostings:
+    """
+    Array-backed inverted index: a term dictionary mapping every term to a
+    slice of two flat parallel arrays, one holding sorted doc ids and one
+    holding the matching term frequencies.
+
+    Replaces the ```dict[str, set[int]]``` index plus the per-doc ```Counter```
+    term frequencies. Postings cost 8 bytes each (two ```uint32```) instead of a
+    boxed int in a hash set plus a Counter entry, and the arrays pickle as raw
+    bytes.
+
+    Supports the read-only mapping operations the rest of the code needs:
+    ```postings[term]```, ```postings.get(term)```, ```term in postings```,
+    ```len(postings)``` and iteration over terms.
+
+    The arrays may also be typed memoryviews over a memory-mapped index
+    segment (see ```index_segment.py```), with a term dictionary that only
+    needs ```get```, ```in```, ```len``` and iteration.
+
+    Attributes:
+        term_ids (dict[str, int]):
+            Term dictionary, term -> position of its slice in ```offsets```.
+        offsets (array):
+            ```offsets[t]:offsets[t + 1]``` is the slice of term ```t``` in the
+            posting arrays.
+        doc_ids (array):
+            Doc ids of all posting lists, concatenated.
+        tfs (array):
+            Term frequencies of all posting lists, concatenated."""
+    def __init__(self, term_ids: dict[str, int], offsets: array, doc_ids: array, tfs: array):
+        self.term_ids = term_ids
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+
+    @classmethod
+    def from_term_frequencies(cls, postings: dict[str, dict[int, int]]) -> "CompactPostings":
+        """Freeze a ```term -> {doc_id: tf}``` mapping into the compact layout."""
+        term_ids = {}
+        offsets = array("Q", [0])
+        doc_ids = array("I")
+        tfs = array("I")
+        for term_id, term in enumerate(sorted(postings)):
+            term_ids[term] = term_id
+            doc_tfs = postings[term]
+            for doc_id in sorted(doc_tfs):
+                doc_ids.append(doc_id)
+                tfs.append(doc_tfs[doc_id])
+            offsets.append(len(doc_ids))
+        return cls(term_ids=term_ids, offsets=offsets, doc_ids=doc_ids, tfs=tfs)
+
+    @classmethod
+    def merge(cls, parts: list["CompactPostings"]) -> "CompactPostings":
+        """Merge partial indexes (e.g. one per build shard) into one.
+
+        When the parts cover increasing doc id ranges, each term's posting
+        lists are concatenated as they are. Otherwise they are merged and
+        re-sorted, with later parts winning for a doc id present in several."""
+        terms = sorted(set().union(*(part.term_ids for part in parts)))
+        term_ids = {}
+        offsets = array("Q", [0])
+        doc_ids = array("I")
+        tfs = array("I")
+        for term_id, term in enumerate(terms):
+            term_ids[term] = term_id
+            posting_lists = [part[term] for part in parts if term in part]
+            in_order = all(
+                prev.doc_ids[-1] < cur.doc_ids[0]
+                for prev, cur in zip(posting_lists, posting_lists[1:])
+            )
+            if in_order:
+                for posting_list in posting_lists:
+                    doc_ids.extend(posting_list.doc_ids)
+                    tfs.extend(posting_list.tfs)
+            else:
+                doc_tfs = {}
+                for posting_list in posting_lists:
+                    doc_tfs.update(posting_list.items())
+                for doc_id in sorted(doc_tfs):
+                    doc_ids.append(doc_id)
+                    tfs.append(doc_tfs[doc_id])
+            offsets.append(len(doc_ids))
+        return cls(term_ids=term_ids, offsets=offsets, doc_ids=doc_ids, tfs=tfs)
+
+    def __len__(self) -> int:
+        return len(self.term_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.term_ids)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.term_ids
+
+    def __getitem__(self, term: str) -> PostingList:
+        posting_list = self.get(term)
+        if posting_list is None:
+            raise KeyError(term)
+        return posting_list
+
+    def get(self, term: str, default=None) -> PostingList | None:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return default
+        start = self.offsets[term_id]
+        end = self.offsets[term_id + 1]
+        return PostingList(
+            doc_ids=memoryview(self.doc_ids)[start:end],
+            tfs=memoryview(self.tfs)[start:end]
+        )
+
+    def items(self) -> Iterator[tuple[str, PostingList]]:
+        for term in self.term_ids:
+            yield term, self[term]
+
+    def total_postings(self) -> int:
+        return len(self.doc_ids)
@@ -0,0 +1,204 @@
+from pathlib import Path
+import numpy as np
+from .ann_index import matrix_fingerprint
+from .constants import DEFAULT_PQ_SUBSPACES, DEFAULT_PQ_ITERATIONS
+
+# rows converted back to float per step, bounds the temporary memory of a scan
+_SCAN_BATCH_ROWS = 65_536
+
+
+class ScalarQuantizedEmbeddings:
+    """
+    Embedding matrix stored as ```int8``` codes, one byte per dimension
+    instead of four (4x smaller than ```float32```).
+
+    Every dimension is quantized uniformly between its min and max over the
+    matrix: ```value ~= offsets[d] + scales[d] * (code + 128)```.
+
+    Queries are scored with asymmetric distance computation: the query stays
+    in ```float32``` and is dotted with the codes directly, folding the
+    per-dimension scale and offset into the query instead of decoding the
+    matrix.
+
+    Attributes:
+        codes (np.ndarray):
+            ```int8``` codes; shape = (num_rows, embedding_dimension).
+        offsets (np.ndarray):
+            Per-dimension minimum.
+        scales (np.ndarray):
+            Per-dimension quantization step.
+        fingerprint (np.ndarray):
+            Fingerprint of the float matrix the codes were built from."""
+    kind = "int8"
+
+    def __init__(self, codes: np.ndarray, offsets: np.ndarray, scales: np.ndarray, fingerprint: np.ndarray):
+        self.codes = codes
+        self.offsets = offsets
+        self.scales = scales
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.offsets.nbytes + self.scales.nbytes
+
+    @classmethod
+    def build(cls, vectors: np.ndarray) -> "ScalarQuantizedEmbeddings":
+        offsets = vectors.min(axis=0).astype(np.float32)
+        spans = vectors.max(axis=0) - offsets
+        scales = np.where(spans > 0, spans / 255, 1).astype(np.float32)
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), _SCAN_BATCH_ROWS):
+            batch = vectors[start:start + _SCAN_BATCH_ROWS]
+            levels = np.rint((batch - offsets) / scales)
+            codes[start:start + _SCAN_BATCH_ROWS] = np.clip(levels, 0, 255) - 128
+        return cls(codes=codes, offsets=offsets, scales=scales, fingerprint=matrix_fingerprint(vectors))
+
+    def scores(self, query: np.ndarray, rows: np.ndarray | None=None) -> np.ndarray:
+        """Approximate dot products of ```query``` with every row, or with ```rows``` only."""
+        codes = self.codes if rows is None else self.codes[rows]
+        scaled_query = query * self.scales
+        bias = float(query @ self.offsets + 128 * scaled_query.sum())
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCAN_BATCH_ROWS):
+            batch = codes[start:start + _SCAN_BATCH_ROWS].astype(np.float32)
+            scores[start:start + _SCAN_BATCH_ROWS] = batch @ scaled_query
+        return scores + bias
+
+    def save(self, path: Path) -> None:
+        np.savez(path, kind=self.kind, codes=self.codes, offsets=self.offsets,
+                 scales=self.scales, fingerprint=self.fingerprint)
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "ScalarQuantizedEmbeddings":
+        return cls(codes=arrays["codes"], offsets=arrays["offsets"],
+                   scales=arrays["scales"], fingerprint=arrays["fingerprint"])
+
+
+class ProductQuantizedEmbeddings:
+    """
+    Embedding matrix stored with product quantization (PQ): every vector is
+    split into ```num_subspaces``` equal sub-vectors and each sub-vector is
+    replaced by the index of its nearest centroid in that subspace's
+    codebook of up to 256 centroids. A vector costs ```num_subspaces``` bytes,
+    e.g. 96 bytes instead of 1536 for 384 ```float32``` dimensions (16x).
+
+    Queries are scored with asymmetric distance computation: a table of the
+    query's dot product with every centroid of every subspace is computed
+    once, and a row's score is the sum of its codes' table entries.
+
+    Attributes:
+        codes (np.ndarray):
+            ```uint8``` centroid indices; shape = (num_rows, num_subspaces).
+        codebooks (np.ndarray):
+            Centroids; shape = (num_subspaces, num_centroids, subspace_dimension).
+        fingerprint (np.ndarray):
+            Fingerprint of the float matrix the codes were built from."""
+    kind = "pq"
+
+    def __init__(self, codes: np.ndarray, codebooks: np.ndarray, fingerprint: np.ndarray):
+        self.codes = codes
+        self.codebooks = codebooks
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, num_subspaces: int=DEFAULT_PQ_SUBSPACES,
+              iterations: int=DEFAULT_PQ_ITERATIONS, seed: int=0) -> "ProductQuantizedEmbeddings":
+        num_rows, dimension = vectors.shape
+        if dimension % num_subspaces:
+            raise ValueError(f"Embedding dimension {dimension} is not divisible by {num_subspaces} subspaces")
+        subspace_dimension = dimension // num_subspaces
+        num_centroids = min(256, num_rows)
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(num_rows, num_centroids * 32)
+        sample = vectors[np.sort(rng.choice(num_rows, size=sample_size, replace=False))]
+
+        codebooks = np.empty((num_subspaces, num_centroids, subspace_dimension), dtype=np.float32)
+        codes = np.empty((num_rows, num_subspaces), dtype=np.uint8)
+        for m in range(num_subspaces):
+            subspace = slice(m * subspace_dimension, (m + 1) * subspace_dimension)
+            codebooks[m] = _kmeans(sample[:, subspace], num_centroids, iterations=iterations, rng=rng)
+            codes[:, m] = _nearest(vectors[:, subspace], codebooks[m])
+        return cls(codes=codes, codebooks=codebooks, fingerprint=matrix_fingerprint(vectors))
+
+    def scores(self, query: np.ndarray, rows: np.ndarray | None=None) -> np.ndarray:
+        """Approximate dot products of ```query``` with every row, or with ```rows``` only."""
+        num_subspaces, _, subspace_dimension = self.codebooks.shape
+        # table[m, c] -> dot product of the query's m-th sub-vector with centroid c
+        table = np.einsum("mcd,md->mc", self.codebooks, query.reshape(num_subspaces, subspace_dimension))
+        codes = self.codes if rows is None else self.codes[rows]
+        subspaces = np.arange(num_subspaces)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCAN_BATCH_ROWS):
+            batch = codes[start:start + _SCAN_BATCH_ROWS]
+            scores[start:start + _SCAN_BATCH_ROWS] = table[subspaces, batch].sum(axis=1)
+        return scores
+
+    def save(self, path: Path) -> None:
+        np.savez(path, kind=self.kind, codes=self.codes, codebooks=self.codebooks, fingerprint=self.fingerprint)
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "ProductQuantizedEmbeddings":
+        return cls(codes=arrays["codes"], codebooks=arrays["codebooks"], fingerprint=arrays["fingerprint"])
+
+
+QUANTIZERS = {
+    ScalarQuantizedEmbeddings.kind: ScalarQuantizedEmbeddings,
+    ProductQuantizedEmbeddings.kind: ProductQuantizedEmbeddings
+}
+
+
+def load_quantized_embeddings(path: Path) -> ScalarQuantizedEmbeddings | ProductQuantizedEmbeddings:
+    with np.load(path) as arrays:
+        return QUANTIZERS[str(arrays["kind"])].from_arrays(arrays)
+
+
+def load_or_build_quantized_embeddings(path: Path, vectors: np.ndarray, kind: str):
+    """Load the ```kind``` (```int8``` or ```pq```) quantized embeddings saved at
+    ```path``` if they were built from ```vectors```, else build and save them."""
+    if path.exists():
+        quantized = load_quantized_embeddings(path)
+        if quantized.kind == kind and np.array_equal(quantized.fingerprint, matrix_fingerprint(vectors)):
+            return quantized
+    quantized = QUANTIZERS[kind].build(vectors)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    quantized.save(path)
+    return quantized
+
+
+def _kmeans(sample: np.ndarray, num_centroids: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = sample[rng.choice(len(sample), size=num_centroids, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(sample, centroids)
+        counts = np.bincount(assignments, minlength=num_centroids)
+        # per-dimension weighted bincounts are much faster than np.add.at
+        sums = np.stack([
+            np.bincount(assignments, weights=sample[:, d], minlength=num_centroids)
+            for d in range(sample.shape[1])
+        ], axis=1)
+        non_empty = counts > 0
+        centroids[non_empty] = (sums[non_empty] / counts[non_empty, None]).astype(np.float32)
+        # empty centroids restart from a random sample point
+        empty = np.flatnonzero(~non_empty)
+        centroids[empty] = sample[rng.choice(len(sample), size=len(empty))]
+    return centroids
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin of squared euclidean distance; ||x||^2 is the same for every centroid
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _SCAN_BATCH_ROWS):
+        batch = vectors[start:start + _SCAN_BATCH_ROWS]
+        assignments[start:start + _SCAN_BATCH_ROWS] = np.argmin(centroid_norms - 2 * batch @ centroids.T, axis=1)
+    return assignments
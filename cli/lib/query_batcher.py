@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import Executor
+import numpy as np
+from .constants import DEFAULT_QUERY_BATCH_SIZE, DEFAULT_QUERY_BATCH_WAIT_MS
+
+class QueryEmbeddingBatcher:
+    """
+    Micro-batches the query embeddings of concurrent requests: queries that
+    arrive while the model is busy, or within ```max_wait_ms``` of each other,
+    are encoded together in one ```generate_embeddings``` call (one
+    ```model.encode```) on ```executor```, so the event loop never blocks on the
+    model and a burst of N queries costs about one forward pass, not N.
+
+    Embeddings land in the engine's query cache, so the search that follows
+    takes them from there; queries already cached are not queued at all.
+    One batch is encoded at a time, the next batch fills up meanwhile.
+
+    Attributes:
+        engine (SemanticSearch):
+            Engine whose model and query cache are used.
+        executor (Executor):
+            Pool the blocking ```encode``` calls run on.
+        max_batch_size (int):
+            Queries per ```encode``` call at most.
+        max_wait_ms (float):
+            How long a lone query waits for others before it is encoded.
+        batches (int):
+            ```encode``` calls made.
+        batched_queries (int):
+            Queries encoded through those calls."""
+    def __init__(self, engine, executor: Executor, max_batch_size: int=DEFAULT_QUERY_BATCH_SIZE,
+                 max_wait_ms: float=DEFAULT_QUERY_BATCH_WAIT_MS):
+        self.engine = engine
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.batched_queries = 0
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._encoding = False
+
+    async def embed(self, text: str) -> np.ndarray:
+        """The embedding of ```text```, encoded in a batch with other concurrent queries."""
+        if text == "" or text.isspace():
+            # rejected here so one bad query cannot fail the whole batch
+            raise ValueError("Given text is empty or contains only whitespace")
+        if self.engine.query_cache.contains(self.engine.model_name, text):
+            return self.engine.generate_embedding(text)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "batched_queries": self.batched_queries,
+            "mean_batch_size": self.batched_queries / self.batches if self.batches else 0.0
+        }
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._encoding or not self._pending:
+            # the running batch flushes again when it is done
+            return
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        self._encoding = True
+        asyncio.get_running_loop().create_task(self._encode(batch))
+
+    async def _encode(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.engine.generate_embeddings, texts
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self.batches += 1
+            self.batched_queries += len(texts)
+            by_text = dict(zip(texts, embeddings))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+        finally:
+            self._encoding = False
+            if self._pending:
+                self._flush()
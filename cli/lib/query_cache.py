@@ -0,0 +1,138 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from .constants import QUERY_EMBEDDING_CACHE_PATH, DEFAULT_QUERY_CACHE_SIZE
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings, so a repeated query skips the
+    embedding model entirely.
+
+    Entries are keyed by model name and the normalized query text (leading,
+    trailing and repeated whitespace removed), so one cache can be shared by
+    every search engine in the process whatever model it uses. Cached
+    embeddings are read-only arrays. The cache is thread-safe.
+
+    Attributes:
+        max_entries (int):
+            Number of embeddings kept; the least recently used is evicted first.
+        path (Path | None):
+            **.npz** file the cache is loaded from and ```save()```d to, if persisted.
+        hits (int):
+            Lookups answered from the cache.
+        misses (int):
+            Lookups that had to run the model."""
+    def __init__(self, max_entries: int=DEFAULT_QUERY_CACHE_SIZE, path: Path | None=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path is not None and path.exists():
+            self._load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, model_name: str, text: str) -> np.ndarray | None:
+        """The cached embedding of ```text``` under ```model_name```, or ```None```."""
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def contains(self, model_name: str, text: str) -> bool:
+        """Whether ```text``` is cached, without counting a lookup or refreshing the entry."""
+        return (model_name, normalize_query(text)) in self._entries
+
+    def put(self, model_name: str, text: str, embedding: np.ndarray) -> np.ndarray:
+        """Cache ```embedding``` for ```text``` and return the cached (read-only) copy."""
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        return embedding
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the entries to ```path``` (least recently used first), if they
+        changed since the cache was loaded or last saved."""
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            keys = list(self._entries)
+            embeddings = list(self._entries.values())
+            self._dirty = False
+        offsets = np.cumsum([0] + [len(embedding) for embedding in embeddings])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            np.savez(
+                f,
+                model_names=np.array([model_name for model_name, _ in keys], dtype=str),
+                texts=np.array([text for _, text in keys], dtype=str),
+                offsets=offsets.astype(np.int64),
+                # embeddings of different models may differ in length, so they are stored flat
+                vectors=np.concatenate(embeddings) if embeddings else np.empty(0, dtype=np.float32)
+            )
+        os.replace(tmp_path, self.path)
+
+    def _load(self, path: Path) -> None:
+        with np.load(path) as arrays:
+            offsets = arrays["offsets"]
+            vectors = arrays["vectors"]
+            for i, (model_name, text) in enumerate(zip(arrays["model_names"].tolist(), arrays["texts"].tolist())):
+                embedding = vectors[offsets[i]:offsets[i + 1]]
+                embedding.setflags(write=False)
+                self._entries[(model_name, text)] = embedding
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+
+_shared_cache: QueryEmbeddingCache | None = None
+_shared_cache_lock = threading.Lock()
+
+def shared_query_cache() -> QueryEmbeddingCache:
+    """The process-wide query embedding cache used by default by every search
+    engine. It is persisted to ```cache/query_embeddings.npz```: loaded on first
+    use and saved when the process exits, so repeated queries also skip the
+    model across CLI runs."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = QueryEmbeddingCache(path=QUERY_EMBEDDING_CACHE_PATH)
+            atexit.register(_shared_cache.save)
+        return _shared_cache
@@ -1,16 +1,11 @@
 import time
-import os
 import re
 import json
-from dotenv import load_dotenv
-from google import genai
 from typing import Optional
 from .prompts import re_rank_individual_docs_prompt, re_rank_batch_prompt
-from sentence_transformers import CrossEncoder
+from .genai_client import get_genai_client
+from .models import get_cross_encoder
 
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash-001"
 
 def re_rank_scores(query: str, scores: list[dict], method: Optional[str]= None) -> list[dict]:
@@ -30,7 +25,7 @@ def re_rank_cross_encoder(query: str, scores: list[dict]):
     for doc in scores:
         pairs.append([query, f"{doc.get('title', '')} - {doc.get('document', '')}"])
 
-    cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
+    cross_encoder = get_cross_encoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
     
     # list of numbers, one for each pair i.e. one for
     # each [query, doc_title, doc_description]
@@ -65,6 +60,8 @@ def re_rank_batch(query: str, scores: list[dict]):
 
 def generate_response_batch(prompt: str, max_retries: int=5) -> list[int]:
     time_delay = 5.0
+    # outside the retry loop: a missing API key fails at once instead of being retried
+    client = get_genai_client()
     for attempt in range(max_retries):
         try:
             response = client.models.generate_content(model=model, contents=prompt)
@@ -93,6 +90,8 @@ def re_rank_individual(query: str, scores: list[dict]) -> list[dict]:
 
 def generate_response_rank(prompt: str, max_retries: int=5) -> float:
     time_delay = 5.0
+    # outside the retry loop: a missing API key fails at once instead of being retried
+    client = get_genai_client()
     for attempt in range(max_retries):
         try:
             response = client.models.generate_content(model=model, contents=prompt)
@@ -0,0 +1,76 @@
+import json
+import os
+from urllib import error, request
+from .constants import SEARCH_SERVER_URL_ENV
+
+class SearchServerError(RuntimeError):
+    """The search server could not be reached or rejected a request."""
+
+
+class SearchClient:
+    """
+    Thin client of the search server started with ```search_server_cli.py serve```.
+    Every call is one JSON request over HTTP; the server answers with the same
+    result objects the local search functions return.
+
+    Attributes:
+        url (str):
+            Base URL of the server, e.g. ```http://127.0.0.1:8765```.
+        timeout (float):
+            Seconds to wait for a response (RAG requests wait on the LLM)."""
+    def __init__(self, url: str, timeout: float=120.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def call(self, endpoint: str, **params) -> dict:
+        """POST ```params``` as JSON to ```/<endpoint>``` and return the decoded response."""
+        body = json.dumps(params).encode()
+        req = request.Request(f"{self.url}/{endpoint}", data=body,
+                              headers={"Content-Type": "application/json"}, method="POST")
+        return self._send(req)
+
+    def health(self) -> dict:
+        return self._send(request.Request(f"{self.url}/health"))
+
+    def stats(self) -> dict:
+        return self._send(request.Request(f"{self.url}/stats"))
+
+    def keyword_search(self, query: str, limit: int=5) -> list[dict]:
+        return self.call("keyword", query=query, limit=limit)["results"]
+
+    def semantic_search(self, query: str, limit: int=5) -> list[dict]:
+        return self.call("semantic", query=query, limit=limit)["results"]
+
+    def chunked_search(self, query: str, limit: int=5) -> list[dict]:
+        return self.call("chunked", query=query, limit=limit)["results"]
+
+    def weighted_search(self, query: str, alpha: float=0.5, limit: int=5, normalization: str="minmax",
+                        adaptive: bool=False) -> list[dict]:
+        return self.call("weighted", query=query, alpha=alpha, limit=limit, normalization=normalization,
+                         adaptive=adaptive)["results"]
+
+    def rrf_search(self, query: str, k: int=60, limit: int=5, enhance: str | None=None,
+                   re_rank: str | None=None, adaptive: bool=False) -> dict:
+        return self.call("rrf", query=query, k=k, limit=limit, enhance=enhance, re_rank=re_rank, adaptive=adaptive)
+
+    def rag(self, kind: str, query: str, limit: int=5) -> tuple[str, list[dict]]:
+        response = self.call("rag", kind=kind, query=query, limit=limit)
+        return response["answer"], response["results"]
+
+    def _send(self, req: request.Request) -> dict:
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return json.load(response)
+        except error.HTTPError as e:
+            try:
+                message = json.load(e).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise SearchServerError(f"Search server error ({e.code}): {message}") from None
+        except error.URLError as e:
+            raise SearchServerError(f"Search server at {self.url} is not reachable: {e.reason}") from None
+
+
+def default_server_url() -> str | None:
+    """Server URL from the ```SEARCH_SERVER_URL``` environment variable, if set."""
+    return os.environ.get(SEARCH_SERVER_URL_ENV) or None
@@ -0,0 +1,352 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+import numpy as np
+from .utils import get_movie_data_from_file
+from .hybrid_search.logic import HybridSearch
+from .hybrid_search.commands import weighted_search, rrf_search
+from .augmented_generation import RAG_GENERATORS
+from .enhance_query import enhance_query
+from .re_rank_results import re_rank_scores
+from .query_batcher import QueryEmbeddingBatcher
+from .constants import (
+    DEFAULT_SEARCH_SERVER_HOST, DEFAULT_SEARCH_SERVER_PORT, DEFAULT_QUERY_BATCH_SIZE,
+    DEFAULT_QUERY_BATCH_WAIT_MS, DEFAULT_LLM_WORKERS, DEFAULT_RETRIEVAL_WORKERS
+)
+
+class SearchService:
+    """
+    Every search engine loaded once — documents, BM25 index, document and
+    chunk embeddings, embedding model — and shared by all requests, so a query
+    costs only its own scoring instead of a full CLI start-up.
+
+    The engines are safe to call from several threads: embeddings are
+    read-only, the query embedding cache is locked, and the BM25 index is
+    replaced, not modified, when it changes on disk.
+
+    Attributes:
+        documents (list[dict]):
+            The movie documents.
+        document_map (dict[int, dict]):
+            Mapping from document IDs to documents.
+        hybrid (HybridSearch):
+            BM25 + chunked semantic engine; its ```semantic_search``` also holds
+            the document embeddings used by ```semantic```.
+        requests_served (int):
+            Requests answered since start-up.
+        started_at (float):
+            ```time.time()``` when the engines finished loading."""
+    def __init__(self, documents: list[dict] | None=None, nprobe: int | None=None, quantized: str | None=None,
+                 retrieval_workers: int=DEFAULT_RETRIEVAL_WORKERS):
+        self.documents = documents if documents is not None else get_movie_data_from_file()
+        self.document_map = {doc["id"]: doc for doc in self.documents}
+        self.hybrid = HybridSearch(documents=self.documents, retrieval_workers=retrieval_workers)
+        semantic = self.hybrid.semantic_search
+        semantic.load_or_create_embeddings(documents=self.documents)
+        if nprobe is not None:
+            semantic.load_or_create_ann_index(nprobe=nprobe)
+            semantic.load_or_create_chunk_ann_index(nprobe=nprobe)
+        if quantized is not None:
+            semantic.load_or_create_quantized_embeddings(kind=quantized)
+            semantic.load_or_create_chunk_quantized_embeddings(kind=quantized)
+        self.requests_served = 0
+        self.started_at = time.time()
+        self._counter_lock = threading.Lock()
+        self._endpoints = {
+            "keyword": self.keyword,
+            "semantic": self.semantic,
+            "chunked": self.chunked,
+            "weighted": self.weighted,
+            "rrf": self.rrf,
+            "rag": self.rag
+        }
+
+    def handle(self, endpoint: str, params: dict) -> dict:
+        """Answer one request. Raises ```KeyError``` for an unknown endpoint and
+        ```ValueError```/```TypeError``` for invalid parameters."""
+        if endpoint not in self._endpoints:
+            raise KeyError(f"Unknown endpoint '{endpoint}'")
+        response = self._endpoints[endpoint](**params)
+        self.record_request()
+        return response
+
+    def record_request(self) -> None:
+        with self._counter_lock:
+            self.requests_served += 1
+
+    def keyword(self, query: str, limit: int=5) -> dict:
+        results = [
+            {"id": doc_id, "title": self.document_map[doc_id]["title"], "score": score}
+            for doc_id, score in self.hybrid.bm25_search(query=query, limit=limit)
+            if doc_id in self.document_map
+        ]
+        return {"results": results}
+
+    def semantic(self, query: str, limit: int=5) -> dict:
+        return {"results": self.hybrid.semantic_search.search(query=query, limit=limit)}
+
+    def chunked(self, query: str, limit: int=5) -> dict:
+        return {"results": self.hybrid.semantic_search.search_chunks(query=query, limit=limit)}
+
+    def weighted(self, query: str, alpha: float=0.5, limit: int=5, normalization: str="minmax",
+                 adaptive: bool=False) -> dict:
+        return {"results": weighted_search(query=query, alpha=alpha, limit=limit, normalization=normalization,
+                                           adaptive=adaptive, searcher=self.hybrid)}
+
+    def rrf(self, query: str, k: int=60, limit: int=5, enhance: str | None=None, re_rank: str | None=None,
+            adaptive: bool=False) -> dict:
+        return rrf_search(query=query, k=k, limit=limit, enhance=enhance, re_rank=re_rank, adaptive=adaptive,
+                          searcher=self.hybrid)
+
+    def rrf_candidates(self, query: str, k: int=60, limit: int=5, adaptive: bool=False) -> tuple[list[dict], dict]:
+        """RRF results before re-ranking, with the search statistics of this call."""
+        results = self.hybrid.rrf_search(query=query, k=k, limit=limit, adaptive=adaptive)
+        return results, self.hybrid.last_search_stats
+
+    def rag(self, query: str, kind: str="rag", limit: int=5) -> dict:
+        if kind not in RAG_GENERATORS:
+            raise ValueError(f"Unknown RAG kind '{kind}', expected one of {sorted(RAG_GENERATORS)}")
+        answer, results = RAG_GENERATORS[kind](query=query, limit=limit, searcher=self.hybrid)
+        return {"answer": answer, "results": results}
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.documents),
+            "requests_served": self.requests_served,
+            "uptime_seconds": time.time() - self.started_at,
+            "query_cache": self.hybrid.semantic_search.query_cache.stats()
+        }
+
+
+class AsyncSearchService:
+    """
+    Asyncio front end of a ```SearchService``` for many concurrent requests.
+    Nothing blocks the event loop:
+
+    - query embeddings are micro-batched across concurrent requests by a
+      ```QueryEmbeddingBatcher```, one ```model.encode``` per batch;
+    - BM25 and embedding scoring run on ```search_executor```, sized to the
+      cores (numpy and the model release the GIL while they compute);
+    - LLM calls (query enhancement, LLM re-ranking, RAG generation) run on
+      the separate ```llm_executor```, so requests waiting on Gemini do not
+      hold back searches.
+
+    Attributes:
+        service (SearchService):
+            The loaded engines.
+        search_executor (ThreadPoolExecutor):
+            Threads for BM25, embedding scoring and the model.
+        llm_executor (ThreadPoolExecutor):
+            Threads waiting on LLM responses.
+        batcher (QueryEmbeddingBatcher):
+            Coalesces query embeddings of concurrent requests."""
+    def __init__(self, service: SearchService, search_workers: int | None=None,
+                 llm_workers: int=DEFAULT_LLM_WORKERS, max_batch_size: int=DEFAULT_QUERY_BATCH_SIZE,
+                 max_wait_ms: float=DEFAULT_QUERY_BATCH_WAIT_MS):
+        self.service = service
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=search_workers or os.cpu_count() or 1, thread_name_prefix="search"
+        )
+        self.llm_executor = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="llm")
+        self.batcher = QueryEmbeddingBatcher(
+            self.service.hybrid.semantic_search, self.search_executor,
+            max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+        self._endpoints = {
+            "keyword": self.keyword,
+            "semantic": self.semantic,
+            "chunked": self.chunked,
+            "weighted": self.weighted,
+            "rrf": self.rrf,
+            "rag": self.rag
+        }
+
+    async def handle(self, endpoint: str, params: dict) -> dict:
+        """Answer one request, with the errors of ```SearchService.handle```."""
+        if endpoint not in self._endpoints:
+            raise KeyError(f"Unknown endpoint '{endpoint}'")
+        response = await self._endpoints[endpoint](**params)
+        self.service.record_request()
+        return response
+
+    async def keyword(self, query: str, limit: int=5) -> dict:
+        return await self._search(self.service.keyword, query=query, limit=limit)
+
+    async def semantic(self, query: str, limit: int=5) -> dict:
+        await self.batcher.embed(query)
+        return await self._search(self.service.semantic, query=query, limit=limit)
+
+    async def chunked(self, query: str, limit: int=5) -> dict:
+        await self.batcher.embed(query)
+        return await self._search(self.service.chunked, query=query, limit=limit)
+
+    async def weighted(self, query: str, alpha: float=0.5, limit: int=5, normalization: str="minmax",
+                       adaptive: bool=False) -> dict:
+        await self.batcher.embed(query)
+        return await self._search(self.service.weighted, query=query, alpha=alpha, limit=limit,
+                                  normalization=normalization, adaptive=adaptive)
+
+    async def rrf(self, query: str, k: int=60, limit: int=5, enhance: str | None=None, re_rank: str | None=None,
+                  adaptive: bool=False) -> dict:
+        # the steps of hybrid_search.commands.rrf_search, each on its own pool
+        enhanced_query = None
+        if enhance:
+            enhanced_query = await self._llm(enhance_query, query=query, method=enhance)
+        query_to_use = enhanced_query if enhanced_query else query
+        await self.batcher.embed(query_to_use)
+        results, search_stats = await self._search(self.service.rrf_candidates, query=query_to_use, k=k,
+                                                   limit=limit, adaptive=adaptive)
+        re_ranked_results = results
+        if re_rank:
+            re_ranked_results = await self._llm(re_rank_scores, query=query_to_use, scores=results, method=re_rank)
+        return {
+            "enhanced_query": enhanced_query,
+            "enhance_method": enhance,
+            "query_used": query_to_use,
+            "initial_results": results,
+            "results": re_ranked_results,
+            "search_stats": search_stats
+        }
+
+    async def rag(self, query: str, kind: str="rag", limit: int=5) -> dict:
+        if kind not in RAG_GENERATORS:
+            raise ValueError(f"Unknown RAG kind '{kind}', expected one of {sorted(RAG_GENERATORS)}")
+        await self.batcher.embed(query)
+        # retrieval is quick once the query is embedded; the thread mostly waits on the LLM
+        return await self._llm(self.service.rag, query=query, kind=kind, limit=limit)
+
+    def stats(self) -> dict:
+        return {**self.service.stats(), "query_batches": self.batcher.stats()}
+
+    def shutdown(self) -> None:
+        self.search_executor.shutdown(wait=False, cancel_futures=True)
+        self.llm_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _search(self, func, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.search_executor, partial(func, **kwargs))
+
+    async def _llm(self, func, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.llm_executor, partial(func, **kwargs))
+
+
+class SearchHTTPServer:
+    """
+    JSON over HTTP/1.1 on asyncio streams: ```POST /<endpoint>``` with the
+    parameters as a JSON object (see ```SearchService.handle```), ```GET /health```
+    and ```GET /stats```. Errors are answered as ```{"error": message}```.
+    Connections are kept alive unless the client asks to close them.
+
+    Attributes:
+        service (AsyncSearchService):
+            Answers the requests."""
+    def __init__(self, service: AsyncSearchService):
+        self.service = service
+
+    async def start(self, host: str=DEFAULT_SEARCH_SERVER_HOST, port: int=DEFAULT_SEARCH_SERVER_PORT) -> asyncio.Server:
+        return await asyncio.start_server(self._handle_connection, host=host, port=port)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self._respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # client went away or sent something that is not HTTP
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        if method == "GET":
+            match path.rstrip("/"):
+                case "/health":
+                    return HTTPStatus.OK, {"status": "ok"}
+                case "/stats":
+                    return HTTPStatus.OK, self.service.stats()
+                case _:
+                    return HTTPStatus.NOT_FOUND, {"error": f"Unknown path '{path}'"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Unsupported method '{method}'"}
+        try:
+            params = json.loads(body or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("Request body must be a JSON object")
+            response = await self.service.handle(path.strip("/"), params)
+        except KeyError as e:
+            return HTTPStatus.NOT_FOUND, {"error": str(e.args[0]) if e.args else "Not found"}
+        except (ValueError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+        return HTTPStatus.OK, response
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool) -> None:
+        body = json.dumps(payload, default=_json_default).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+
+
+def _json_default(value):
+    # numpy scalars/arrays in result dicts
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def serve(service: AsyncSearchService, host: str=DEFAULT_SEARCH_SERVER_HOST,
+                port: int=DEFAULT_SEARCH_SERVER_PORT) -> None:
+    server = await SearchHTTPServer(service).start(host=host, port=port)
+    bound_port = server.sockets[0].getsockname()[1]
+    print(f"Search server listening on http://{host}:{bound_port}")
+    async with server:
+        await server.serve_forever()
+
+
+def serve_command(host: str=DEFAULT_SEARCH_SERVER_HOST, port: int=DEFAULT_SEARCH_SERVER_PORT,
+                  nprobe: int | None=None, quantized: str | None=None, search_workers: int | None=None,
+                  llm_workers: int=DEFAULT_LLM_WORKERS, batch_size: int=DEFAULT_QUERY_BATCH_SIZE,
+                  batch_wait_ms: float=DEFAULT_QUERY_BATCH_WAIT_MS) -> None:
+    print("Loading documents, index, embeddings and model...")
+    start = time.perf_counter()
+    search_workers = search_workers or os.cpu_count() or 1
+    # one semantic stage per search thread can overlap with its BM25 stage
+    service = SearchService(nprobe=nprobe, quantized=quantized, retrieval_workers=search_workers)
+    # load the embedding model now rather than on the first request
+    service.hybrid.semantic_search.model
+    print(f"Loaded {len(service.documents)} documents in {time.perf_counter() - start:.1f}s")
+    async_service = AsyncSearchService(
+        service, search_workers=search_workers, llm_workers=llm_workers,
+        max_batch_size=batch_size, max_wait_ms=batch_wait_ms
+    )
+    try:
+        asyncio.run(serve(async_service, host=host, port=port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        async_service.shutdown()
+        service.hybrid.semantic_search.query_cache.save()
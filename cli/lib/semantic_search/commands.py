@@ -1,5 +1,6 @@
 from .logic import SemanticSearch
 from lib.utils import get_movie_data_from_file
+from lib.search_client import SearchClient
 from lib.constants import DEFAULT_CHUNK_SIZE
 
 def verify_model_command():
@@ -28,17 +29,33 @@ def embed_query_text_command(query: str):
     print(f"First 5 dimensions: {query_embedding[:5]}")
     print(f"Shape: {query_embedding.shape}")
 
-def search_command(query: str, limit: int=5):
-    sem_search = SemanticSearch()
-    movies_list = get_movie_data_from_file()
-    movie_embeddings = sem_search.load_or_create_embeddings(documents=movies_list)
-    results = sem_search.search(query=query, limit=limit)
+def search_command(query: str, limit: int=5, nprobe: int | None=None, quantized: str | None=None,
+                   server: str | None=None):
+    if server:
+        # ANN / quantization are configured when the server starts
+        results = SearchClient(server).semantic_search(query=query, limit=limit)
+    else:
+        sem_search = SemanticSearch()
+        movies_list = get_movie_data_from_file()
+        movie_embeddings = sem_search.load_or_create_embeddings(documents=movies_list)
+        if nprobe is not None:
+            sem_search.load_or_create_ann_index(nprobe=nprobe)
+        if quantized is not None:
+            sem_search.load_or_create_quantized_embeddings(kind=quantized)
+        results = sem_search.search(query=query, limit=limit)
     print(f"Calculating similarity scores for given query '{query}' for {limit} docs...")
     for i, r in enumerate(results):
         print(f"{i+1}. {r["title"]} (score: {r["score"]:.4f})")
         print(f"{r["description"][:250]}")
         print()
 
+def build_ann_command(nlist: int | None=None):
+    sem_search = SemanticSearch()
+    movies_list = get_movie_data_from_file()
+    sem_search.load_or_create_embeddings(documents=movies_list)
+    ann_index = sem_search.load_or_create_ann_index(nlist=nlist)
+    print(f"IVF index over {len(ann_index.list_rows)} movie embeddings with {ann_index.nlist} lists")
+
 def chunk_command(text: str, chunk_size: int=DEFAULT_CHUNK_SIZE, overlap: int=0):    
     words = text.split()
     chunks = []
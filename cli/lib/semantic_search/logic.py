@@ -1,6 +1,26 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from lib.constants import MOVIE_EMBEDDINGS_PATH
+from lib.ann_index import IVFIndex, load_or_build_ivf_index
+from lib.embedding_store import (
+    EmbeddingManifest,
+    normalize_rows,
+    save_embeddings,
+    load_embeddings,
+    migrate_legacy_embeddings,
+    merge_embeddings,
+    content_hashes
+)
+from lib.quantization import load_or_build_quantized_embeddings
+from lib.query_cache import QueryEmbeddingCache, shared_query_cache
+from lib.models import get_sentence_transformer
+from lib.constants import (
+    MOVIE_EMBEDDINGS_PATH,
+    LEGACY_MOVIE_EMBEDDINGS_PATH,
+    MOVIE_EMBEDDINGS_MANIFEST_PATH,
+    MOVIE_ANN_INDEX_PATH,
+    MOVIE_QUANTIZED_EMBEDDINGS_PATHS,
+    DEFAULT_ANN_NPROBE,
+    DEFAULT_RESCORE_FACTOR
+)
 
 class SemanticSearch:
     """
@@ -12,95 +32,286 @@ class SemanticSearch:
     between the vector embedding for a query and the document embeddings.
     Results for search are ranked by semantic closeness rather than keyword
     overlap.
+
+    Document embeddings are L2-normalized when they are built and stored
+    normalized on disk, so scoring a query is a single matrix-vector product
+    (one matrix-matrix product for a batch of queries) and the top results
+    are selected with ```np.argpartition``` instead of sorting every score.
+
+    Query embeddings are looked up in ```query_cache``` first, so repeated
+    queries (and the same query searched by several engines) are encoded once.
+
+    By default the embeddings file is memory-mapped rather than read: loading
+    is instant, and every process searching the same file shares one copy of
+    it in the OS page cache.
+
+    Once ```load_or_create_ann_index()``` is called, searches only score the
+    documents in the ```ann_nprobe``` nearest lists of an IVF index instead of
+    scanning every embedding.
+
+    Once ```load_or_create_quantized_embeddings()``` is called, documents are
+    scored from ```int8``` or product-quantized codes instead of the float
+    matrix, which is released; the top ```limit * rescore_factor``` are then
+    re-scored with their float embeddings, read from the memory-mapped file.
     
     Attributes:
         model (SentenceTransformer):
-            The sentence transformer model used to generate embeddings.
+            The sentence transformer model used to generate embeddings, loaded
+            on first use (cached embeddings and cached queries never load it).
+        model_name (str):
+            Name of ```model```, part of the key of the embedding caches.
+        query_cache (QueryEmbeddingCache):
+            LRU of query embeddings consulted before running the model, by
+            default the one shared by every search engine in the process.
         embeddings (np.ndarray | None):
-            Matrix of document embeddings; shape = (num_docs, embedding_dimension).
+            Matrix of L2-normalized document embeddings (all-zero rows stay zero);
+            shape = (num_docs, embedding_dimension). A read-only ```np.memmap```
+            when ```mmap_embeddings``` is set.
+        normalized_embeddings (np.ndarray | None):
+            The matrix searches are scored against, ```embeddings``` unless quantized embeddings replace it.
+        mmap_embeddings (bool):
+            Whether cached embeddings are memory-mapped instead of read into memory.
+        ann_index (IVFIndex | None):
+            Approximate nearest neighbour index over ```normalized_embeddings```, if enabled.
+        ann_nprobe (int):
+            Number of IVF lists each query scores when ```ann_index``` is set.
+        quantized_embeddings (ScalarQuantizedEmbeddings | ProductQuantizedEmbeddings | None):
+            Compressed ```normalized_embeddings```, if enabled.
+        rescore_factor (int):
+            Shortlist size, as a multiple of ```limit```, re-scored with float
+            embeddings when ```quantized_embeddings``` is set (0 = no re-scoring).
         documents (list[dict] | None): 
             Raw document objects used to build embeddings.
         document_map (dict[int, dict]):
             Mapping from document IDs to full document dictionaries."""
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name="all-MiniLM-L6-v2", mmap_embeddings: bool=True,
+                 query_cache: QueryEmbeddingCache | None=None):
+        self._model = None
+        self.model_name = model_name
+        self.query_cache = query_cache if query_cache is not None else shared_query_cache()
         self.embeddings = None
+        self.normalized_embeddings = None
+        self.mmap_embeddings = mmap_embeddings
+        self.ann_index = None
+        self.ann_nprobe = DEFAULT_ANN_NPROBE
+        self.quantized_embeddings = None
+        self.rescore_factor = DEFAULT_RESCORE_FACTOR
         self.documents = None
         self.document_map = dict()
 
-    
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_sentence_transformer(self.model_name)
+        return self._model
+
+    @model.setter
+    def model(self, model) -> None:
+        self._model = model
+
     def generate_embedding(self, text: str):
-        """Generate an embedding vector for a single input string."""
+        """Generate an embedding vector for a single input string, or take it
+        from ```query_cache```."""
         if text == "" or text.isspace():
             raise ValueError("Given text is empty or contains only whitespace")
         
-        embeddings = self.model.encode([text])
-        return embeddings[0]
+        embedding = self.query_cache.get(self.model_name, text)
+        if embedding is None:
+            embedding = self.query_cache.put(self.model_name, text, self.model.encode([text])[0])
+        return embedding
+
+    def generate_embeddings(self, texts: list[str]) -> np.ndarray:
+        """Generate embedding vectors for a list of input strings;
+        shape = (len(texts), embedding_dimension). Strings not in
+        ```query_cache``` are encoded in one ```encode``` call."""
+        for text in texts:
+            if text == "" or text.isspace():
+                raise ValueError("Given text is empty or contains only whitespace")
+        embeddings = [self.query_cache.get(self.model_name, text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.model.encode([texts[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = self.query_cache.put(self.model_name, texts[i], embedding)
+        return np.stack(embeddings)
 
     def build_embeddings(self, documents: list[dict]):
         """Create a list of embedding vectors for all documents,
-        save them to disk
+        normalize them and save them to disk, along with a manifest of
+        the content hash of every document's text
         
         Keyword arguments:
         documents -- a list of dictionaries where each dict 
         represents a doc having keys ```id, title, description```"""
-        # self.model.na
-        all_docs_str = []
         self.documents = documents
         for doc in self.documents:
             self.document_map[doc["id"]] = doc
-            all_docs_str.append(f"{doc['title']}: {doc['description']}")
-        self.embeddings = self.model.encode(all_docs_str, show_progress_bar=True)
-        np.save(MOVIE_EMBEDDINGS_PATH, self.embeddings)
-        return self.embeddings
+        all_docs_str = [document_text(doc) for doc in documents]
+        return self._update_embeddings(all_docs_str, content_hashes(all_docs_str))
 
     def load_or_create_embeddings(self, documents: list[dict]):
         """Populate the document_map attribute, a dictionary where
         the key is the doc id and the value is the doc object itself. 
         
-        Loads precomputed vector embeddings if they exist, else 
-        call ```build_embeddings(documents)``` to generate the embeddings."""
+        Loads (memory-maps) precomputed vector embeddings if they exist, else 
+        call ```build_embeddings(documents)``` to generate the embeddings.
+        Un-normalized embeddings cached by older versions are converted once.
+
+        The cached embeddings are checked against the content hash of every
+        document: when documents were added, removed or edited, only the new
+        and edited ones are encoded and the rest are copied from the cache.
+        Embeddings cached with another model are rebuilt."""
         
         self.documents = documents
         for doc in self.documents:
             self.document_map[doc["id"]] = doc
 
+        if not MOVIE_EMBEDDINGS_PATH.exists() and LEGACY_MOVIE_EMBEDDINGS_PATH.exists():
+            migrate_legacy_embeddings(LEGACY_MOVIE_EMBEDDINGS_PATH, MOVIE_EMBEDDINGS_PATH)
+
         if MOVIE_EMBEDDINGS_PATH.exists():
-            self.embeddings = np.load(MOVIE_EMBEDDINGS_PATH)
-            if len(self.embeddings) == len(documents):
+            all_docs_str = [document_text(doc) for doc in documents]
+            hashes = content_hashes(all_docs_str)
+            cached = load_embeddings(MOVIE_EMBEDDINGS_PATH, mmap=self.mmap_embeddings)
+            manifest = self._cached_embeddings_manifest(cached, hashes)
+            if manifest is not None and np.array_equal(manifest.row_hashes, hashes):
+                self.embeddings = self.normalized_embeddings = cached
+                self.ann_index = None
+                self.quantized_embeddings = None
                 return self.embeddings
+            if manifest is not None:
+                return self._update_embeddings(all_docs_str, hashes, cached, manifest)
         return self.build_embeddings(documents=documents)
+
+    def _embeddings_cache_key(self) -> str:
+        return self.model_name
+
+    def _cached_embeddings_manifest(self, cached: np.ndarray, hashes: np.ndarray) -> EmbeddingManifest | None:
+        """Manifest of the ```cached``` embeddings if they can be reused. Embeddings
+        cached before manifests existed are trusted (and a manifest is written)
+        when they have one row per document, as they were before."""
+        if MOVIE_EMBEDDINGS_MANIFEST_PATH.exists():
+            manifest = EmbeddingManifest.load(MOVIE_EMBEDDINGS_MANIFEST_PATH)
+            return manifest if manifest.matches(self._embeddings_cache_key(), len(cached)) else None
+        if len(cached) != len(hashes):
+            return None
+        manifest = EmbeddingManifest(self._embeddings_cache_key(), hashes)
+        manifest.save(MOVIE_EMBEDDINGS_MANIFEST_PATH)
+        return manifest
+
+    def _update_embeddings(self, texts: list[str], hashes: np.ndarray, cached: np.ndarray | None=None,
+                           manifest: EmbeddingManifest | None=None) -> np.ndarray:
+        """Encode the ```texts``` whose hash is not in ```manifest```, take the
+        others' rows from ```cached``` and save the merged matrix and its manifest."""
+        rows = np.full(len(texts), -1, dtype=np.int64)
+        if manifest is not None:
+            cached_rows = {h: row for row, h in enumerate(manifest.row_hashes.tolist())}
+            rows = np.fromiter((cached_rows.get(h, -1) for h in hashes.tolist()), dtype=np.int64, count=len(hashes))
+        new_texts = [texts[i] for i in np.flatnonzero(rows < 0)]
+        encoded = self.model.encode(new_texts, show_progress_bar=True) if new_texts or cached is None else None
+        embeddings = merge_embeddings(cached, rows, encoded)
+        self.embeddings = self.normalized_embeddings = save_embeddings(MOVIE_EMBEDDINGS_PATH, embeddings)
+        EmbeddingManifest(self._embeddings_cache_key(), hashes).save(MOVIE_EMBEDDINGS_MANIFEST_PATH)
+        self.ann_index = None
+        self.quantized_embeddings = None
+        return self.embeddings
+
+    def load_or_create_ann_index(self, nprobe: int=DEFAULT_ANN_NPROBE, nlist: int | None=None) -> IVFIndex:
+        """Load the IVF index over the document embeddings from ```cache/```, or
+        build and save it if it is missing or was built from other embeddings,
+        and use it for all following searches with ```nprobe``` lists per query."""
+        self.ann_index = load_or_build_ivf_index(MOVIE_ANN_INDEX_PATH, self._normalized_vectors(), nlist=nlist)
+        self.ann_nprobe = nprobe
+        return self.ann_index
+
+    def load_or_create_quantized_embeddings(self, kind: str="int8", rescore_factor: int=DEFAULT_RESCORE_FACTOR):
+        """Load the ```kind``` (```int8``` or ```pq```) quantized document embeddings
+        from ```cache/```, or build and save them, and score all following
+        searches from them.
+
+        The float matrix is released: ```normalized_embeddings``` is dropped
+        and ```embeddings``` is (re-)opened memory-mapped, so only the rows of
+        re-scored shortlists are ever read back."""
+        vectors = self._normalized_vectors()
+        self.quantized_embeddings = load_or_build_quantized_embeddings(
+            MOVIE_QUANTIZED_EMBEDDINGS_PATHS[kind], vectors, kind
+        )
+        self.rescore_factor = rescore_factor
+        self.normalized_embeddings = None
+        self.embeddings = load_embeddings(MOVIE_EMBEDDINGS_PATH, mmap=True)
+        return self.quantized_embeddings
+
+    def _normalized_vectors(self) -> np.ndarray:
+        if self.embeddings is None or len(self.embeddings) == 0:
+            raise ValueError("No embeddings loaded. Call `load_or_create_embeddings` first.")
+        if self.normalized_embeddings is not None:
+            return self.normalized_embeddings
+        return self.embeddings
     
     def search(self, query: str, limit: int) -> list[dict]:
         """Call the ```generate_embedding(query)``` method to generate
         an embedding vector for user's query. 
         
-        Compute the cosine similarity score between the query 
-        embedding and each document embedding stored in ```self.embeddings```,
-        sort the results by similarity score and return the top ```limit``` results."""
-        
+        Compute the cosine similarity score between the query embedding and
+        every document embedding with one product against
+        ```normalized_embeddings``` and return the top ```limit``` results,
+        sorted by similarity score. With an ANN index, only its candidate
+        documents are scored."""
+        return self.search_batch(queries=[query], limit=limit)[0]
+
+    def search_batch(self, queries: list[str], limit: int) -> list[list[dict]]:
+        """Like ```search```, for several queries at once: all queries are
+        encoded in one call and scored against every document with a single
+        matrix-matrix product. Returns one result list per query, in order."""
         if self.embeddings is None or len(self.embeddings) == 0:
             raise ValueError("No embeddings loaded. Call `load_or_create_embeddings` first.")
-        
-        query_embedding = self.generate_embedding(text=query)
 
-        docs_similarity_scores: list[tuple] = []
+        query_embeddings = normalize_rows(self.generate_embeddings(texts=queries))
+        if self.ann_index is None and self.quantized_embeddings is None:
+            # (num_queries, num_docs) cosine similarities
+            all_scores = query_embeddings @ self.normalized_embeddings.T
+            top_results = []
+            for query_scores in all_scores:
+                rows = top_k_indices(query_scores, limit)
+                top_results.append((rows, query_scores[rows]))
+        else:
+            top_results = [self._top_rows(query_embedding, limit) for query_embedding in query_embeddings]
+
+        batch_results = []
+        for rows, scores in top_results:
+            search_results = []
+            for i, score in zip(rows, scores):
+                doc = self.documents[i]
+                search_results.append({
+                    "score": float(score),
+                    "title": doc["title"],
+                    "description": doc["description"]
+                })
+            batch_results.append(search_results)
+        return batch_results
+
+    def _top_rows(self, query_embedding: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the top ```limit``` documents for a normalized query
+        embedding, best first, through the ANN index and/or quantized embeddings."""
+        rows = None
+        if self.ann_index is not None:
+            rows = self.ann_index.candidates(query_embedding, self.ann_nprobe)
+        if self.quantized_embeddings is not None:
+            scores = self.quantized_embeddings.scores(query_embedding, rows)
+        elif rows is None:
+            scores = self.normalized_embeddings @ query_embedding
+        else:
+            scores = self.normalized_embeddings[rows] @ query_embedding
+        if rows is None:
+            rows = np.arange(len(scores))
+
+        if self.quantized_embeddings is not None and self.rescore_factor:
+            # exact cosine similarity for the shortlist, from the float embeddings
+            rows = rows[top_k_indices(scores, limit * self.rescore_factor)]
+            scores = self.embeddings[rows] @ query_embedding
+        top = top_k_indices(scores, limit)
+        return rows[top], scores[top]
 
-        for i, doc_embedding in enumerate(self.embeddings):
-            doc = self.documents[i]
-            similarity_score = cosine_similarity(query_embedding, doc_embedding)
-            docs_similarity_scores.append((similarity_score, doc))
-        
-        sorted_scores = sorted(docs_similarity_scores, key=lambda t: t[0], reverse=True)
-
-        search_results = []
-        for doc_score in sorted_scores[:limit]:
-            result = {"score": doc_score[0], 
-                      "title": doc_score[1]["title"],
-                      "description": doc_score[1]["description"]}
-            search_results.append(result)
-        return search_results
-        
 def cosine_similarity(vec1, vec2):
     """Computes the cosine similrity score between 2 vectors."""
     dot_product = np.dot(vec1, vec2)
@@ -113,3 +324,24 @@ def cosine_similarity(vec1, vec2):
     return dot_product / (norm1 * norm2)
 
 
+
+def top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the ```limit``` highest ```scores```, highest first, equal
+    scores in index order (also for a tie across the ```limit```-th place:
+    the lowest indices are kept). Partitions in O(n) and only sorts the
+    selected ```limit``` entries."""
+    if limit <= 0:
+        return np.empty(0, dtype=np.intp)
+    if limit >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    kth_score = scores[np.argpartition(-scores, limit - 1)[limit - 1]]
+    # argpartition keeps arbitrary members of a tie at the kth score
+    above = np.flatnonzero(scores > kth_score)
+    tied = np.flatnonzero(scores == kth_score)[:limit - len(above)]
+    top = np.concatenate((above, tied))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def document_text(doc: dict) -> str:
+    """The text embedded for a document: ```"title: description"```."""
+    return f"{doc['title']}: {doc['description']}"
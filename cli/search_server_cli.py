@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import argparse
+from lib.constants import (
+    DEFAULT_SEARCH_SERVER_HOST, DEFAULT_SEARCH_SERVER_PORT, DEFAULT_QUERY_BATCH_SIZE,
+    DEFAULT_QUERY_BATCH_WAIT_MS, DEFAULT_LLM_WORKERS
+)
+from lib.search_client import SearchClient, SearchServerError, default_server_url
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search Server CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    serve_parser = subparsers.add_parser("serve", help="Load the search engines once and answer keyword, semantic, hybrid and RAG requests over HTTP")
+    serve_parser.add_argument("--host", type=str, default=DEFAULT_SEARCH_SERVER_HOST, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SEARCH_SERVER_PORT, help="Port to listen on")
+    serve_parser.add_argument("--nprobe", type=int, default=None, help="Search the IVF indexes, scoring this many lists per query (default: exact scan)")
+    serve_parser.add_argument("--quantized", type=str, choices=["int8", "pq"], default=None, help="Score from int8 or product-quantized embeddings")
+    serve_parser.add_argument("--search-workers", type=int, default=None, help="Threads for BM25, embedding scoring and the model (default: CPU count)")
+    serve_parser.add_argument("--llm-workers", type=int, default=DEFAULT_LLM_WORKERS, help="Threads waiting on LLM calls")
+    serve_parser.add_argument("--batch-size", type=int, default=DEFAULT_QUERY_BATCH_SIZE, help="Most concurrent queries encoded in one model call")
+    serve_parser.add_argument("--batch-wait-ms", type=float, default=DEFAULT_QUERY_BATCH_WAIT_MS, help="How long a query waits for others to be encoded with")
+
+    status_parser = subparsers.add_parser("status", help="Print the statistics of a running search server")
+    status_parser.add_argument("--server", type=str, default=default_server_url() or f"http://{DEFAULT_SEARCH_SERVER_HOST}:{DEFAULT_SEARCH_SERVER_PORT}", help="Search server URL")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "serve":
+            # imported here: loads numpy and the search engines
+            from lib.search_server import serve_command
+            serve_command(host=args.host, port=args.port, nprobe=args.nprobe, quantized=args.quantized,
+                          search_workers=args.search_workers, llm_workers=args.llm_workers,
+                          batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms)
+        case "status":
+            try:
+                stats = SearchClient(args.server).stats()
+            except SearchServerError as e:
+                print(e)
+                return
+            print(f"Search server at {args.server}")
+            print(f"Documents: {stats['documents']}")
+            print(f"Requests served: {stats['requests_served']}")
+            print(f"Uptime: {stats['uptime_seconds']:.0f}s")
+            cache = stats["query_cache"]
+            print(f"Query cache: {cache['entries']} entries, {cache['hits']} hits, "
+                  f"{cache['misses']} misses ({cache['hit_rate']:.1%} hit rate)")
+            batches = stats["query_batches"]
+            print(f"Query encoding: {batches['batched_queries']} queries in {batches['batches']} model calls "
+                  f"({batches['mean_batch_size']:.1f} per call)")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,16 @@ from lib.semantic_search.commands import (
     verify_embeddings_command,
     embed_query_text_command,
     search_command,
+    build_ann_command,
     chunk_command
 )
 from lib.chunked_semantic_search.commands import (
     semantic_chunk_command,
     embed_chunks_command,
-    search_chunked_command
+    search_chunked_command,
+    build_chunk_ann_command
 )
+from lib.search_client import default_server_url
 
 def main():
     parser = argparse.ArgumentParser(description="Semantic Search CLI")
@@ -32,6 +35,13 @@ def main():
     search_parser = subparsers.add_parser("search", help="Search for argument query, generate similarity score for each document")
     search_parser.add_argument("query", type=str, help="Query to compare with each doc and calculate similarity scores for")
     search_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results to return")
+    search_parser.add_argument("--nprobe", type=int, default=None, help="Search the IVF index, scoring this many lists per query (default: exact scan)")
+    search_parser.add_argument("--quantized", type=str, choices=["int8", "pq"], default=None, help="Score from int8 or product-quantized embeddings, re-scoring the shortlist with floats")
+    search_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
+
+    build_ann_parser = subparsers.add_parser("build_ann", help="Build the IVF approximate nearest neighbour index over the movie or chunk embeddings")
+    build_ann_parser.add_argument("--chunks", action="store_true", help="Index the chunk embeddings instead of the movie embeddings")
+    build_ann_parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default 4 * sqrt(embeddings))")
     
     chunk_parser = subparsers.add_parser("chunk", help="Chunk input text")
     chunk_parser.add_argument("text", type=str, help="Text to chunk")
@@ -48,6 +58,9 @@ def main():
     search_chunked_parser = subparsers.add_parser("search_chunked", help="Search for a query in all the chunks, generate similarity score for each chunk and arg query")
     search_chunked_parser.add_argument("query", type=str, help="Search query")
     search_chunked_parser.add_argument("--limit", type=int, nargs='?', default=5, help="Number of results to return")
+    search_chunked_parser.add_argument("--nprobe", type=int, default=None, help="Search the chunk IVF index, scoring this many lists per query (default: exact scan)")
+    search_chunked_parser.add_argument("--quantized", type=str, choices=["int8", "pq"], default=None, help="Score from int8 or product-quantized chunk embeddings, re-scoring the shortlist with floats")
+    search_chunked_parser.add_argument("--server", type=str, default=default_server_url(), help="URL of a running search_server_cli.py server to send the query to (default: $SEARCH_SERVER_URL, else search locally)")
 
     args = parser.parse_args()
 
@@ -61,7 +74,13 @@ def main():
         case "embedquery":
             embed_query_text_command(args.query)
         case "search":
-            search_command(query=args.query, limit=args.limit)  
+            search_command(query=args.query, limit=args.limit, nprobe=args.nprobe, quantized=args.quantized,
+                           server=args.server)
+        case "build_ann":
+            if args.chunks:
+                build_chunk_ann_command(nlist=args.nlist)
+            else:
+                build_ann_command(nlist=args.nlist)
 
         # Semantic Chunks      
         case "chunk":
@@ -71,7 +90,8 @@ def main():
         case "embed_chunks":
             embed_chunks_command()        
         case "search_chunked":
-            search_chunked_command(query=args.query, limit=args.limit)
+            search_chunked_command(query=args.query, limit=args.limit, nprobe=args.nprobe,
+                                   quantized=args.quantized, server=args.server)
         case _:
             parser.print_help()
 
@@ -0,0 +1,18 @@
+import pytest
+import lib.inverted_index
+from lib.benchmarks import synthetic_movies
+
+
+@pytest.fixture
+def movies() -> list[dict]:
+    # a small vocabulary, so queries match many docs and terms share postings
+    return synthetic_movies(num_docs=300, vocab_size=400, doc_length=40, seed=7)
+
+
+@pytest.fixture
+def index_paths(tmp_path, monkeypatch):
+    """Point the inverted index at a temporary cache directory."""
+    monkeypatch.setattr(lib.inverted_index, "CACHE_DIR_PATH", tmp_path)
+    monkeypatch.setattr(lib.inverted_index, "INDEX_FILE_PATH", tmp_path / "index.seg")
+    monkeypatch.setattr(lib.inverted_index, "INDEX_DELTA_PATH", tmp_path / "index_delta.pkl")
+    return tmp_path
@@ -0,0 +1,54 @@
+import pytest
+from lib.bm25_scorer import BM25Scorer
+from lib.inverted_index import InvertedIndex
+from lib.utils import process_text_to_tokens
+
+
+def brute_force_top_k(index: InvertedIndex, query: str, limit: int) -> list[tuple[int, float]]:
+    # BM25 of every doc from the per-term definition, no pruning
+    scores = {}
+    for token in process_text_to_tokens(query):
+        for doc_id in index.index.get(token, {}):
+            score = index.get_token_bm25_tf(doc_id, token) * index.bm25_idfs[token]
+            scores[doc_id] = scores.get(doc_id, 0.0) + score
+    return sorted(scores.items(), key=lambda d: d[1], reverse=True)[:limit]
+
+
+def assert_same_top_k(pruned: list[tuple[int, float]], expected: list[tuple[int, float]]) -> None:
+    assert [score for _, score in pruned] == pytest.approx([score for _, score in expected])
+    # docs tied with the last score may be swapped for one another
+    cutoff = expected[-1][1] if expected else 0.0
+    assert {d for d, s in pruned if s > cutoff + 1e-9} == {d for d, s in expected if s > cutoff + 1e-9}
+
+
+@pytest.fixture
+def index(movies) -> InvertedIndex:
+    index = InvertedIndex()
+    index.build(movies)
+    return index
+
+
+@pytest.mark.parametrize("limit", [1, 5, 20])
+def test_maxscore_pruning_matches_brute_force(index, movies, limit):
+    scorer = BM25Scorer(index)
+    assert scorer.term_upper_bounds, "pruning is only exercised with upper bounds"
+    skipped = 0
+    for movie in movies[:40]:
+        # the title plus a few description words: frequent and rare terms mixed
+        query = f'{movie["title"]} {" ".join(movie["description"].split()[:6])}'
+        pruned = scorer.search(query=query, limit=limit)
+        skipped += scorer.last_query_stats["postings_skipped"]
+        assert_same_top_k(pruned, brute_force_top_k(index, query, limit))
+    assert skipped > 0, "no posting was pruned, the test does not cover MaxScore"
+
+
+def test_repeated_query_terms_count_once_per_occurrence(index, movies):
+    token = process_text_to_tokens(movies[0]["title"])[0]
+    query = f"{token} {token} {movies[1]['title']}"
+    assert_same_top_k(BM25Scorer(index).search(query=query, limit=5), brute_force_top_k(index, query, 5))
+
+
+def test_unknown_terms_and_empty_limit(index):
+    scorer = BM25Scorer(index)
+    assert scorer.search(query="zzzzqqq", limit=5) == []
+    assert scorer.search(query="the", limit=0) == []
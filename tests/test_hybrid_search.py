@@ -0,0 +1,153 @@
+import random
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import lib.chunked_semantic_search.logic
+import lib.hybrid_search.logic
+import lib.inverted_index
+import lib.semantic_search.logic
+from lib.hybrid_search.logic import HybridSearch, candidate_pools, reciprocal_rank_fusion, _rrf_top_is_final
+from lib.inverted_index import InvertedIndex, bm25_search_parallel
+from lib.query_cache import QueryEmbeddingCache
+from lib.semantic_search.logic import top_k_indices
+
+K = 60
+
+
+class BagOfWordsModel:
+    """Deterministic stand-in for the sentence transformer: the sum of a fixed
+    random vector per word, so texts sharing words embed close together."""
+    dimension = 64
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                rng = np.random.default_rng(zlib.crc32(word.encode()))
+                embeddings[row] += rng.standard_normal(self.dimension).astype(np.float32)
+        return embeddings
+
+
+def correlated_rankings(rng: np.random.Generator, max_pool: int) -> list[np.ndarray]:
+    # two noisy views of one relevance order; some lists run out before max_pool
+    num_docs = int(rng.integers(20, 3 * max_pool))
+    relevance = rng.standard_normal(num_docs)
+    rankings = []
+    for _ in range(2):
+        scores = relevance + rng.standard_normal(num_docs) * rng.uniform(0.2, 2.0)
+        length = min(max_pool, int(rng.integers(10, num_docs + 1)))
+        rankings.append(np.argsort(-scores)[:length].astype(np.int64))
+    return rankings
+
+
+def rrf_top(rankings: list[np.ndarray], limit: int) -> tuple:
+    doc_ids, ranks, rrf_scores = reciprocal_rank_fusion(rankings, k=K)
+    top = top_k_indices(rrf_scores, limit)
+    return doc_ids, ranks, rrf_scores, top
+
+
+@pytest.mark.parametrize("limit", [1, 5, 10])
+def test_rrf_top_is_final_only_when_full_pools_agree(limit):
+    rng = np.random.default_rng(limit)
+    max_pool = limit * 40
+    finals = 0
+    for _ in range(300):
+        full_rankings = correlated_rankings(rng, max_pool)
+        full_ids, _, _, full_top = rrf_top(full_rankings, limit)
+        for pool in candidate_pools(limit, max_pool)[:-1]:
+            rankings = [ranking[:pool] for ranking in full_rankings]
+            doc_ids, ranks, rrf_scores, top = rrf_top(rankings, limit)
+            lengths = [len(ranking) for ranking in rankings]
+            if _rrf_top_is_final(ranks, rrf_scores, top, lengths, pool=pool, max_pool=max_pool, k=K, limit=limit):
+                finals += 1
+                assert doc_ids[top].tolist() == full_ids[full_top].tolist()
+    # the bound is not vacuous: it does stop early
+    assert finals > 0
+
+
+def test_rrf_top_is_final_with_exhausted_lists():
+    # both lists returned fewer candidates than asked for, so nothing is missing
+    rankings = [np.array([3, 1, 2]), np.array([2, 3])]
+    _, ranks, rrf_scores, top = rrf_top(rankings, limit=5)
+    assert _rrf_top_is_final(ranks, rrf_scores, top, [3, 2], pool=10, max_pool=100, k=K, limit=5)
+    # a full list could still add documents
+    assert not _rrf_top_is_final(ranks, rrf_scores, top, [3, 2], pool=3, max_pool=100, k=K, limit=5)
+
+
+@pytest.fixture
+def hybrid(movies, index_paths, monkeypatch):
+    """A ```HybridSearch``` over the synthetic movies, with every cache file in
+    a temporary directory and a bag-of-words model."""
+    # several sentences per description, so docs have several chunks
+    for movie in movies:
+        words = movie["description"].rstrip(".").split()
+        movie["description"] = " ".join(
+            " ".join(words[i:i + 8]) + "." for i in range(0, len(words), 8)
+        )
+    for module in (lib.chunked_semantic_search.logic, lib.hybrid_search.logic):
+        for name, value in vars(module).copy().items():
+            if name.endswith("_PATH"):
+                monkeypatch.setattr(module, name, index_paths / value.name)
+            elif name.endswith("_PATHS"):
+                monkeypatch.setattr(module, name, {kind: index_paths / path.name for kind, path in value.items()})
+    monkeypatch.setattr(lib.semantic_search.logic, "get_sentence_transformer", lambda model_name: BagOfWordsModel())
+    monkeypatch.setattr(lib.semantic_search.logic, "shared_query_cache", QueryEmbeddingCache)
+
+    index = InvertedIndex()
+    index.build(movies)
+    index.save()
+    searcher = HybridSearch(movies, bm25_workers=1)
+    yield searcher
+    searcher.close()
+
+
+@pytest.fixture
+def queries(movies) -> list[str]:
+    rng = random.Random(11)
+    queries = []
+    for _ in range(40):
+        words = rng.choice(movies)["description"].replace(".", "").split()
+        start = rng.randrange(len(words) - 3)
+        queries.append(" ".join(words[start:start + rng.randint(1, 3)]))
+    return queries
+
+
+@pytest.mark.parametrize("limit", [1, 5, 10])
+def test_adaptive_rrf_matches_fixed_pool(hybrid, queries, limit):
+    rounds = []
+    for query in queries:
+        adaptive = hybrid.rrf_search(query, k=K, limit=limit, adaptive=True)
+        rounds.append(hybrid.last_search_stats["rounds"])
+        fixed = hybrid.rrf_search(query, k=K, limit=limit)
+        assert [result["id"] for result in adaptive] == [result["id"] for result in fixed], query
+    assert min(rounds) == 1
+
+
+@pytest.mark.parametrize("limit", [1, 5, 10])
+def test_batch_search_matches_looped(hybrid, queries, limit):
+    queries = queries + queries[:3]
+    rrf_results = hybrid.rrf_search_batch(queries, k=K, limit=limit)
+    assert hybrid.last_search_stats["queries"] == len(queries)
+    assert rrf_results == [hybrid.rrf_search(query, k=K, limit=limit) for query in queries]
+    weighted_results = hybrid.weighted_search_batch(queries, alpha=0.5, limit=limit)
+    assert weighted_results == [hybrid.weighted_search(query, alpha=0.5, limit=limit) for query in queries]
+
+
+def test_batch_chunk_scores_in_blocks(hybrid, queries, monkeypatch):
+    # blocks smaller than the batch, and a last block that is not full
+    monkeypatch.setattr(lib.chunked_semantic_search.logic, "SEMANTIC_BATCH_BLOCK_SIZE", 7)
+    semantic_search = hybrid.semantic_search
+    for (ids, scores), query in zip(semantic_search.search_chunk_scores_batch(queries, limit=20), queries):
+        expected_ids, expected_scores = semantic_search.search_chunk_scores(query, limit=20)
+        assert ids.tolist() == expected_ids.tolist(), query
+        assert scores.tolist() == expected_scores.tolist(), query
+
+
+def test_bm25_search_parallel_matches_looped(hybrid, queries, monkeypatch):
+    # threads stand in for the worker processes, which would load the real cache
+    monkeypatch.setattr(lib.inverted_index, "_worker_index", None)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = bm25_search_parallel(pool, queries=queries, limit=10, workers=3, index_version="test")
+    assert results == [hybrid.idx.bm25_search(query=query, limit=10) for query in queries]
@@ -0,0 +1,141 @@
+import pytest
+from lib.inverted_index import InvertedIndex
+
+
+def apply_changes(index: InvertedIndex, movies: list[dict], added: list[dict], replaced: list[dict],
+                  deleted: list[int]) -> list[dict]:
+    """Apply the changes to ```index``` and return the corpus they produce."""
+    for movie in added:
+        index.add_document(movie)
+    for movie in replaced:
+        index.replace_document(movie)
+    for doc_id in deleted:
+        index.delete_document(doc_id)
+    by_id = {movie["id"]: movie for movie in movies}
+    by_id.update({movie["id"]: movie for movie in added + replaced})
+    for doc_id in deleted:
+        del by_id[doc_id]
+    return list(by_id.values())
+
+
+def assert_same_search(index: InvertedIndex, fresh: InvertedIndex, queries: list[str]) -> None:
+    for query in queries:
+        results = index.bm25_search(query=query, limit=10)
+        expected = fresh.bm25_search(query=query, limit=10)
+        assert [score for _, score in results] == pytest.approx([score for _, score in expected]), query
+        cutoff = expected[-1][1] if expected else 0.0
+        assert ({d for d, s in results if s > cutoff + 1e-9} == {d for d, s in expected if s > cutoff + 1e-9}), query
+
+
+def assert_same_index(index: InvertedIndex, fresh: InvertedIndex) -> None:
+    assert {term: list(p.items()) for term, p in index.index.items()} == \
+        {term: list(p.items()) for term, p in fresh.index.items()}
+    assert dict(index.doc_lengths.items()) == fresh.doc_lengths
+    assert dict(index.docmap.items()) == fresh.docmap
+    assert dict(index.bm25_idfs.items()) == pytest.approx(fresh.bm25_idfs)
+    assert index.avg_doc_length == pytest.approx(fresh.avg_doc_length)
+
+
+@pytest.fixture
+def scenario(movies, index_paths):
+    base, extra = movies[:250], movies[250:]
+    index = InvertedIndex()
+    index.build(base)
+    index.save()
+
+    loaded = InvertedIndex()
+    loaded.load()
+    # replacements take the text of docs outside the base, so their terms change
+    replaced = [{**extra[i], "id": base[i]["id"]} for i in range(10, 16)]
+    deleted = [base[i]["id"] for i in range(20, 26)] + [extra[0]["id"]]
+    corpus = apply_changes(loaded, base, added=extra[:8], replaced=replaced, deleted=deleted)
+
+    fresh = InvertedIndex()
+    fresh.build(corpus)
+    queries = [movie["title"] for movie in movies[::7]] + [movie["description"][:60] for movie in extra[:8]]
+    return loaded, fresh, queries, deleted
+
+
+def test_live_delta_matches_rebuild(scenario):
+    index, fresh, queries, deleted = scenario
+    # 7 added docs (one was deleted again), 6 replacements counted with their tombstones, 6 deletions
+    assert index.pending_changes == 25
+    assert_same_search(index, fresh, queries)
+    for query in queries:
+        assert not set(deleted) & {doc_id for doc_id, _ in index.bm25_search(query=query, limit=50)}
+
+
+def test_saved_delta_matches_rebuild(scenario, index_paths):
+    index, fresh, queries, _ = scenario
+    index.save()
+    # 25 changes on 250 docs stay within the compaction ratio: only the delta is written
+    assert (index_paths / "index_delta.pkl").exists()
+
+    reloaded = InvertedIndex()
+    reloaded.load()
+    assert reloaded.pending_changes == 25
+    assert_same_search(reloaded, fresh, queries)
+
+
+def test_compaction_matches_rebuild(scenario, index_paths):
+    index, fresh, queries, _ = scenario
+    index.compact()
+    assert index.pending_changes == 0
+    assert_same_index(index, fresh)
+    assert_same_search(index, fresh, queries)
+
+    index.save()
+    assert not (index_paths / "index_delta.pkl").exists()
+    reloaded = InvertedIndex()
+    reloaded.load()
+    assert_same_index(reloaded, fresh)
+    assert_same_search(reloaded, fresh, queries)
+
+
+def test_large_delta_is_compacted_on_save(movies, index_paths):
+    base = movies[:100]
+    index = InvertedIndex()
+    index.build(base)
+    index.save()
+
+    loaded = InvertedIndex()
+    loaded.load()
+    corpus = apply_changes(loaded, base, added=movies[100:150], replaced=[], deleted=[])
+    loaded.save()
+    assert not (index_paths / "index_delta.pkl").exists()
+
+    fresh = InvertedIndex()
+    fresh.build(corpus)
+    reloaded = InvertedIndex()
+    reloaded.load()
+    assert_same_index(reloaded, fresh)
+
+
+def test_delta_from_another_index_is_rejected(movies, index_paths):
+    index = InvertedIndex()
+    index.build(movies[:100])
+    index.save()
+    loaded = InvertedIndex()
+    loaded.load()
+    loaded.add_document(movies[100])
+    loaded.save()
+
+    # a rebuild replaces the segment but leaves the old delta behind
+    delta = (index_paths / "index_delta.pkl").read_bytes()
+    rebuilt = InvertedIndex()
+    rebuilt.build(movies[:120])
+    rebuilt.save()
+    (index_paths / "index_delta.pkl").write_bytes(delta)
+    with pytest.raises(ValueError, match="different index"):
+        InvertedIndex().load()
+
+
+def test_invalid_changes_are_rejected(movies, index_paths):
+    index = InvertedIndex()
+    index.build(movies[:10])
+    with pytest.raises(ValueError):
+        index.add_document(movies[0])
+    with pytest.raises(KeyError):
+        index.replace_document(movies[50])
+    with pytest.raises(KeyError):
+        index.delete_document(movies[50]["id"])
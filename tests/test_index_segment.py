@@ -0,0 +1,70 @@
+import struct
+import pytest
+from lib.index_segment import IndexSegment, SegmentFormatError, read_segment_header, SEGMENT_VERSION
+from lib.inverted_index import InvertedIndex
+
+
+def postings_of(index: InvertedIndex) -> dict[str, list[tuple[int, int]]]:
+    return {term: list(posting_list.items()) for term, posting_list in index.index.items()}
+
+
+@pytest.fixture
+def built(movies, index_paths) -> InvertedIndex:
+    index = InvertedIndex()
+    index.build(movies)
+    index.save()
+    return index
+
+
+def test_segment_round_trip(built, movies, index_paths):
+    loaded = InvertedIndex()
+    loaded.load()
+
+    assert postings_of(loaded) == postings_of(built)
+    assert dict(loaded.doc_lengths.items()) == built.doc_lengths
+    assert dict(loaded.docmap.items()) == built.docmap
+    assert dict(loaded.length_norms.items()) == pytest.approx(built.length_norms)
+    assert dict(loaded.doc_frequencies.items()) == built.doc_frequencies
+    assert dict(loaded.bm25_idfs.items()) == pytest.approx(built.bm25_idfs)
+    assert dict(loaded.term_upper_bounds.items()) == pytest.approx(built.term_upper_bounds)
+    assert loaded.avg_doc_length == pytest.approx(built.avg_doc_length)
+    assert loaded.bm25_params == built.bm25_params
+
+    for movie in movies[:20]:
+        assert loaded.bm25_search(query=movie["title"], limit=10) == built.bm25_search(query=movie["title"], limit=10)
+
+
+def test_segment_header(built, movies, index_paths):
+    header = read_segment_header(index_paths / "index.seg")
+    assert header["version"] == SEGMENT_VERSION
+    assert header["num_docs"] == len(movies)
+    assert header["vocab_size"] == len(built.index)
+    assert header["total_postings"] == built.index.total_postings()
+    assert header["avg_doc_length"] == pytest.approx(built.avg_doc_length)
+
+
+def test_segment_lookups_of_missing_keys(built, index_paths):
+    segment = IndexSegment(index_paths / "index.seg")
+    assert segment.postings.get("zzzzqqq") is None
+    assert "zzzzqqq" not in segment.bm25_idfs
+    assert 10_000 not in segment.docmap
+    with pytest.raises(KeyError):
+        segment.doc_lengths[10_000]
+
+
+def test_rejects_other_files_and_versions(built, index_paths):
+    path = index_paths / "index.seg"
+    data = bytearray(path.read_bytes())
+
+    struct.pack_into("<I", data, 4, SEGMENT_VERSION + 1)
+    path.write_bytes(bytes(data))
+    with pytest.raises(SegmentFormatError, match="version"):
+        IndexSegment(path)
+
+    path.write_bytes(b"PK\x03\x04" + bytes(data[4:]))
+    with pytest.raises(SegmentFormatError):
+        IndexSegment(path)
+
+    path.write_bytes(bytes(data[:10]))
+    with pytest.raises(SegmentFormatError):
+        read_segment_header(path)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from lib.benchmarks import synthetic_embeddings
+from lib.query_cache import QueryEmbeddingCache
+from lib.quantization import (
+    ScalarQuantizedEmbeddings,
+    ProductQuantizedEmbeddings,
+    load_quantized_embeddings,
+    load_or_build_quantized_embeddings
+)
+from lib.semantic_search.logic import SemanticSearch, top_k_indices
+
+LIMIT = 10
+
+
+@pytest.fixture(scope="module")
+def vectors() -> np.ndarray:
+    return synthetic_embeddings(num_vectors=4000, dimension=64, num_topics=40, seed=3)
+
+
+@pytest.fixture(scope="module")
+def queries(vectors) -> np.ndarray:
+    # near-duplicates of stored vectors, like a query close to a few documents
+    rng = np.random.default_rng(5)
+    queries = vectors[rng.choice(len(vectors), size=50, replace=False)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * 0.05
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def quantized(vectors) -> dict:
+    return {
+        "int8": ScalarQuantizedEmbeddings.build(vectors),
+        "pq": ProductQuantizedEmbeddings.build(vectors, num_subspaces=16)
+    }
+
+
+def recall(vectors: np.ndarray, queries: np.ndarray, top_rows) -> float:
+    found = 0
+    for query in queries:
+        exact = set(top_k_indices(vectors @ query, LIMIT).tolist())
+        found += len(exact & set(top_rows(query).tolist()))
+    return found / (len(queries) * LIMIT)
+
+
+def searcher(vectors: np.ndarray, quantized, rescore_factor: int) -> SemanticSearch:
+    # the rescoring path of SemanticSearch, without a model or files on disk
+    search = SemanticSearch(query_cache=QueryEmbeddingCache())
+    search.embeddings = vectors
+    search.quantized_embeddings = quantized
+    search.rescore_factor = rescore_factor
+    return search
+
+
+def test_int8_scores_are_close_to_exact(vectors, queries, quantized):
+    for query in queries[:10]:
+        # one quantization step per dimension is at most scale / 2 off
+        error_bound = float(np.abs(query) @ quantized["int8"].scales) / 2
+        assert np.abs(quantized["int8"].scores(query) - vectors @ query).max() <= error_bound + 1e-5
+
+
+@pytest.mark.parametrize("kind, min_recall", [("int8", 0.95), ("pq", 0.6)])
+def test_quantized_top_k_recall(vectors, queries, quantized, kind, min_recall):
+    assert recall(vectors, queries, lambda q: top_k_indices(quantized[kind].scores(q), LIMIT)) >= min_recall
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_rescoring_recovers_exact_top_k(vectors, queries, quantized, kind):
+    search = searcher(vectors, quantized[kind], rescore_factor=4)
+    assert recall(vectors, queries, lambda q: search._top_rows(q, LIMIT)[0]) >= 0.97
+
+    rows, scores = search._top_rows(queries[0], LIMIT)
+    # re-scored results carry exact scores, best first
+    assert scores == pytest.approx(vectors[rows] @ queries[0], abs=1e-5)
+    assert np.all(np.diff(scores) <= 0)
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_scores_of_selected_rows(vectors, queries, quantized, kind):
+    rows = np.array([3, 17, 256, 3999])
+    assert quantized[kind].scores(queries[0], rows) == pytest.approx(quantized[kind].scores(queries[0])[rows])
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_save_load_round_trip(tmp_path, vectors, queries, quantized, kind):
+    path = tmp_path / f"embeddings_{kind}.npz"
+    quantized[kind].save(path)
+    loaded = load_quantized_embeddings(path)
+    assert type(loaded) is type(quantized[kind])
+    assert np.array_equal(loaded.codes, quantized[kind].codes)
+    assert np.array_equal(loaded.scores(queries[0]), quantized[kind].scores(queries[0]))
+
+
+def test_rebuilt_when_embeddings_or_kind_change(tmp_path):
+    # the default number of PQ subspaces needs a dimension divisible by 96
+    vectors = synthetic_embeddings(num_vectors=600, dimension=192, num_topics=10, seed=4)
+    path = tmp_path / "embeddings.npz"
+    first = load_or_build_quantized_embeddings(path, vectors[:500], "int8")
+    assert np.array_equal(load_or_build_quantized_embeddings(path, vectors[:500], "int8").codes, first.codes)
+
+    assert len(load_or_build_quantized_embeddings(path, vectors, "int8")) == 600
+    assert len(load_quantized_embeddings(path)) == 600
+    assert load_or_build_quantized_embeddings(path, vectors, "pq").kind == "pq"
+    assert load_quantized_embeddings(path).kind == "pq"
+
+
+def test_pq_rejects_indivisible_dimension(vectors):
+    with pytest.raises(ValueError, match="not divisible"):
+        ProductQuantizedEmbeddings.build(vectors, num_subspaces=10)